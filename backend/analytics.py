@@ -0,0 +1,206 @@
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from pymongo import ReplaceOne
+
+from slots import SLOT_TIMEZONE
+
+# Daily rollups are keyed by (day, city, category_id). Days are calendar days
+# in the service area's timezone; cities are trimmed and lower-cased so
+# "Hyderabad " and "hyderabad" land in one row.
+UNKNOWN_CATEGORY = "unknown"
+GROUP_FIELDS = ("day", "city", "category_id")
+
+
+def rollup_day(created_at: datetime) -> str:
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return created_at.astimezone(SLOT_TIMEZONE).date().isoformat()
+
+
+def normalize_city(city: Optional[str]) -> str:
+    return (city or "").strip().lower() or "unknown"
+
+
+def rollup_id(day: str, city: str, category_id: str) -> str:
+    return f"{day}|{city}|{category_id}"
+
+
+def category_totals(services_by_id: Dict[str, dict], lines: List[dict]) -> List[dict]:
+    """Per-category items and revenue for a booking's service lines.
+
+    Stored on the booking at creation, so later status changes can move the
+    same amounts between status buckets without consulting the catalog.
+    """
+    totals: Dict[str, dict] = {}
+    for line in lines:
+        service = services_by_id.get(line["service_id"])
+        category_id = service["category_id"] if service else UNKNOWN_CATEGORY
+        entry = totals.setdefault(category_id, {"category_id": category_id, "items": 0, "revenue": 0.0})
+        entry["items"] += line["quantity"]
+        entry["revenue"] = round(entry["revenue"] + line["price"] * line["quantity"], 2)
+    return list(totals.values())
+
+
+async def record_booking(db, booking: dict, session=None):
+    """Add a new booking to its daily rollups (one upsert per category)."""
+    day = rollup_day(booking["created_at"])
+    city = normalize_city(booking["address"].get("city"))
+    status = booking["status"]
+    for entry in booking.get("category_totals", []):
+        await db.booking_rollups.update_one(
+            {"_id": rollup_id(day, city, entry["category_id"])},
+            {
+                "$setOnInsert": {"day": day, "city": city, "category_id": entry["category_id"]},
+                "$inc": {
+                    "bookings": 1,
+                    "items": entry["items"],
+                    "revenue": entry["revenue"],
+                    f"statuses.{status}.bookings": 1,
+                    f"statuses.{status}.revenue": entry["revenue"],
+                },
+            },
+            upsert=True,
+            session=session
+        )
+
+
+async def record_status_change(db, booking: dict, old_status: str, new_status: str, session=None):
+    # Callers only report transitions they won (guarded find_one_and_update), so each is counted once
+    day = rollup_day(booking["created_at"])
+    city = normalize_city(booking["address"].get("city"))
+    for entry in booking.get("category_totals", []):
+        await db.booking_rollups.update_one(
+            {"_id": rollup_id(day, city, entry["category_id"])},
+            {"$inc": {
+                f"statuses.{old_status}.bookings": -1,
+                f"statuses.{old_status}.revenue": -entry["revenue"],
+                f"statuses.{new_status}.bookings": 1,
+                f"statuses.{new_status}.revenue": entry["revenue"],
+            }},
+            session=session
+        )
+
+
+def live_pipeline(start: datetime, end: datetime) -> List[dict]:
+    """Rollup rows computed straight from `bookings` for created_at in [start, end).
+
+    This is what the rollups replace: it unwinds every booking's services
+    and joins each line to its service for the category. Used by the
+    backfill and as the baseline in its benchmark.
+    """
+    return [
+        {"$match": {"created_at": {"$gte": start, "$lt": end}}},
+        {"$unwind": "$services"},
+        {"$lookup": {
+            "from": "services",
+            "let": {"service_id": {"$convert": {
+                "input": "$services.service_id", "to": "objectId", "onError": None, "onNull": None
+            }}},
+            "pipeline": [
+                {"$match": {"$expr": {"$eq": ["$_id", "$$service_id"]}}},
+                {"$project": {"category_id": 1}},
+            ],
+            "as": "service",
+        }},
+        {"$group": {
+            "_id": {
+                "day": {"$dateToString": {
+                    "format": "%Y-%m-%d", "date": "$created_at", "timezone": str(SLOT_TIMEZONE)
+                }},
+                "city": {"$toLower": {"$trim": {"input": {"$ifNull": ["$address.city", ""]}}}},
+                "category_id": {"$ifNull": [{"$arrayElemAt": ["$service.category_id", 0]}, UNKNOWN_CATEGORY]},
+                "booking_id": "$_id",
+            },
+            "status": {"$first": "$status"},
+            "items": {"$sum": "$services.quantity"},
+            "revenue": {"$sum": {"$multiply": ["$services.price", "$services.quantity"]}},
+        }},
+        {"$group": {
+            "_id": {
+                "day": "$_id.day", "city": "$_id.city", "category_id": "$_id.category_id", "status": "$status"
+            },
+            "bookings": {"$sum": 1},
+            "items": {"$sum": "$items"},
+            "revenue": {"$sum": "$revenue"},
+        }},
+    ]
+
+
+def rollups_from_rows(rows: List[dict]) -> Dict[str, dict]:
+    rollups: Dict[str, dict] = {}
+    for row in rows:
+        key = row["_id"]
+        city = key["city"] or "unknown"
+        doc_id = rollup_id(key["day"], city, key["category_id"])
+        doc = rollups.setdefault(doc_id, {
+            "_id": doc_id, "day": key["day"], "city": city, "category_id": key["category_id"],
+            "bookings": 0, "items": 0, "revenue": 0.0, "statuses": {},
+        })
+        doc["bookings"] += row["bookings"]
+        doc["items"] += row["items"]
+        doc["revenue"] = round(doc["revenue"] + row["revenue"], 2)
+        status = doc["statuses"].setdefault(key["status"], {"bookings": 0, "revenue": 0.0})
+        status["bookings"] += row["bookings"]
+        status["revenue"] = round(status["revenue"] + row["revenue"], 2)
+    return rollups
+
+
+async def rebuild_day(db, day: date) -> int:
+    """Recompute one day's rollups from bookings (live and archived) and replace what is stored."""
+    local_start = datetime.combine(day, datetime.min.time(), tzinfo=SLOT_TIMEZONE)
+    start = local_start.astimezone(timezone.utc).replace(tzinfo=None)
+    end = (local_start + timedelta(days=1)).astimezone(timezone.utc).replace(tzinfo=None)
+    rows = []
+    for collection in (db.bookings, db.booking_archive):
+        rows += await collection.aggregate(live_pipeline(start, end), allowDiskUse=True).to_list(None)
+    rollups = rollups_from_rows(rows)
+    await db.booking_rollups.delete_many({"day": day.isoformat(), "_id": {"$nin": list(rollups)}})
+    if rollups:
+        await db.booking_rollups.bulk_write(
+            [ReplaceOne({"_id": doc_id}, doc, upsert=True) for doc_id, doc in rollups.items()],
+            ordered=False
+        )
+    return len(rollups)
+
+
+async def report(db, start: date, end: date, group_by: str = "day", city: Optional[str] = None,
+                 category_id: Optional[str] = None) -> List[dict]:
+    """Bookings, items and revenue for days in [start, end], grouped by one rollup dimension."""
+    if group_by not in GROUP_FIELDS:
+        raise ValueError(f"group_by must be one of {', '.join(GROUP_FIELDS)}")
+    match = {"day": {"$gte": start.isoformat(), "$lte": end.isoformat()}}
+    if city:
+        match["city"] = normalize_city(city)
+    if category_id:
+        match["category_id"] = category_id
+    pipeline = [
+        {"$match": match},
+        {"$group": {
+            "_id": f"${group_by}",
+            "bookings": {"$sum": "$bookings"},
+            "items": {"$sum": "$items"},
+            "revenue": {"$sum": "$revenue"},
+            "completed_revenue": {"$sum": {"$ifNull": ["$statuses.completed.revenue", 0]}},
+            "expired": {"$sum": {"$ifNull": ["$statuses.expired.bookings", 0]}},
+        }},
+        {"$sort": {"_id": 1}},
+    ]
+    rows = await db.booking_rollups.aggregate(pipeline).to_list(None)
+    for row in rows:
+        row[group_by] = row.pop("_id")
+        row["revenue"] = round(row["revenue"], 2)
+        row["completed_revenue"] = round(row["completed_revenue"], 2)
+    return rows
+
+
+def merge_reports(reports: List[List[dict]], group_by: str) -> List[dict]:
+    # Regions keep their own rollups; a report across them adds up the rows for each group
+    merged: Dict[str, dict] = {}
+    for rows in reports:
+        for row in rows:
+            total = merged.setdefault(row[group_by], {group_by: row[group_by]})
+            for field, value in row.items():
+                if field != group_by:
+                    total[field] = round(total.get(field, 0) + value, 2)
+    return [merged[key] for key in sorted(merged, key=lambda key: (key is None, key))]
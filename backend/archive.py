@@ -0,0 +1,122 @@
+import argparse
+import asyncio
+import logging
+import os
+import time
+import zlib
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+import bson
+from bson import Binary, ObjectId
+from pymongo import ReplaceOne
+
+logger = logging.getLogger(__name__)
+
+# Bookings in these states never change again
+TERMINAL_STATUSES = ("completed", "cancelled", "expired")
+ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', '90'))
+ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', '500'))
+
+# Kept uncompressed on the archived copy so booking history can page through
+# it like live bookings (see BookingSummary in server.py) and the analytics
+# backfill can still aggregate it
+SUMMARY_FIELDS = (
+    "customer_id", "services", "total_price", "status", "worker_id", "scheduled_at", "created_at", "address"
+)
+
+
+def pack(booking: dict) -> dict:
+    archived = {field: booking[field] for field in SUMMARY_FIELDS if field in booking}
+    archived["_id"] = booking["_id"]
+    archived["archived_at"] = datetime.utcnow()
+    archived["document"] = Binary(zlib.compress(bson.encode(booking), 6))
+    return archived
+
+
+def unpack(archived: dict) -> dict:
+    return bson.decode(zlib.decompress(archived["document"]))
+
+
+async def archive_batch(db, cutoff: datetime, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """Move up to `batch_size` finished bookings created before `cutoff` to booking_archive.
+
+    The copy is written before the original is deleted and both steps are
+    idempotent, so an interrupted run is finished by the next one. The
+    delete only matches bookings still in a terminal state.
+    """
+    batch = await db.bookings.find(
+        {"created_at": {"$lt": cutoff}, "status": {"$in": list(TERMINAL_STATUSES)}}
+    ).sort("created_at", 1).to_list(batch_size)
+    if not batch:
+        return 0
+    await db.booking_archive.bulk_write(
+        [ReplaceOne({"_id": booking["_id"]}, pack(booking), upsert=True) for booking in batch],
+        ordered=False
+    )
+    result = await db.bookings.delete_many(
+        {"_id": {"$in": [booking["_id"] for booking in batch]}, "status": {"$in": list(TERMINAL_STATUSES)}}
+    )
+    return result.deleted_count
+
+
+async def archive_bookings(db, older_than_days: int = ARCHIVE_AFTER_DAYS, batch_size: int = ARCHIVE_BATCH_SIZE,
+                           pause: float = 0.1) -> int:
+    # Small batches with a pause in between keep the archiver from competing with live traffic
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    archived = 0
+    while True:
+        moved = await archive_batch(db, cutoff, batch_size)
+        archived += moved
+        if moved < batch_size:
+            return archived
+        await asyncio.sleep(pause)
+
+
+async def find_archived_booking(db, booking_id: ObjectId) -> Optional[dict]:
+    archived = await db.booking_archive.find_one({"_id": booking_id}, {"document": 1})
+    return unpack(archived) if archived else None
+
+
+async def archived_summaries(db, query: dict, limit: int) -> List[dict]:
+    # Same query and order as live booking history, served from the summary fields
+    return await db.booking_archive.find(query, {"document": 0, "archived_at": 0, "address": 0}).sort(
+        [("created_at", -1), ("_id", -1)]
+    ).to_list(limit)
+
+
+async def run_archive_loop(db, interval: float = 3600.0):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            archived = await archive_bookings(db)
+            if archived:
+                logger.info("Archived %d finished bookings", archived)
+        except Exception:
+            logger.exception("Booking archive run failed")
+
+
+async def main(args):
+    from database import client, db
+
+    try:
+        if args.dry_run:
+            cutoff = datetime.utcnow() - timedelta(days=args.days)
+            count = await db.bookings.count_documents(
+                {"created_at": {"$lt": cutoff}, "status": {"$in": list(TERMINAL_STATUSES)}}
+            )
+            print(f"{count} bookings would be archived")
+            return
+        started = time.perf_counter()
+        archived = await archive_bookings(db, args.days, args.batch_size)
+        print(f"Archived {archived} bookings in {time.perf_counter() - started:.1f}s")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move finished bookings to the compressed booking_archive collection")
+    parser.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS, help="archive bookings older than this")
+    parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE)
+    parser.add_argument("--dry-run", action="store_true", help="only count what would be archived")
+    asyncio.run(main(parser.parse_args()))
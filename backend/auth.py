@@ -0,0 +1,165 @@
+import argparse
+import hashlib
+import hmac
+import logging
+import os
+import secrets
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional
+
+import jwt
+from dotenv import load_dotenv
+from fastapi import Header, HTTPException
+from pymongo import ReturnDocument
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+logger = logging.getLogger(__name__)
+
+JWT_ALGORITHM = "HS256"
+JWT_SECRET = os.environ.get('JWT_SECRET', '')
+if not JWT_SECRET:
+    # Tokens then only survive as long as this process; fine locally, not in production
+    logger.warning("JWT_SECRET is not set; using a random per-process secret")
+    JWT_SECRET = secrets.token_urlsafe(32)
+
+ACCESS_TOKEN_TTL = timedelta(seconds=int(os.environ.get('ACCESS_TOKEN_TTL_SECONDS', '900')))
+REFRESH_TOKEN_TTL = timedelta(days=int(os.environ.get('REFRESH_TOKEN_TTL_DAYS', '30')))
+OTP_TTL = timedelta(seconds=int(os.environ.get('OTP_TTL_SECONDS', '300')))
+OTP_MAX_ATTEMPTS = int(os.environ.get('OTP_MAX_ATTEMPTS', '5'))
+OTP_LENGTH = 6
+# Shared key for operator-only routes (reporting); unset disables them
+ADMIN_API_KEY = os.environ.get('ADMIN_API_KEY', '')
+
+
+def hash_otp(phone: str, code: str) -> str:
+    # Keyed so a leaked otps collection cannot be brute-forced offline
+    return hmac.new(JWT_SECRET.encode(), f"{phone}:{code}".encode(), hashlib.sha256).hexdigest()
+
+
+async def issue_otp(db, phone: str) -> str:
+    """Create a fresh OTP for `phone`, replacing any outstanding one.
+
+    Only a keyed hash is stored. `expires_at` carries a TTL index, so
+    unused codes are removed by Mongo itself.
+    """
+    code = f"{secrets.randbelow(10 ** OTP_LENGTH):0{OTP_LENGTH}d}"
+    now = datetime.utcnow()
+    await db.otps.replace_one(
+        {"_id": phone},
+        {"code_hash": hash_otp(phone, code), "attempts": 0, "created_at": now, "expires_at": now + OTP_TTL},
+        upsert=True
+    )
+    return code
+
+
+async def consume_otp(db, phone: str, code: str) -> bool:
+    # Count the attempt before comparing, so parallel guesses cannot exceed the limit
+    otp = await db.otps.find_one_and_update(
+        {"_id": phone, "expires_at": {"$gt": datetime.utcnow()}, "attempts": {"$lt": OTP_MAX_ATTEMPTS}},
+        {"$inc": {"attempts": 1}},
+        return_document=ReturnDocument.AFTER
+    )
+    if otp is None or not hmac.compare_digest(otp["code_hash"], hash_otp(phone, code)):
+        return False
+    # Single use: only the request that deletes it wins
+    result = await db.otps.delete_one({"_id": phone, "code_hash": otp["code_hash"]})
+    return result.deleted_count == 1
+
+
+def create_access_token(customer_id: str) -> str:
+    now = datetime.utcnow()
+    return jwt.encode(
+        {"sub": customer_id, "type": "access", "iat": now, "exp": now + ACCESS_TOKEN_TTL},
+        JWT_SECRET, algorithm=JWT_ALGORITHM
+    )
+
+
+def decode_token(token: str, token_type: str) -> dict:
+    try:
+        claims = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM], options={"require": ["exp", "sub"]})
+    except jwt.ExpiredSignatureError:
+        raise HTTPException(status_code=401, detail="Token expired")
+    except jwt.InvalidTokenError:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    if claims.get("type") != token_type:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    return claims
+
+
+async def create_refresh_token(db, customer_id: str) -> str:
+    """Refresh tokens are JWTs too, but each one is recorded so it can be used once and revoked."""
+    now = datetime.utcnow()
+    jti = uuid.uuid4().hex
+    expires_at = now + REFRESH_TOKEN_TTL
+    await db.refresh_tokens.insert_one({
+        "_id": jti, "customer_id": customer_id, "created_at": now, "expires_at": expires_at
+    })
+    return jwt.encode(
+        {"sub": customer_id, "type": "refresh", "jti": jti, "iat": now, "exp": expires_at},
+        JWT_SECRET, algorithm=JWT_ALGORITHM
+    )
+
+
+async def issue_tokens(db, customer_id: str) -> dict:
+    return {
+        "token": create_access_token(customer_id),
+        "refresh_token": await create_refresh_token(db, customer_id),
+        "token_type": "bearer",
+        "expires_in": int(ACCESS_TOKEN_TTL.total_seconds()),
+    }
+
+
+async def rotate_refresh_token(db, refresh_token: str) -> dict:
+    claims = decode_token(refresh_token, "refresh")
+    # Deleting the old record is the rotation: a replayed refresh token finds nothing
+    stored = await db.refresh_tokens.find_one_and_delete({"_id": claims.get("jti"), "customer_id": claims["sub"]})
+    if stored is None:
+        raise HTTPException(status_code=401, detail="Refresh token already used or revoked")
+    return await issue_tokens(db, claims["sub"])
+
+
+async def revoke_refresh_tokens(db, customer_id: str) -> int:
+    result = await db.refresh_tokens.delete_many({"customer_id": customer_id})
+    return result.deleted_count
+
+
+async def current_customer(authorization: Optional[str] = Header(None)) -> str:
+    """FastAPI dependency: the customer id from a bearer access token.
+
+    Verification is signature and expiry only, with no database read.
+    """
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    return decode_token(token, "access")["sub"]
+
+
+def require_customer(authenticated_id: str, customer_id: str):
+    if authenticated_id != customer_id:
+        raise HTTPException(status_code=403, detail="Not allowed for this customer")
+
+
+async def require_admin(x_admin_key: Optional[str] = Header(None)):
+    """FastAPI dependency for operator routes, checked against ADMIN_API_KEY."""
+    if not ADMIN_API_KEY or not x_admin_key or not hmac.compare_digest(x_admin_key, ADMIN_API_KEY):
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+
+def benchmark(iterations: int):
+    token = create_access_token(uuid.uuid4().hex)
+    started = time.perf_counter()
+    for _ in range(iterations):
+        decode_token(token, "access")
+    elapsed = time.perf_counter() - started
+    print(f"verified {iterations} access tokens: {elapsed / iterations * 1e6:.1f}us per request")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure access-token verification cost")
+    parser.add_argument("--iterations", type=int, default=100_000)
+    benchmark(parser.parse_args().iterations)
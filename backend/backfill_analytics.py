@@ -0,0 +1,122 @@
+import argparse
+import asyncio
+import random
+import time
+from datetime import date, datetime, timedelta, timezone
+
+from analytics import category_totals, live_pipeline, rebuild_day, report
+from catalog_cache import CatalogCache
+from database import client, db
+from slots import SLOT_TIMEZONE
+
+STATUSES = ("pending", "assigned", "completed", "expired")
+CITIES = ("Hyderabad", "Bengaluru", "Chennai", "Vijayawada", "Visakhapatnam")
+
+
+def days_between(start: date, end: date):
+    day = start
+    while day <= end:
+        yield day
+        day += timedelta(days=1)
+
+
+async def backfill(start: date, end: date, concurrency: int):
+    """Rebuild rollups for every day in [start, end], `concurrency` days at a time.
+
+    Each day is rebuilt independently (its rollup documents are keyed by
+    day), so chunks never touch each other's rows. Bookings created for a
+    day while it is being rebuilt can be missed; backfill past days, or
+    rerun the current one.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    rebuilt = 0
+    started = time.perf_counter()
+
+    async def rebuild(day):
+        nonlocal rebuilt
+        async with semaphore:
+            rows = await rebuild_day(db, day)
+        rebuilt += 1
+        print(f"{day}: {rows} rollup rows")
+
+    await asyncio.gather(*(rebuild(day) for day in days_between(start, end)))
+    print(f"Rebuilt {rebuilt} days in {time.perf_counter() - started:.1f}s")
+
+
+async def generate(count: int, start: date, end: date, batch_size: int = 5000):
+    """Insert synthetic bookings spread over [start, end] for benchmarking (marked synthetic: true)."""
+    snapshot = await CatalogCache(db).snapshot()
+    services = snapshot.services
+    if not services:
+        raise SystemExit("Seed the catalog first")
+    span = (end - start).days + 1
+    inserted = 0
+    while inserted < count:
+        batch = []
+        for _ in range(min(batch_size, count - inserted)):
+            picked = random.sample(services, min(len(services), random.randint(1, 3)))
+            lines = [{
+                "service_id": service["_id"], "title": service["title"],
+                "price": float(service["price"]), "quantity": random.randint(1, 2),
+            } for service in picked]
+            local = datetime.combine(start + timedelta(days=random.randrange(span)), datetime.min.time(),
+                                     tzinfo=SLOT_TIMEZONE) + timedelta(seconds=random.randrange(86400))
+            batch.append({
+                "customer_id": f"synthetic-{random.randrange(100000)}",
+                "services": lines,
+                "total_price": sum(line["price"] * line["quantity"] for line in lines),
+                "status": random.choice(STATUSES),
+                "address": {"city": random.choice(CITIES), "pincode": "500001"},
+                "created_at": local.astimezone(timezone.utc).replace(tzinfo=None),
+                "category_totals": category_totals(snapshot.services_by_id, lines),
+                "synthetic": True,
+            })
+        await db.bookings.insert_many(batch, ordered=False)
+        inserted += len(batch)
+        print(f"Inserted {inserted}/{count} synthetic bookings")
+
+
+async def benchmark(start: date, end: date, runs: int):
+    # Same question both ways: bookings and revenue per category over the range
+    range_start = datetime.combine(start, datetime.min.time(), tzinfo=SLOT_TIMEZONE)
+    range_end = datetime.combine(end + timedelta(days=1), datetime.min.time(), tzinfo=SLOT_TIMEZONE)
+    utc_start = range_start.astimezone(timezone.utc).replace(tzinfo=None)
+    utc_end = range_end.astimezone(timezone.utc).replace(tzinfo=None)
+
+    async def live():
+        return await db.bookings.aggregate(live_pipeline(utc_start, utc_end), allowDiskUse=True).to_list(None)
+
+    async def rollups():
+        return await report(db, start, end, group_by="category_id")
+
+    for name, query in (("live aggregation", live), ("rollup read", rollups)):
+        timings = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            await query()
+            timings.append((time.perf_counter() - started) * 1000)
+        print(f"{name:17} best {min(timings):10.1f} ms  mean {sum(timings) / len(timings):10.1f} ms")
+
+
+async def main(args):
+    try:
+        if args.generate:
+            await generate(args.generate, args.start, args.end)
+        if args.benchmark:
+            await benchmark(args.start, args.end, args.runs)
+        else:
+            await backfill(args.start, args.end, args.concurrency)
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild daily booking rollups from the bookings collection")
+    parser.add_argument("--start", type=date.fromisoformat, required=True, help="first day, YYYY-MM-DD")
+    parser.add_argument("--end", type=date.fromisoformat, default=datetime.utcnow().date())
+    parser.add_argument("--concurrency", type=int, default=4, help="days rebuilt in parallel")
+    parser.add_argument("--generate", type=int, default=0, help="insert this many synthetic bookings first")
+    parser.add_argument("--benchmark", action="store_true",
+                        help="time rollup reads against live aggregation instead of rebuilding")
+    parser.add_argument("--runs", type=int, default=5)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,178 @@
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    async def call(self, client: httpx.AsyncClient, route: str, method: str, url: str, **kwargs) -> httpx.Response:
+        # `route` is the route template, so all customers' calls land in one bucket
+        started = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.latencies.setdefault(route, []).append(elapsed_ms)
+        if response.status_code >= 400:
+            self.errors[route] = self.errors.get(route, 0) + 1
+        return response
+
+    def report(self, duration: float) -> dict:
+        routes = {}
+        for route, samples in sorted(self.latencies.items()):
+            routes[route] = {
+                "count": len(samples),
+                "errors": self.errors.get(route, 0),
+                "throughput": round(len(samples) / duration, 2),
+                "mean_ms": round(sum(samples) / len(samples), 3),
+                "p50_ms": round(percentile(samples, 50), 3),
+                "p95_ms": round(percentile(samples, 95), 3),
+                "p99_ms": round(percentile(samples, 99), 3),
+            }
+        return routes
+
+
+async def user_journey(client: httpx.AsyncClient, recorder: Recorder, lang: str):
+    """One customer: log in, browse the catalog, edit the cart, book, and view history."""
+    catalog_headers = {"Accept-Language": lang}
+    phone = f"9{random.randint(0, 999999999):09d}"
+    # The API must run with OTP_DEBUG=true (and OTP_IP_BURST raised) so the code comes back in the response
+    response = await recorder.call(client, "POST /auth/login", "POST", "/auth/login", json={"phone": phone})
+    response = await recorder.call(client, "POST /auth/verify-otp", "POST", "/auth/verify-otp",
+                                   json={"phone": phone, "otp": response.json()["otp"]})
+    body = response.json()
+    user = body["user"]
+    customer_id = user["_id"]
+    auth = {"Authorization": f"Bearer {body['token']}"}
+
+    response = await recorder.call(client, "GET /categories", "GET", "/categories", params={"type": "home"},
+                                   headers=catalog_headers)
+    categories = response.json()
+    category = random.choice(categories)
+
+    response = await recorder.call(client, "GET /categories/{category_id}/services", "GET",
+                                   f"/categories/{category['_id']}/services", headers=catalog_headers)
+    services = response.json()
+    if not services:
+        return
+    picked = random.sample(services, min(2, len(services)))
+
+    for service in picked:
+        await recorder.call(client, "GET /services/{service_id}", "GET", f"/services/{service['_id']}",
+                            headers=catalog_headers)
+        await recorder.call(client, "POST /cart/add", "POST", "/cart/add", json={
+            "customer_id": customer_id,
+            "service_id": service["_id"],
+            "title": service["title"],
+            "price": service["price"],
+        }, headers=auth)
+    await recorder.call(client, "POST /cart/update-quantity", "POST", "/cart/update-quantity",
+                        params={"customer_id": customer_id, "service_id": picked[0]["_id"], "quantity": 2},
+                        headers=auth)
+    if len(picked) > 1:
+        await recorder.call(client, "POST /cart/remove", "POST", "/cart/remove",
+                            json={"customer_id": customer_id, "service_id": picked[1]["_id"]}, headers=auth)
+    await recorder.call(client, "GET /cart/{customer_id}", "GET", f"/cart/{customer_id}", headers=auth)
+
+    await recorder.call(client, "POST /checkout", "POST", "/checkout", json={
+        "customer_id": customer_id,
+        "customer_name": user["name"],
+        "customer_phone": phone,
+        "scheduled_at": (datetime.utcnow() + timedelta(days=1)).isoformat(),
+        "address": {"street": "1 Main Road", "city": "Hyderabad", "state": "Telangana", "pincode": "500001"},
+    }, headers={**auth, "Idempotency-Key": uuid.uuid4().hex})
+    await recorder.call(client, "GET /bookings/customer/{customer_id}", "GET", f"/bookings/customer/{customer_id}",
+                        headers=auth)
+
+
+async def run_benchmark(base_url: str, journeys: int, concurrency: int, lang: str) -> dict:
+    recorder = Recorder()
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url.rstrip("/") + "/api", limits=limits, timeout=30) as client:
+        async def one():
+            async with semaphore:
+                await user_journey(client, recorder, lang)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(journeys)))
+        duration = time.perf_counter() - started
+
+    return {
+        "base_url": base_url,
+        "journeys": journeys,
+        "concurrency": concurrency,
+        "lang": lang,
+        "duration_s": round(duration, 3),
+        "started_at": datetime.utcnow().isoformat(),
+        "routes": recorder.report(duration),
+    }
+
+
+def find_regressions(baseline: dict, current: dict, metric: str, threshold_pct: float) -> List[str]:
+    regressions = []
+    for route, stats in current["routes"].items():
+        before = baseline["routes"].get(route)
+        if not before or not before[metric]:
+            continue
+        change = (stats[metric] - before[metric]) / before[metric] * 100
+        if change > threshold_pct:
+            regressions.append(f"{route}: {metric} {before[metric]:.1f}ms -> {stats[metric]:.1f}ms (+{change:.0f}%)")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Drive the customer journey against a running API and record latencies")
+    parser.add_argument("--base-url", default="http://localhost:8001")
+    parser.add_argument("--journeys", type=int, default=200, help="number of simulated customers")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--lang", default="en",
+                        help="Accept-Language for catalog calls; compare against an en baseline to check "
+                             "that localized catalogs cost the same")
+    parser.add_argument("--output", type=Path, default=Path("benchmark_results.json"))
+    parser.add_argument("--baseline", type=Path, help="previous results to compare against")
+    parser.add_argument("--metric", default="p95_ms", choices=["mean_ms", "p50_ms", "p95_ms", "p99_ms"])
+    parser.add_argument("--threshold", type=float, default=10.0, help="allowed slowdown in percent")
+    args = parser.parse_args()
+
+    results = asyncio.run(run_benchmark(args.base_url, args.journeys, args.concurrency, args.lang))
+    args.output.write_text(json.dumps(results, indent=2))
+
+    print(f"{'route':45} {'count':>7} {'err':>5} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for route, stats in results["routes"].items():
+        print(f"{route:45} {stats['count']:>7} {stats['errors']:>5} {stats['throughput']:>8.1f} "
+              f"{stats['p50_ms']:>8.1f} {stats['p95_ms']:>8.1f} {stats['p99_ms']:>8.1f}")
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        regressions = find_regressions(json.loads(args.baseline.read_text()), results, args.metric, args.threshold)
+        if regressions:
+            print("Regressions:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"No route slower than baseline by more than {args.threshold}% ({args.metric})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
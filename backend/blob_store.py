@@ -0,0 +1,147 @@
+import asyncio
+import json
+import os
+import uuid
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from gridfs.errors import NoFile
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+
+CHUNK_SIZE = 256 * 1024
+
+
+class BlobNotFound(Exception):
+    pass
+
+
+class BlobInfo:
+    def __init__(self, blob_id: str, length: int, content_type: str):
+        self.blob_id = blob_id
+        self.length = length
+        self.content_type = content_type
+
+
+class BlobStore(ABC):
+    """Storage for binary uploads such as booking photos.
+
+    Writes consume an async iterator of chunks and reads yield chunks, so no
+    backend ever needs a whole file in memory.
+    """
+
+    @abstractmethod
+    async def save(self, chunks: AsyncIterator[bytes], content_type: str) -> BlobInfo:
+        ...
+
+    @abstractmethod
+    async def info(self, blob_id: str) -> BlobInfo:
+        ...
+
+    @abstractmethod
+    def stream(self, blob_id: str, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        # Yields bytes [start, end] inclusive; end defaults to the last byte
+        ...
+
+
+class LocalBlobStore(BlobStore):
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, blob_id: str) -> Path:
+        # Ids are generated by us as uuid4 hex; reject anything else so a
+        # crafted id can't escape the blob directory
+        try:
+            uuid.UUID(hex=blob_id)
+        except ValueError:
+            raise BlobNotFound(blob_id)
+        return self.root / blob_id
+
+    async def save(self, chunks: AsyncIterator[bytes], content_type: str) -> BlobInfo:
+        blob_id = uuid.uuid4().hex
+        path = self._path(blob_id)
+        length = 0
+        try:
+            with open(path, "wb") as f:
+                async for chunk in chunks:
+                    await asyncio.to_thread(f.write, chunk)
+                    length += len(chunk)
+        except BaseException:
+            path.unlink(missing_ok=True)
+            raise
+        meta = {"length": length, "content_type": content_type}
+        await asyncio.to_thread(path.with_suffix(".json").write_text, json.dumps(meta))
+        return BlobInfo(blob_id, length, content_type)
+
+    async def info(self, blob_id: str) -> BlobInfo:
+        meta_path = self._path(blob_id).with_suffix(".json")
+        try:
+            meta = json.loads(await asyncio.to_thread(meta_path.read_text))
+        except FileNotFoundError:
+            raise BlobNotFound(blob_id)
+        return BlobInfo(blob_id, meta["length"], meta["content_type"])
+
+    async def stream(self, blob_id: str, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        path = self._path(blob_id)
+        with open(path, "rb") as f:
+            f.seek(start)
+            remaining = None if end is None else end - start + 1
+            while remaining is None or remaining > 0:
+                size = CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining)
+                chunk = await asyncio.to_thread(f.read, size)
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+
+class GridFSBlobStore(BlobStore):
+    def __init__(self, db, bucket_name: str = "blobs"):
+        self.bucket = AsyncIOMotorGridFSBucket(db, bucket_name=bucket_name, chunk_size_bytes=CHUNK_SIZE)
+
+    async def _open(self, blob_id: str):
+        try:
+            return await self.bucket.open_download_stream(ObjectId(blob_id))
+        except (InvalidId, NoFile):
+            raise BlobNotFound(blob_id)
+
+    async def save(self, chunks: AsyncIterator[bytes], content_type: str) -> BlobInfo:
+        grid_in = self.bucket.open_upload_stream(uuid.uuid4().hex, metadata={"content_type": content_type})
+        length = 0
+        try:
+            async for chunk in chunks:
+                await grid_in.write(chunk)
+                length += len(chunk)
+        except BaseException:
+            await grid_in.abort()
+            raise
+        await grid_in.close()
+        return BlobInfo(str(grid_in._id), length, content_type)
+
+    async def info(self, blob_id: str) -> BlobInfo:
+        grid_out = await self._open(blob_id)
+        return BlobInfo(blob_id, grid_out.length, grid_out.metadata["content_type"])
+
+    async def stream(self, blob_id: str, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        grid_out = await self._open(blob_id)
+        grid_out.seek(start)
+        remaining = (grid_out.length if end is None else end + 1) - start
+        while remaining > 0:
+            chunk = await grid_out.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def create_blob_store(db) -> BlobStore:
+    backend = os.environ.get('BLOB_BACKEND', 'local')
+    if backend == 'gridfs':
+        return GridFSBlobStore(db)
+    if backend == 'local':
+        return LocalBlobStore(Path(os.environ.get('BLOB_DIR', Path(__file__).parent / 'uploads')))
+    raise ValueError(f"Unknown BLOB_BACKEND: {backend}")
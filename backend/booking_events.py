@@ -0,0 +1,152 @@
+import asyncio
+import logging
+from typing import AsyncIterator, Dict, Set
+
+import orjson
+from pymongo.errors import OperationFailure, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+
+class Subscriber:
+    """One open event stream.
+
+    Pending updates are keyed by booking id, so a client that reads slowly
+    only ever holds the latest status of each booking instead of an
+    unbounded backlog.
+    """
+
+    def __init__(self, customer_id: str):
+        self.customer_id = customer_id
+        self.pending: Dict[str, dict] = {}
+        self.ready = asyncio.Event()
+
+    def push(self, event: dict):
+        self.pending[event["booking_id"]] = event
+        self.ready.set()
+
+    def drain(self) -> list:
+        events = list(self.pending.values())
+        self.pending.clear()
+        self.ready.clear()
+        return events
+
+
+class BookingEventHub:
+    """Fans booking status changes out to subscribed customers.
+
+    With a replica set the hub tails a change stream on `bookings`, so
+    updates made by any process reach every worker. On a standalone mongod
+    change streams are unavailable and the hub falls back to in-process
+    publishing from the code paths that change a booking's status.
+    """
+
+    def __init__(self):
+        self.subscribers: Dict[str, Set[Subscriber]] = {}
+        self.mode = "local"
+        self.published = 0
+
+    def subscribe(self, customer_id: str) -> Subscriber:
+        subscriber = Subscriber(customer_id)
+        self.subscribers.setdefault(customer_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        subscribers = self.subscribers.get(subscriber.customer_id)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self.subscribers[subscriber.customer_id]
+
+    def subscriber_count(self) -> int:
+        return sum(len(subs) for subs in self.subscribers.values())
+
+    def _deliver(self, customer_id: str, event: dict):
+        for subscriber in self.subscribers.get(customer_id, ()):
+            subscriber.push(event)
+        self.published += 1
+
+    def publish(self, booking: dict):
+        # Only used without a change stream; otherwise the stream delivers the update
+        if self.mode == "local":
+            self._deliver(booking["customer_id"], {
+                "booking_id": str(booking["_id"]),
+                "status": booking["status"],
+                "worker_id": booking.get("worker_id"),
+            })
+
+    async def run_change_stream(self, db):
+        pipeline = [
+            {"$match": {
+                "operationType": "update",
+                "updateDescription.updatedFields.status": {"$exists": True},
+            }},
+            {"$project": {
+                "documentKey": 1,
+                "fullDocument.customer_id": 1,
+                "fullDocument.status": 1,
+                "fullDocument.worker_id": 1,
+            }},
+        ]
+        resume_token = None
+        while True:
+            try:
+                async with db.bookings.watch(
+                    pipeline, full_document="updateLookup", resume_after=resume_token
+                ) as stream:
+                    self.mode = "change_stream"
+                    logger.info("Booking events: following the bookings change stream")
+                    async for change in stream:
+                        resume_token = stream.resume_token
+                        doc = change.get("fullDocument")
+                        if not doc:
+                            continue
+                        self._deliver(doc["customer_id"], {
+                            "booking_id": str(change["documentKey"]["_id"]),
+                            "status": doc["status"],
+                            "worker_id": doc.get("worker_id"),
+                        })
+            except OperationFailure as exc:
+                # Standalone servers reject $changeStream; stay in local mode
+                self.mode = "local"
+                logger.info("Booking events: change streams unavailable (%s), using in-process pub/sub", exc.code)
+                return
+            except PyMongoError:
+                self.mode = "local"
+                logger.exception("Booking change stream failed, retrying")
+                await asyncio.sleep(5)
+
+
+hub = BookingEventHub()
+
+
+def _sse(event: str, data: dict) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + orjson.dumps(data) + b"\n\n"
+
+
+async def event_stream(customer_id: str, heartbeat: float, idle_timeout: float) -> AsyncIterator[bytes]:
+    """Server-Sent Events for one subscriber.
+
+    A comment line is sent every `heartbeat` seconds to keep proxies from
+    dropping the connection. After `idle_timeout` seconds without updates
+    the stream ends and the client is told to reconnect.
+    """
+    loop = asyncio.get_running_loop()
+    subscriber = hub.subscribe(customer_id)
+    try:
+        yield b"retry: 3000\n\n"
+        idle_since = loop.time()
+        while True:
+            try:
+                await asyncio.wait_for(subscriber.ready.wait(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                if loop.time() - idle_since >= idle_timeout:
+                    yield _sse("idle_timeout", {})
+                    return
+                yield b": ping\n\n"
+                continue
+            for event in subscriber.drain():
+                yield _sse("booking_status", event)
+            idle_since = loop.time()
+    finally:
+        hub.unsubscribe(subscriber)
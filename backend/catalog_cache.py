@@ -0,0 +1,224 @@
+import asyncio
+import gzip
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import orjson
+
+from catalog_i18n import CATEGORY_TEXT_FIELDS, DEFAULT_LOCALE, SERVICE_TEXT_FIELDS, localize
+
+CATALOG_META_ID = "catalog"
+
+# Bodies smaller than this are not worth compressing
+GZIP_MIN_SIZE = 1024
+
+# Distinct fallback chains kept at once (e.g. ("te",), ("hi",), ("te", "hi"))
+MAX_PROJECTIONS = 16
+
+
+async def get_catalog_version(db) -> int:
+    meta = await db.catalog_meta.find_one({"_id": CATALOG_META_ID})
+    return meta["version"] if meta else 0
+
+
+async def bump_catalog_version(db) -> int:
+    # Called after any write to categories/services so every worker drops
+    # its cached copy on its next version check
+    meta = await db.catalog_meta.find_one_and_update(
+        {"_id": CATALOG_META_ID},
+        {"$inc": {"version": 1}},
+        upsert=True,
+        return_document=True
+    )
+    return meta["version"]
+
+
+async def apply_region_prices(region_db, services: List[dict]) -> List[dict]:
+    """Apply a region's `service_prices` overrides to catalog services.
+
+    An override is {"service_id", "price"?, "active"?}; inactive services
+    are not offered in the region at all. Returns copies, never the inputs.
+    """
+    overrides = {doc["service_id"]: doc async for doc in region_db.service_prices.find({})}
+    priced = []
+    for service in services:
+        override = overrides.get(str(service["_id"]))
+        if override is None:
+            priced.append(service)
+            continue
+        if override.get("active") is False:
+            continue
+        priced.append({**service, "price": override.get("price", service["price"])})
+    return priced
+
+
+class CatalogSnapshot:
+    def __init__(self, version: int, categories: List[dict], services: List[dict]):
+        self.version = version
+        self.categories = categories
+        self.services = services
+
+        self.categories_by_type: Dict[str, List[dict]] = {}
+        for cat in categories:
+            self.categories_by_type.setdefault(cat.get("type"), []).append(cat)
+
+        self.services_by_category: Dict[str, List[dict]] = {}
+        self.services_by_id: Dict[str, dict] = {}
+        for service in services:
+            self.services_by_category.setdefault(service["category_id"], []).append(service)
+            self.services_by_id[service["_id"]] = service
+
+
+class LocalizedCatalog:
+    """The snapshot with names and descriptions resolved for one locale chain."""
+
+    def __init__(self, snapshot: CatalogSnapshot, chain: Tuple[str, ...]):
+        self.chain = chain
+        self.categories = [localize(cat, chain, CATEGORY_TEXT_FIELDS) for cat in snapshot.categories]
+        self.categories_by_type: Dict[str, List[dict]] = {}
+        for cat in self.categories:
+            self.categories_by_type.setdefault(cat.get("type"), []).append(cat)
+
+        self.services_by_category: Dict[str, List[dict]] = {}
+        self.services_by_id: Dict[str, dict] = {}
+        for service in snapshot.services:
+            service = localize(service, chain, SERVICE_TEXT_FIELDS)
+            self.services_by_category.setdefault(service["category_id"], []).append(service)
+            self.services_by_id[service["_id"]] = service
+
+
+class EncodedPayload:
+    """JSON body encoded once, with its gzip variant and a strong ETag."""
+
+    def __init__(self, version: int, value: Any):
+        self.body = orjson.dumps(value)
+        digest = hashlib.blake2b(self.body, digest_size=8).hexdigest()
+        self.etag = f'"{version}-{digest}"'
+        self.gzip_body = gzip.compress(self.body, compresslevel=6) if len(self.body) >= GZIP_MIN_SIZE else None
+
+
+class CatalogCache:
+    """In-process copy of the categories and services collections.
+
+    The whole catalog is loaded at once and indexed by type, category_id and
+    _id. After `ttl` seconds the next read checks the catalog version in
+    `catalog_meta` and reloads only if it changed. Views derived from the
+    snapshot are kept in a bounded LRU that is cleared on every reload.
+
+    With a `region_db`, the snapshot is the shared catalog with that
+    region's prices applied, and the region's own catalog_meta version is
+    checked too (bump it there after changing its service_prices).
+    """
+
+    def __init__(self, db, ttl: float = 30.0, max_entries: int = 1024, enabled: bool = True, region_db=None):
+        self.db = db
+        self.region_db = region_db
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._checked_at = 0.0
+        self._entries: "OrderedDict[tuple, Any]" = OrderedDict()
+        self._projections: "OrderedDict[Tuple[str, ...], LocalizedCatalog]" = OrderedDict()
+        self._lock = asyncio.Lock()
+
+    async def snapshot(self) -> CatalogSnapshot:
+        now = time.monotonic()
+        if self._snapshot is not None and now - self._checked_at < self.ttl:
+            return self._snapshot
+
+        async with self._lock:
+            # Another request may have refreshed while we waited
+            if self._snapshot is not None and time.monotonic() - self._checked_at < self.ttl:
+                return self._snapshot
+
+            version = await get_catalog_version(self.db)
+            if self.region_db is not None:
+                version = f"{version}.{await get_catalog_version(self.region_db)}"
+            if self._snapshot is None or self._snapshot.version != version:
+                categories = await self.db.categories.find({}).to_list(None)
+                services = await self.db.services.find({}).to_list(None)
+                for doc in categories + services:
+                    doc["_id"] = str(doc["_id"])
+                if self.region_db is not None:
+                    services = await apply_region_prices(self.region_db, services)
+                self._snapshot = CatalogSnapshot(version, categories, services)
+                self._entries.clear()
+                self._projections.clear()
+                self.reloads += 1
+            self._checked_at = time.monotonic()
+            return self._snapshot
+
+    def invalidate(self):
+        self._snapshot = None
+        self._entries.clear()
+        self._projections.clear()
+
+    def localized(self, snapshot: CatalogSnapshot, chain: Tuple[str, ...]) -> LocalizedCatalog:
+        projection = self._projections.get(chain)
+        if projection is None:
+            projection = LocalizedCatalog(snapshot, chain)
+            self._projections[chain] = projection
+            if len(self._projections) > MAX_PROJECTIONS:
+                self._projections.popitem(last=False)
+        else:
+            self._projections.move_to_end(chain)
+        return projection
+
+    async def get(self, key: tuple, build: Callable[[CatalogSnapshot], Any]) -> Any:
+        snapshot = await self.snapshot()
+        if key in self._entries:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+        self.misses += 1
+        value = build(snapshot)
+        self._entries[key] = value
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return value
+
+    async def encoded(self, key: tuple, build: Callable[[CatalogSnapshot], Any]) -> Optional[EncodedPayload]:
+        # Returns None when the underlying value is missing (e.g. unknown service)
+        def build_payload(snapshot):
+            value = build(snapshot)
+            return EncodedPayload(snapshot.version, value) if value is not None else None
+        return await self.get(("encoded",) + key, build_payload)
+
+    async def encoded_categories(self, type: Optional[str] = None,
+                                 chain: Tuple[str, ...] = (DEFAULT_LOCALE,)) -> EncodedPayload:
+        def build(snapshot):
+            view = self.localized(snapshot, chain)
+            return view.categories_by_type.get(type, []) if type else view.categories
+        return await self.encoded(("categories", type, chain), build)
+
+    async def encoded_category_services(self, category_id: str,
+                                        chain: Tuple[str, ...] = (DEFAULT_LOCALE,)) -> EncodedPayload:
+        return await self.encoded(
+            ("category_services", category_id, chain),
+            lambda snapshot: self.localized(snapshot, chain).services_by_category.get(category_id, [])
+        )
+
+    async def encoded_service(self, service_id: str,
+                              chain: Tuple[str, ...] = (DEFAULT_LOCALE,)) -> Optional[EncodedPayload]:
+        return await self.encoded(
+            ("service", service_id, chain),
+            lambda snapshot: self.localized(snapshot, chain).services_by_id.get(service_id)
+        )
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "version": self._snapshot.version if self._snapshot else None,
+            "entries": len(self._entries),
+            "projections": len(self._projections),
+            "hits": self.hits,
+            "misses": self.misses,
+            "reloads": self.reloads,
+        }
@@ -0,0 +1,88 @@
+from typing import Dict, List, Optional, Tuple
+
+# Locales the app ships (frontend/locales); the base fields on each document are English
+DEFAULT_LOCALE = "en"
+SUPPORTED_LOCALES = ("en", "hi", "te", "ta", "kn", "ml", "pa")
+
+CATEGORY_TEXT_FIELDS = ("name", "description")
+SERVICE_TEXT_FIELDS = ("title", "description")
+
+
+def normalize_locale(tag: Optional[str]) -> Optional[str]:
+    # "te-IN" and "te_in" both resolve to "te"
+    if not tag:
+        return None
+    language = tag.strip().replace("_", "-").split("-")[0].lower()
+    return language if language in SUPPORTED_LOCALES else None
+
+
+def parse_accept_language(header: Optional[str]) -> List[str]:
+    """Supported languages from an Accept-Language header, best first."""
+    if not header:
+        return []
+    weighted = []
+    for position, part in enumerate(header.split(",")):
+        tag, _, params = part.partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                continue
+        locale = normalize_locale(tag)
+        if locale and quality > 0:
+            weighted.append((-quality, position, locale))
+    ordered = []
+    for _, _, locale in sorted(weighted):
+        if locale not in ordered:
+            ordered.append(locale)
+    return ordered
+
+
+def locale_chain(lang: Optional[str], accept_language: Optional[str]) -> Tuple[str, ...]:
+    """Fallback chain for a request: explicit `lang`, then Accept-Language, then English.
+
+    The chain is also the projection cache key, so every request that
+    resolves to the same chain shares one encoded payload.
+    """
+    chain = []
+    for locale in [normalize_locale(lang)] + parse_accept_language(accept_language):
+        if locale and locale not in chain:
+            chain.append(locale)
+    if DEFAULT_LOCALE in chain:
+        # Base fields are English, so nothing after it can ever be used
+        chain = chain[:chain.index(DEFAULT_LOCALE)]
+    return tuple(chain) or (DEFAULT_LOCALE,)
+
+
+def localize(doc: dict, chain: Tuple[str, ...], fields: Tuple[str, ...]) -> dict:
+    """Copy of `doc` with translatable fields resolved through `chain`, without `translations`."""
+    translations: Dict[str, dict] = doc.get("translations") or {}
+    localized = {key: value for key, value in doc.items() if key != "translations"}
+    for field in fields:
+        for locale in chain:
+            value = translations.get(locale, {}).get(field)
+            if value:
+                localized[field] = value
+                break
+    return localized
+
+
+def translations_from_row(row: dict, fields: Tuple[str, ...]) -> Dict[str, dict]:
+    """Translations from an import row: a nested `translations` object (JSONL)
+    or flat `<field>.<locale>` columns such as `name.hi` (CSV)."""
+    translations: Dict[str, dict] = {}
+    nested = row.get("translations") or {}
+    for locale, values in nested.items():
+        locale = normalize_locale(locale)
+        if locale and locale != DEFAULT_LOCALE:
+            translations.setdefault(locale, {}).update(
+                {field: values[field] for field in fields if values.get(field)}
+            )
+    for column, value in row.items():
+        field, _, locale = column.partition(".")
+        locale = normalize_locale(locale)
+        if field in fields and locale and locale != DEFAULT_LOCALE and value:
+            translations.setdefault(locale, {})[field] = value
+    return {locale: values for locale, values in translations.items() if values}
@@ -0,0 +1,184 @@
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from bson import ObjectId
+from fastapi import HTTPException
+from pymongo.errors import DuplicateKeyError
+
+from analytics import category_totals, record_booking
+from catalog_cache import apply_region_prices
+from database import run_transaction
+from matching import match_deadline
+from notifications import notify_booking
+from slots import plan_reservations, release_slots, reserve_slots
+
+# Must match the fee and tax shown on the app's confirm screen
+CONVENIENCE_FEE = 50.0
+TAX_RATE = 0.18
+
+
+async def load_cart_services(db, catalog_cache, items: List[dict]) -> Dict[str, dict]:
+    """Catalog entries for the cart's services, keyed by service id.
+
+    Services come from the catalog cache; anything it does not know about
+    (e.g. added since the last reload) is fetched in one batched $in query
+    against the catalog, with the cache's regional prices applied.
+    """
+    snapshot = await catalog_cache.snapshot()
+    services = {}
+    missing = []
+    for item in items:
+        service = snapshot.services_by_id.get(item["service_id"])
+        if service:
+            services[item["service_id"]] = service
+        elif ObjectId.is_valid(item["service_id"]):
+            missing.append(ObjectId(item["service_id"]))
+
+    if missing:
+        fetched = await catalog_cache.db.services.find({"_id": {"$in": missing}}).to_list(None)
+        if catalog_cache.region_db is not None:
+            fetched = await apply_region_prices(catalog_cache.region_db, fetched)
+        for service in fetched:
+            services[str(service["_id"])] = service
+    return services
+
+
+def price_cart_items(services: Dict[str, dict], items: List[dict]) -> List[dict]:
+    # Re-price cart lines from the catalog rather than trusting the stored cart prices
+    lines = []
+    for item in items:
+        service = services.get(item["service_id"])
+        if service is None:
+            raise HTTPException(status_code=409, detail=f"{item['title']} is no longer available")
+        lines.append({
+            "service_id": item["service_id"],
+            "title": service["title"],
+            "price": float(service["price"]),
+            "quantity": item["quantity"],
+        })
+    return lines
+
+
+def price_totals(lines: List[dict]) -> dict:
+    subtotal = sum(line["price"] * line["quantity"] for line in lines)
+    tax = subtotal * TAX_RATE
+    return {
+        "subtotal": round(subtotal, 2),
+        "convenience_fee": CONVENIENCE_FEE,
+        "tax": round(tax, 2),
+        "total_price": round(subtotal + CONVENIENCE_FEE + tax, 2),
+    }
+
+
+async def find_existing(db, customer_id: str, idempotency_key: str) -> Optional[dict]:
+    return await db.bookings.find_one(
+        {"customer_id": customer_id, "idempotency_key": idempotency_key},
+        {"status": 1, "total_price": 1}
+    )
+
+
+def checkout_result(booking: dict, replayed: bool) -> dict:
+    return {
+        "success": True,
+        "booking_id": str(booking["_id"]),
+        "status": booking["status"],
+        "total_price": booking["total_price"],
+        "replayed": replayed,
+        "message": "Booking created successfully"
+    }
+
+
+async def delete_priced_cart(cart_db, cart: dict, session=None):
+    # Only clear the cart we priced; a concurrent edit aborts the checkout
+    deleted = await cart_db.carts.delete_one(
+        {"_id": cart["_id"], "updated_at": cart.get("updated_at")},
+        session=session
+    )
+    if deleted.deleted_count == 0:
+        raise HTTPException(status_code=409, detail="Cart changed during checkout, please review it")
+
+
+async def restore_cart(cart_db, cart: dict):
+    try:
+        await cart_db.carts.insert_one(cart)
+    except DuplicateKeyError:
+        # The customer has started a new cart since; keep that one
+        pass
+
+
+async def checkout(db, catalog_cache, job_queue, details: dict, idempotency_key: str, cart_db=None) -> dict:
+    """Turn the customer's server-side cart into a booking.
+
+    The slot reservation, the booking insert, the cart delete, the
+    dispatch job, the analytics rollup and the confirmation notification
+    are written in one transaction. Retrying with the same idempotency
+    key returns the booking created by the first attempt.
+
+    `db` is the booking's region; carts live in `cart_db` (default: the
+    same database). A transaction cannot span Mongo clients, so when the
+    two are on different clusters the cart is deleted first and put back
+    if the booking does not commit.
+    """
+    cart_db = db if cart_db is None else cart_db
+    cart_in_transaction = cart_db.client is db.client
+    customer_id = details["customer_id"]
+    existing = await find_existing(db, customer_id, idempotency_key)
+    if existing:
+        return checkout_result(existing, replayed=True)
+
+    cart = await cart_db.carts.find_one({"customer_id": customer_id})
+    if not cart or not cart.get("items"):
+        raise HTTPException(status_code=400, detail="Cart is empty")
+
+    services = await load_cart_services(db, catalog_cache, cart["items"])
+    lines = price_cart_items(services, cart["items"])
+    reservations = await plan_reservations(
+        db, services, lines, details["address"]["pincode"], details["scheduled_at"]
+    )
+    now = datetime.utcnow()
+    booking = {
+        **details,
+        "services": lines,
+        **price_totals(lines),
+        "status": "pending",
+        "idempotency_key": idempotency_key,
+        "created_at": now,
+        "match_deadline": match_deadline(now),
+        "slot_reservations": reservations,
+        "category_totals": category_totals(services, lines),
+    }
+
+    async def write(session):
+        booking.pop("_id", None)
+        await reserve_slots(db, reservations, session=session)
+        try:
+            result = await db.bookings.insert_one(booking, session=session)
+            if cart_in_transaction:
+                await delete_priced_cart(cart_db, cart, session=session)
+            booking_id = str(result.inserted_id)
+            await job_queue.enqueue(
+                "dispatch_booking", {"booking_id": booking_id}, dedup_key=f"dispatch:{booking_id}", session=session
+            )
+            await record_booking(db, booking, session=session)
+            await notify_booking(db, {**booking, "_id": result.inserted_id}, "confirmed", session=session)
+        except Exception:
+            # A transaction rolls the slots back itself; a standalone server needs them returned
+            if session is None:
+                await release_slots(db, reservations)
+            raise
+
+    if not cart_in_transaction:
+        await delete_priced_cart(cart_db, cart)
+    try:
+        await run_transaction(write, db)
+    except Exception as exc:
+        if not cart_in_transaction:
+            await restore_cart(cart_db, cart)
+        if not isinstance(exc, DuplicateKeyError):
+            raise
+        # A concurrent retry with the same key committed first
+        existing = await find_existing(db, customer_id, idempotency_key)
+        if existing is None:
+            raise
+        return checkout_result(existing, replayed=True)
+    return checkout_result(booking, replayed=False)
@@ -0,0 +1,164 @@
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+from pymongo.errors import OperationFailure
+
+from metrics import CommandMetrics
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+logger = logging.getLogger(__name__)
+
+
+class PoolStats(monitoring.ConnectionPoolListener):
+    """Connection pool counters, fed by pymongo's CMAP events."""
+
+    def __init__(self):
+        self.open = 0
+        self.checked_out = 0
+        self.created = 0
+        self.closed = 0
+        self.checkout_failures = 0
+        self.pool_clears = 0
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self.pool_clears += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self.created += 1
+        self.open += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self.closed += 1
+        self.open -= 1
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self.checkout_failures += 1
+
+    def connection_checked_out(self, event):
+        self.checked_out += 1
+
+    def connection_checked_in(self, event):
+        self.checked_out -= 1
+
+    def as_dict(self) -> dict:
+        return {
+            "open": self.open,
+            "in_use": self.checked_out,
+            "created": self.created,
+            "closed": self.closed,
+            "checkout_failures": self.checkout_failures,
+            "pool_clears": self.pool_clears,
+        }
+
+
+def client_options() -> dict:
+    # Pool sizes are per worker process: total connections = workers * MONGO_MAX_POOL_SIZE
+    return {
+        "maxPoolSize": int(os.environ.get('MONGO_MAX_POOL_SIZE', '100')),
+        "minPoolSize": int(os.environ.get('MONGO_MIN_POOL_SIZE', '5')),
+        "maxIdleTimeMS": int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', '300000')),
+        "maxConnecting": int(os.environ.get('MONGO_MAX_CONNECTING', '2')),
+        "connectTimeoutMS": int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', '5000')),
+        "serverSelectionTimeoutMS": int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000')),
+        "waitQueueTimeoutMS": int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', '2000')),
+    }
+
+
+pool_stats = PoolStats()
+
+# Motor connects lazily, so creating the client at import opens no sockets;
+# connections are opened by warmup() inside the lifespan
+client = AsyncIOMotorClient(
+    os.environ['MONGO_URL'],
+    event_listeners=[pool_stats, CommandMetrics()],
+    **client_options()
+)
+db = client[os.environ['DB_NAME']]
+
+# One client per cluster; regions on other clusters (see tenancy.py) get
+# their own, sharing the pool settings and metrics listeners
+_clients = {os.environ['MONGO_URL']: client}
+
+
+def get_client(url: str) -> AsyncIOMotorClient:
+    if url not in _clients:
+        _clients[url] = AsyncIOMotorClient(url, event_listeners=[pool_stats, CommandMetrics()], **client_options())
+    return _clients[url]
+
+
+async def warmup():
+    # Concurrent pings make the driver open up to minPoolSize connections
+    # before the first request instead of during it
+    connections = max(client_options()["minPoolSize"], 1)
+    await asyncio.gather(*(client.admin.command("ping") for _ in range(connections)))
+    logger.info("MongoDB connection pool warmed up (%d open)", pool_stats.open)
+
+
+# Flipped off the first time the server turns out to be a standalone mongod
+transactions_supported = True
+
+
+async def run_transaction(callback, on_db=None):
+    """Run `await callback(session)` inside a multi-document transaction.
+
+    The session is started on `on_db`'s client (the main client by
+    default); a transaction cannot span clients. Transient errors are
+    retried by the driver. Standalone servers cannot
+    run transactions; there the callback runs once with session=None so
+    local development still works, without the atomicity guarantee.
+    """
+    global transactions_supported
+    if transactions_supported:
+        try:
+            session_client = on_db.client if on_db is not None else client
+            async with await session_client.start_session() as session:
+                return await session.with_transaction(callback)
+        except OperationFailure as exc:
+            # 20 = IllegalOperation: "Transaction numbers are only allowed on a replica set member or mongos"
+            if exc.code != 20:
+                raise
+            transactions_supported = False
+            logger.warning("MongoDB does not support transactions here; running without them")
+    return await callback(None)
+
+
+async def readiness() -> dict:
+    try:
+        await asyncio.wait_for(client.admin.command("ping"), timeout=2)
+        ready = True
+    except Exception:
+        ready = False
+    return {"ready": ready, "pool": pool_stats.as_dict(), "options": client_options()}
+
+
+@asynccontextmanager
+async def database_lifespan(app=None):
+    await warmup()
+    try:
+        yield
+    finally:
+        for open_client in _clients.values():
+            open_client.close()
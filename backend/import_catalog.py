@@ -0,0 +1,168 @@
+import argparse
+import asyncio
+import csv
+import json
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+from pymongo import UpdateOne
+
+from catalog_cache import bump_catalog_version
+from catalog_i18n import CATEGORY_TEXT_FIELDS, SERVICE_TEXT_FIELDS, translations_from_row
+from database import client, db
+
+CATEGORY_FIELDS = ("name", "type", "icon", "description", "image_url")
+SERVICE_FIELDS = ("title", "description", "price", "duration_minutes", "image_url")
+
+
+def read_rows(path: Path) -> Iterator[dict]:
+    # Rows are streamed so files of any size are read in constant memory
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.suffix == ".csv":
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def batched(rows: Iterator[dict], size: int) -> Iterator[List[dict]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def category_doc(row: dict) -> dict:
+    doc = {field: row[field] for field in CATEGORY_FIELDS if row.get(field) not in (None, "")}
+    translations = translations_from_row(row, CATEGORY_TEXT_FIELDS)
+    if translations:
+        doc["translations"] = translations
+    return doc
+
+
+def service_doc(row: dict, category_id: str) -> dict:
+    doc = {field: row[field] for field in SERVICE_FIELDS if row.get(field) not in (None, "")}
+    doc["category_id"] = category_id
+    doc["price"] = float(doc["price"])
+    if "duration_minutes" in doc:
+        doc["duration_minutes"] = int(doc["duration_minutes"])
+    translations = translations_from_row(row, SERVICE_TEXT_FIELDS)
+    if translations:
+        doc["translations"] = translations
+    return doc
+
+
+class ImportStats:
+    def __init__(self):
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.skipped = 0
+
+    def __str__(self):
+        return (f"{self.inserted} new, {self.updated} changed, "
+                f"{self.unchanged} unchanged, {self.skipped} skipped")
+
+
+async def diff_batch(collection, docs: List[dict], key_fields: Tuple[str, ...], stats: ImportStats):
+    # Dry run: compare against what is stored without writing anything
+    existing = await collection.find({"$or": [{k: doc[k] for k in key_fields} for doc in docs]}).to_list(None)
+    by_key = {tuple(doc[k] for k in key_fields): doc for doc in existing}
+    for doc in docs:
+        current = by_key.get(tuple(doc[k] for k in key_fields))
+        if current is None:
+            stats.inserted += 1
+        elif any(current.get(field) != value for field, value in doc.items()):
+            stats.updated += 1
+        else:
+            stats.unchanged += 1
+
+
+async def upsert_batch(collection, docs: List[dict], key_fields: Tuple[str, ...], stats: ImportStats):
+    result = await collection.bulk_write([
+        UpdateOne({k: doc[k] for k in key_fields}, {"$set": doc}, upsert=True)
+        for doc in docs
+    ], ordered=False)
+    stats.inserted += result.upserted_count
+    stats.updated += result.modified_count
+    stats.unchanged += result.matched_count - result.modified_count
+
+
+async def run_batches(collection, batches, key_fields, stats, dry_run: bool, concurrency: int):
+    apply = diff_batch if dry_run else upsert_batch
+    # Keep at most `concurrency` batches in flight so the file is not read ahead into memory
+    pending = set()
+    for docs in batches:
+        if not docs:
+            continue
+        if len(pending) >= concurrency:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                task.result()
+        pending.add(asyncio.ensure_future(apply(collection, docs, key_fields, stats)))
+    if pending:
+        await asyncio.gather(*pending)
+
+
+async def load_category_ids() -> Dict[Tuple[str, str], str]:
+    categories = await db.categories.find({}, {"name": 1, "type": 1}).to_list(None)
+    return {(cat["name"], cat["type"]): str(cat["_id"]) for cat in categories}
+
+
+async def import_catalog(categories_path, services_path, batch_size: int, concurrency: int, dry_run: bool):
+    if categories_path:
+        stats = ImportStats()
+        started = time.perf_counter()
+        batches = ([category_doc(row) for row in batch] for batch in batched(read_rows(categories_path), batch_size))
+        await run_batches(db.categories, batches, ("name", "type"), stats, dry_run, concurrency)
+        elapsed = time.perf_counter() - started
+        total = stats.inserted + stats.updated + stats.unchanged
+        print(f"Categories: {stats} in {elapsed:.2f}s ({total / max(elapsed, 1e-9):.0f} rows/s)")
+
+    if services_path:
+        # Services reference their category by natural key (category_name + category_type)
+        category_ids = await load_category_ids()
+        stats = ImportStats()
+
+        def service_docs(batch):
+            docs = []
+            for row in batch:
+                category_id = category_ids.get((row.get("category_name"), row.get("category_type")))
+                if category_id is None:
+                    stats.skipped += 1
+                    continue
+                docs.append(service_doc(row, category_id))
+            return docs
+
+        started = time.perf_counter()
+        batches = (service_docs(batch) for batch in batched(read_rows(services_path), batch_size))
+        await run_batches(db.services, batches, ("category_id", "title"), stats, dry_run, concurrency)
+        elapsed = time.perf_counter() - started
+        total = stats.inserted + stats.updated + stats.unchanged
+        print(f"Services: {stats} in {elapsed:.2f}s ({total / max(elapsed, 1e-9):.0f} rows/s)")
+
+    if dry_run:
+        print("Dry run: nothing was written")
+    else:
+        await bump_catalog_version(db)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Upsert categories and services from CSV or JSON Lines files")
+    parser.add_argument("--categories", type=Path, help="columns: name, type, icon, description, image_url")
+    parser.add_argument("--services", type=Path,
+                        help="columns: category_name, category_type, title, description, price, duration_minutes, image_url")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--dry-run", action="store_true", help="report what would change without writing")
+    args = parser.parse_args()
+    try:
+        asyncio.run(import_catalog(args.categories, args.services, args.batch_size, args.concurrency, args.dry_run))
+    finally:
+        client.close()
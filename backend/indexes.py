@@ -0,0 +1,177 @@
+import asyncio
+import os
+import sys
+
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE, IndexModel
+
+from database import client, db
+
+# Carts untouched for this long are abandoned; Mongo deletes them. Changing it
+# needs the old carts index dropped first (create_indexes will not alter it)
+CART_TTL_DAYS = int(os.environ.get('CART_TTL_DAYS', '30'))
+
+# Indexes the API relies on, per collection
+REQUIRED_INDEXES = {
+    "users": [
+        IndexModel([("phone", ASCENDING)], name="phone_unique", unique=True),
+    ],
+    "carts": [
+        IndexModel([("customer_id", ASCENDING)], name="customer_id_unique", unique=True),
+        IndexModel([("updated_at", ASCENDING)], name="updated_at_ttl", expireAfterSeconds=CART_TTL_DAYS * 24 * 3600),
+    ],
+    "categories": [
+        IndexModel([("type", ASCENDING)], name="type"),
+        # Natural key used by import_catalog.py upserts
+        IndexModel([("name", ASCENDING), ("type", ASCENDING)], name="name_type_unique", unique=True),
+    ],
+    "services": [
+        # Serves category listings and is the natural key for import_catalog.py upserts
+        IndexModel([("category_id", ASCENDING), ("title", ASCENDING)], name="category_id_title_unique", unique=True),
+    ],
+    "bookings": [
+        IndexModel(
+            [("customer_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+            name="customer_id_created_at_id"
+        ),
+        # Checkout retries with the same key must not create a second booking
+        IndexModel(
+            [("customer_id", ASCENDING), ("idempotency_key", ASCENDING)],
+            name="customer_id_idempotency_key_unique",
+            unique=True,
+            partialFilterExpression={"idempotency_key": {"$exists": True}}
+        ),
+        # Day-by-day scans for the analytics backfill and age scans for the archiver
+        IndexModel([("created_at", ASCENDING)], name="created_at"),
+        # Expiry sweep for bookings still waiting on a provider
+        IndexModel(
+            [("match_deadline", ASCENDING)],
+            name="pending_match_deadline",
+            partialFilterExpression={"status": "pending"}
+        ),
+    ],
+    "booking_archive": [
+        # History pages continue into the archive with the same keyset as bookings
+        IndexModel(
+            [("customer_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+            name="customer_id_created_at_id"
+        ),
+        IndexModel([("created_at", ASCENDING)], name="created_at"),
+    ],
+    "jobs": [
+        IndexModel([("status", ASCENDING), ("run_at", ASCENDING)], name="status_run_at"),
+        IndexModel([("status", ASCENDING), ("lease_until", ASCENDING)], name="status_lease_until"),
+        IndexModel(
+            [("dedup_key", ASCENDING)],
+            name="dedup_key_unique",
+            unique=True,
+            partialFilterExpression={"dedup_key": {"$exists": True}}
+        ),
+    ],
+    "notifications": [
+        IndexModel([("status", ASCENDING), ("next_attempt_at", ASCENDING)], name="status_next_attempt_at"),
+        IndexModel([("status", ASCENDING), ("lease_until", ASCENDING)], name="status_lease_until"),
+        # One notification per recipient and event
+        IndexModel(
+            [("dedup_key", ASCENDING)],
+            name="dedup_key_unique",
+            unique=True,
+            partialFilterExpression={"dedup_key": {"$exists": True}}
+        ),
+        # Delivered notifications are only kept for a week
+        IndexModel(
+            [("sent_at", ASCENDING)],
+            name="sent_at_ttl",
+            expireAfterSeconds=7 * 24 * 3600,
+            partialFilterExpression={"status": "sent"}
+        ),
+    ],
+    "transactions": [
+        # Per-wallet ledger order; also the history pagination key
+        IndexModel([("customer_id", ASCENDING), ("seq", DESCENDING)], name="customer_id_seq_unique", unique=True),
+        IndexModel(
+            [("customer_id", ASCENDING), ("reference", ASCENDING)],
+            name="customer_id_reference_unique",
+            unique=True,
+            partialFilterExpression={"reference": {"$exists": True}}
+        ),
+    ],
+    "wallet_snapshots": [
+        IndexModel([("customer_id", ASCENDING), ("seq", DESCENDING)], name="customer_id_seq"),
+    ],
+    "booking_rollups": [
+        IndexModel([("day", ASCENDING), ("city", ASCENDING), ("category_id", ASCENDING)], name="day_city_category_id"),
+    ],
+    "slot_capacity": [
+        IndexModel([("category_id", ASCENDING), ("pincode", ASCENDING)], name="category_id_pincode_unique", unique=True),
+    ],
+    "otps": [
+        # Mongo deletes unused codes once they expire
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "refresh_tokens": [
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+        IndexModel([("customer_id", ASCENDING)], name="customer_id"),
+    ],
+    "workers": [
+        IndexModel(
+            [("status", ASCENDING), ("location", GEOSPHERE), ("skills", ASCENDING)],
+            name="status_location_skills"
+        ),
+    ],
+}
+
+# One representative query per endpoint that hits Mongo: (name, collection, filter, sort)
+ENDPOINT_QUERIES = [
+    ("verify_otp", "users", {"phone": "0000000000"}, None),
+    ("cart", "carts", {"customer_id": "000000000000000000000000"}, None),
+    ("get_categories", "categories", {"type": "home"}, None),
+    ("get_category_services", "services", {"category_id": "000000000000000000000000"}, None),
+    ("get_customer_bookings", "bookings", {"customer_id": "000000000000000000000000"}, [("created_at", DESCENDING), ("_id", DESCENDING)]),
+]
+
+
+async def ensure_indexes(db):
+    # create_indexes is a no-op for indexes that already exist with the same spec
+    for collection, indexes in REQUIRED_INDEXES.items():
+        await db[collection].create_indexes(indexes)
+
+
+def _plan_stages(plan):
+    yield plan.get("stage")
+    if "inputStage" in plan:
+        yield from _plan_stages(plan["inputStage"])
+    for child in plan.get("inputStages", []):
+        yield from _plan_stages(child)
+
+
+async def check_query_plans(db):
+    """Explain each endpoint query and return the names of those that scan a whole collection."""
+    collscans = []
+    for name, collection, query, sort in ENDPOINT_QUERIES:
+        cursor = db[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        explained = await cursor.explain()
+        stages = set(_plan_stages(explained["queryPlanner"]["winningPlan"]))
+        if "COLLSCAN" in stages:
+            collscans.append(name)
+    return collscans
+
+
+async def main(check: bool):
+    try:
+        await ensure_indexes(db)
+        print("Indexes are in place")
+        if check:
+            collscans = await check_query_plans(db)
+            if collscans:
+                print(f"COLLSCAN in query plan for: {', '.join(collscans)}")
+                return 1
+            print("All endpoint queries use an index")
+        return 0
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(check="--check" in sys.argv)))
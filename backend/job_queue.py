@@ -0,0 +1,235 @@
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Optional
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+DEAD = "dead"
+
+# A handler returns None when the job is finished, or a delay in seconds to
+# run it again later (without counting as a failed attempt)
+JobHandler = Callable[[dict], Awaitable[Optional[float]]]
+
+
+class JobQueue:
+    """Durable job queue stored in a Mongo collection.
+
+    Workers claim a job by atomically flipping it to running with a lease and
+    a fresh lease token. Completion and failure are only accepted with the
+    token from the claim, so a worker whose lease expired (and whose job was
+    handed to someone else) cannot finish it twice. Expired leases are put
+    back on the queue by `requeue_expired`. Jobs that fail `max_attempts`
+    times are dead-lettered.
+    """
+
+    def __init__(self, db, collection: str = "jobs", lease_seconds: float = 30.0,
+                 max_attempts: int = 5, backoff_seconds: float = 2.0):
+        self.collection = db[collection]
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+
+    async def enqueue(self, kind: str, payload: dict, dedup_key: Optional[str] = None,
+                      run_at: Optional[datetime] = None, session=None) -> Optional[str]:
+        # Pass `session` to enqueue inside a transaction, so the job exists
+        # if and only if the caller's writes commit
+        now = datetime.utcnow()
+        job = {
+            "kind": kind,
+            "payload": payload,
+            "status": QUEUED,
+            "attempts": 0,
+            "created_at": now,
+            "run_at": run_at or now,
+        }
+        if dedup_key:
+            job["dedup_key"] = dedup_key
+        try:
+            result = await self.collection.insert_one(job, session=session)
+        except DuplicateKeyError:
+            # Already enqueued (e.g. a retried request)
+            return None
+        return str(result.inserted_id)
+
+    async def claim(self, worker_id: str) -> Optional[dict]:
+        now = datetime.utcnow()
+        return await self.collection.find_one_and_update(
+            {"status": QUEUED, "run_at": {"$lte": now}},
+            {
+                "$set": {
+                    "status": RUNNING,
+                    "worker_id": worker_id,
+                    "lease_token": uuid.uuid4().hex,
+                    "lease_until": now + timedelta(seconds=self.lease_seconds),
+                    "started_at": now,
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("run_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    def _owned(self, job: dict) -> dict:
+        return {"_id": job["_id"], "status": RUNNING, "lease_token": job["lease_token"]}
+
+    async def extend_lease(self, job: dict) -> bool:
+        result = await self.collection.update_one(
+            self._owned(job),
+            {"$set": {"lease_until": datetime.utcnow() + timedelta(seconds=self.lease_seconds)}}
+        )
+        return result.modified_count == 1
+
+    async def complete(self, job: dict) -> bool:
+        result = await self.collection.update_one(
+            self._owned(job),
+            {"$set": {"status": DONE, "finished_at": datetime.utcnow()}, "$unset": {"lease_token": ""}}
+        )
+        return result.modified_count == 1
+
+    async def reschedule(self, job: dict, delay: float) -> bool:
+        # Not a failure: give the attempt back so polling jobs never dead-letter
+        result = await self.collection.update_one(
+            self._owned(job),
+            {
+                "$set": {"status": QUEUED, "run_at": datetime.utcnow() + timedelta(seconds=delay)},
+                "$inc": {"attempts": -1},
+                "$unset": {"lease_token": "", "lease_until": ""},
+            }
+        )
+        return result.modified_count == 1
+
+    async def fail(self, job: dict, error: str) -> bool:
+        if job["attempts"] >= self.max_attempts:
+            update = {"$set": {"status": DEAD, "error": error, "finished_at": datetime.utcnow()}}
+        else:
+            delay = self.backoff_seconds * 2 ** (job["attempts"] - 1)
+            update = {"$set": {
+                "status": QUEUED,
+                "error": error,
+                "run_at": datetime.utcnow() + timedelta(seconds=delay),
+            }}
+        update["$unset"] = {"lease_token": "", "lease_until": ""}
+        result = await self.collection.update_one(self._owned(job), update)
+        return result.modified_count == 1
+
+    async def requeue_expired(self) -> int:
+        # Jobs whose worker crashed or hung past its lease go back on the queue;
+        # ones that have used up their attempts are dead-lettered instead
+        now = datetime.utcnow()
+        expired = {"status": RUNNING, "lease_until": {"$lte": now}}
+        dead = await self.collection.update_many(
+            {**expired, "attempts": {"$gte": self.max_attempts}},
+            {"$set": {"status": DEAD, "error": "lease expired", "finished_at": now},
+             "$unset": {"lease_token": "", "lease_until": ""}}
+        )
+        requeued = await self.collection.update_many(
+            expired,
+            {"$set": {"status": QUEUED, "run_at": now}, "$unset": {"lease_token": "", "lease_until": ""}}
+        )
+        return dead.modified_count + requeued.modified_count
+
+    async def depth(self) -> Dict[str, int]:
+        counts = {QUEUED: 0, RUNNING: 0, DEAD: 0}
+        async for row in self.collection.aggregate([
+            {"$match": {"status": {"$in": list(counts)}}},
+            {"$group": {"_id": "$status", "count": {"$sum": 1}}},
+        ]):
+            counts[row["_id"]] = row["count"]
+        return counts
+
+    async def retry_dead(self, job_id: str) -> bool:
+        result = await self.collection.update_one(
+            {"_id": ObjectId(job_id), "status": DEAD},
+            {"$set": {"status": QUEUED, "attempts": 0, "run_at": datetime.utcnow()}}
+        )
+        return result.modified_count == 1
+
+
+class JobWorkerPool:
+    """Runs queued jobs in the background with at most `concurrency` at once."""
+
+    def __init__(self, queue: JobQueue, handlers: Dict[str, JobHandler], concurrency: int = 8,
+                 poll_interval: float = 0.5):
+        self.queue = queue
+        self.handlers = handlers
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.worker_id = uuid.uuid4().hex
+        self._tasks = []
+
+    async def _run_job(self, job: dict):
+        handler = self.handlers.get(job["kind"])
+        started = time.perf_counter()
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            if handler is None:
+                raise RuntimeError(f"No handler for job kind {job['kind']!r}")
+            delay = await handler(job)
+        except asyncio.CancelledError:
+            # Shutting down: leave the job to be picked up when its lease expires
+            raise
+        except Exception as exc:
+            logger.exception("Job %s (%s) failed", job["_id"], job["kind"])
+            await self.queue.fail(job, repr(exc))
+            outcome = "dead" if job["attempts"] >= self.queue.max_attempts else "retry"
+        else:
+            if delay is None:
+                await self.queue.complete(job)
+                outcome = "done"
+            else:
+                await self.queue.reschedule(job, delay)
+                outcome = "rescheduled"
+        finally:
+            heartbeat.cancel()
+        wait = (job["started_at"] - job["run_at"]).total_seconds()
+        registry.observe_job(job["kind"], outcome, max(wait, 0.0), time.perf_counter() - started)
+
+    async def _heartbeat(self, job: dict):
+        while True:
+            await asyncio.sleep(self.queue.lease_seconds / 3)
+            if not await self.queue.extend_lease(job):
+                return
+
+    async def _worker(self):
+        while True:
+            try:
+                job = await self.queue.claim(self.worker_id)
+            except Exception:
+                logger.exception("Failed to claim a job")
+                job = None
+            if job is None:
+                await asyncio.sleep(self.poll_interval)
+                continue
+            await self._run_job(job)
+
+    async def _reaper(self):
+        while True:
+            await asyncio.sleep(self.queue.lease_seconds / 2)
+            try:
+                requeued = await self.queue.requeue_expired()
+                if requeued:
+                    logger.warning("Requeued %d jobs with expired leases", requeued)
+            except Exception:
+                logger.exception("Lease reaper failed")
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        self._tasks.append(asyncio.create_task(self._reaper()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
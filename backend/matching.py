@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+from analytics import record_status_change
+from booking_events import hub
+from notifications import notify_booking
+from slots import release_slots
+
+logger = logging.getLogger(__name__)
+
+MATCH_TIMEOUT_SECONDS = int(os.environ.get('MATCH_TIMEOUT_SECONDS', '180'))
+MATCH_RADIUS_METERS = float(os.environ.get('MATCH_RADIUS_KM', '10')) * 1000
+
+WORKER_AVAILABLE = "available"
+WORKER_ASSIGNED = "assigned"
+
+
+def point(latitude: float, longitude: float) -> dict:
+    # GeoJSON stores coordinates as [longitude, latitude]
+    return {"type": "Point", "coordinates": [longitude, latitude]}
+
+
+def booking_location(booking: dict) -> Optional[dict]:
+    address = booking.get("address") or {}
+    if address.get("latitude") is None or address.get("longitude") is None:
+        return None
+    return point(address["latitude"], address["longitude"])
+
+
+def required_skills(booking: dict, services_by_id: dict) -> List[str]:
+    # A worker must be qualified for every category the booking touches
+    skills = set()
+    for item in booking.get("services", []):
+        service = services_by_id.get(item["service_id"])
+        if service:
+            skills.add(service["category_id"])
+    return sorted(skills)
+
+
+async def claim_nearest_worker(db, booking_id: str, location: dict, skills: List[str]) -> Optional[dict]:
+    """Atomically assign the nearest available qualified worker to a booking.
+
+    The $nearSphere filter walks the 2dsphere index in distance order and
+    findAndModify flips the first match to assigned, so two bookings can
+    never claim the same worker.
+    """
+    query = {
+        "status": WORKER_AVAILABLE,
+        "location": {"$nearSphere": {"$geometry": location, "$maxDistance": MATCH_RADIUS_METERS}},
+    }
+    if skills:
+        query["skills"] = {"$all": skills}
+    return await db.workers.find_one_and_update(
+        query,
+        {"$set": {"status": WORKER_ASSIGNED, "booking_id": booking_id, "assigned_at": datetime.utcnow()}},
+        return_document=ReturnDocument.AFTER
+    )
+
+
+async def release_worker(db, worker_id, booking_id: str):
+    await db.workers.update_one(
+        {"_id": ObjectId(worker_id), "booking_id": booking_id},
+        {"$set": {"status": WORKER_AVAILABLE}, "$unset": {"booking_id": "", "assigned_at": ""}}
+    )
+
+
+async def match_booking(db, booking: dict, services_by_id: dict) -> dict:
+    """Try once to find a provider for a pending booking; returns the booking's new state."""
+    booking_id = str(booking["_id"])
+    if booking.get("status") != "pending":
+        return booking
+
+    if booking.get("match_deadline") and booking["match_deadline"] <= datetime.utcnow():
+        return await expire_booking(db, booking) or booking
+
+    location = booking_location(booking)
+    if location is None:
+        return booking
+
+    worker = await claim_nearest_worker(db, booking_id, location, required_skills(booking, services_by_id))
+    if worker is None:
+        return booking
+
+    updated = await db.bookings.find_one_and_update(
+        {"_id": booking["_id"], "status": "pending"},
+        {"$set": {"status": "assigned", "worker_id": str(worker["_id"]), "assigned_at": worker["assigned_at"]}},
+        return_document=ReturnDocument.AFTER
+    )
+    if updated is None:
+        # Booking was cancelled or matched elsewhere in the meantime
+        await release_worker(db, worker["_id"], booking_id)
+        return await db.bookings.find_one({"_id": booking["_id"]}) or booking
+    await record_status_change(db, updated, "pending", "assigned")
+    await notify_booking(db, updated, "assigned")
+    hub.publish(updated)
+    return updated
+
+
+async def expire_booking(db, booking: dict) -> Optional[dict]:
+    expired = await db.bookings.find_one_and_update(
+        {"_id": booking["_id"], "status": "pending"},
+        {"$set": {"status": "expired"}},
+        return_document=ReturnDocument.AFTER
+    )
+    if expired is not None:
+        # Nobody will turn up, so the slot goes back on sale
+        await release_slots(db, expired.get("slot_reservations", []))
+        await record_status_change(db, expired, "pending", "expired")
+        await notify_booking(db, expired, "expired")
+        hub.publish(expired)
+    return expired
+
+
+def match_deadline(created_at: datetime) -> datetime:
+    return created_at + timedelta(seconds=MATCH_TIMEOUT_SECONDS)
+
+
+async def expire_unmatched(db) -> int:
+    # One update per booking (rather than update_many) so each customer is notified
+    overdue = db.bookings.find(
+        {"status": "pending", "match_deadline": {"$lte": datetime.utcnow()}},
+        {"_id": 1}
+    )
+    expired = 0
+    async for booking in overdue:
+        if await expire_booking(db, booking):
+            expired += 1
+    return expired
+
+
+async def run_expiry_loop(db, interval: float = 15.0):
+    # Bookings nobody accepted within MATCH_TIMEOUT_SECONDS stop showing as "finding provider"
+    while True:
+        try:
+            expired = await expire_unmatched(db)
+            if expired:
+                logger.info("Expired %d unmatched bookings", expired)
+        except Exception:
+            logger.exception("Booking expiry sweep failed")
+        await asyncio.sleep(interval)
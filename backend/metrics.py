@@ -0,0 +1,253 @@
+import logging
+import random
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds, Prometheus convention
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class RequestTrace:
+    """Mongo commands issued while serving one request."""
+
+    def __init__(self):
+        self.commands: List[Tuple[str, str, float]] = []  # (command, collection, ms)
+        self.pending: Dict[int, str] = {}  # request_id -> collection of in-flight commands
+
+    @property
+    def mongo_ms(self) -> float:
+        return sum(ms for _, _, ms in self.commands)
+
+
+# Set by MetricsMiddleware for the duration of each request. Motor copies the
+# context into its executor threads, so command events see the same trace.
+current_trace: ContextVar[Optional[RequestTrace]] = ContextVar("current_trace", default=None)
+
+
+class Histogram:
+    def __init__(self):
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float):
+        self.count += 1
+        self.sum += seconds
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                break
+
+
+def _labels(**labels) -> str:
+    parts = []
+    for key, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{key}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _histogram_lines(name: str, hist: Histogram, **labels) -> List[str]:
+    lines = []
+    cumulative = 0
+    for bound, count in zip(LATENCY_BUCKETS, hist.buckets):
+        cumulative += count
+        lines.append(f"{name}_bucket{_labels(**labels, le=bound)} {cumulative}")
+    lines.append(f"{name}_bucket{_labels(**labels, le='+Inf')} {hist.count}")
+    lines.append(f"{name}_sum{_labels(**labels)} {hist.sum}")
+    lines.append(f"{name}_count{_labels(**labels)} {hist.count}")
+    return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.request_latency: Dict[Tuple[str, str], Histogram] = {}
+        self.request_status: Dict[Tuple[str, str, int], int] = {}
+        self.request_mongo_commands: Dict[Tuple[str, str], int] = {}
+        self.request_mongo_seconds: Dict[Tuple[str, str], float] = {}
+        self.mongo_commands: Dict[str, int] = {}
+        self.mongo_seconds: Dict[str, float] = {}
+        self.mongo_failures: Dict[str, int] = {}
+        self.job_wait: Dict[str, Histogram] = {}
+        self.job_run: Dict[str, Histogram] = {}
+        self.job_outcomes: Dict[Tuple[str, str], int] = {}
+        self.notification_delay: Dict[str, Histogram] = {}
+        self.notification_outcomes: Dict[Tuple[str, str], int] = {}
+
+    def observe_request(self, method: str, route: str, status_code: int, seconds: float, trace: RequestTrace):
+        key = (method, route)
+        with self._lock:
+            self.request_latency.setdefault(key, Histogram()).observe(seconds)
+            status_key = (method, route, status_code)
+            self.request_status[status_key] = self.request_status.get(status_key, 0) + 1
+            self.request_mongo_commands[key] = self.request_mongo_commands.get(key, 0) + len(trace.commands)
+            self.request_mongo_seconds[key] = self.request_mongo_seconds.get(key, 0.0) + trace.mongo_ms / 1000
+
+    def observe_command(self, command: str, seconds: float, failed: bool):
+        with self._lock:
+            self.mongo_commands[command] = self.mongo_commands.get(command, 0) + 1
+            self.mongo_seconds[command] = self.mongo_seconds.get(command, 0.0) + seconds
+            if failed:
+                self.mongo_failures[command] = self.mongo_failures.get(command, 0) + 1
+
+    def observe_job(self, kind: str, outcome: str, wait_seconds: float, run_seconds: float):
+        with self._lock:
+            self.job_wait.setdefault(kind, Histogram()).observe(wait_seconds)
+            self.job_run.setdefault(kind, Histogram()).observe(run_seconds)
+            key = (kind, outcome)
+            self.job_outcomes[key] = self.job_outcomes.get(key, 0) + 1
+
+    def observe_notification(self, channel: str, outcome: str, delay_seconds: float):
+        with self._lock:
+            if outcome == "sent":
+                self.notification_delay.setdefault(channel, Histogram()).observe(delay_seconds)
+            key = (channel, outcome)
+            self.notification_outcomes[key] = self.notification_outcomes.get(key, 0) + 1
+
+    def render(self, gauges: Optional[Dict[str, float]] = None) -> str:
+        lines = []
+        with self._lock:
+            lines.append("# HELP http_request_duration_seconds Request latency per route template")
+            lines.append("# TYPE http_request_duration_seconds histogram")
+            for (method, route), hist in sorted(self.request_latency.items()):
+                lines.extend(_histogram_lines("http_request_duration_seconds", hist, method=method, route=route))
+
+            lines.append("# HELP http_requests_total Requests per route template and status")
+            lines.append("# TYPE http_requests_total counter")
+            for (method, route, status_code), count in sorted(self.request_status.items()):
+                lines.append(f"http_requests_total{_labels(method=method, route=route, status=status_code)} {count}")
+
+            lines.append("# HELP http_request_mongo_commands_total Mongo commands issued while serving each route")
+            lines.append("# TYPE http_request_mongo_commands_total counter")
+            for (method, route), count in sorted(self.request_mongo_commands.items()):
+                lines.append(f"http_request_mongo_commands_total{_labels(method=method, route=route)} {count}")
+
+            lines.append("# HELP http_request_mongo_seconds_total Time spent in Mongo commands per route")
+            lines.append("# TYPE http_request_mongo_seconds_total counter")
+            for (method, route), seconds in sorted(self.request_mongo_seconds.items()):
+                lines.append(f"http_request_mongo_seconds_total{_labels(method=method, route=route)} {seconds}")
+
+            lines.append("# HELP mongo_commands_total Mongo commands by name")
+            lines.append("# TYPE mongo_commands_total counter")
+            for command, count in sorted(self.mongo_commands.items()):
+                lines.append(f"mongo_commands_total{_labels(command=command)} {count}")
+
+            lines.append("# HELP mongo_command_seconds_total Mongo command time by name")
+            lines.append("# TYPE mongo_command_seconds_total counter")
+            for command, seconds in sorted(self.mongo_seconds.items()):
+                lines.append(f"mongo_command_seconds_total{_labels(command=command)} {seconds}")
+
+            lines.append("# HELP mongo_command_failures_total Failed Mongo commands by name")
+            lines.append("# TYPE mongo_command_failures_total counter")
+            for command, count in sorted(self.mongo_failures.items()):
+                lines.append(f"mongo_command_failures_total{_labels(command=command)} {count}")
+
+            lines.append("# HELP job_wait_seconds Time jobs spent queued past their run_at")
+            lines.append("# TYPE job_wait_seconds histogram")
+            for kind, hist in sorted(self.job_wait.items()):
+                lines.extend(_histogram_lines("job_wait_seconds", hist, kind=kind))
+
+            lines.append("# HELP job_run_seconds Job handler run time")
+            lines.append("# TYPE job_run_seconds histogram")
+            for kind, hist in sorted(self.job_run.items()):
+                lines.extend(_histogram_lines("job_run_seconds", hist, kind=kind))
+
+            lines.append("# HELP jobs_total Jobs processed by kind and outcome")
+            lines.append("# TYPE jobs_total counter")
+            for (kind, outcome), count in sorted(self.job_outcomes.items()):
+                lines.append(f"jobs_total{_labels(kind=kind, outcome=outcome)} {count}")
+
+            lines.append("# HELP notification_delivery_seconds Time from enqueue to delivery")
+            lines.append("# TYPE notification_delivery_seconds histogram")
+            for channel, hist in sorted(self.notification_delay.items()):
+                lines.extend(_histogram_lines("notification_delivery_seconds", hist, channel=channel))
+
+            lines.append("# HELP notifications_total Delivery attempts by channel and outcome")
+            lines.append("# TYPE notifications_total counter")
+            for (channel, outcome), count in sorted(self.notification_outcomes.items()):
+                lines.append(f"notifications_total{_labels(channel=channel, outcome=outcome)} {count}")
+
+        for name, value in sorted((gauges or {}).items()):
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """Feeds Motor command events into the registry and the current request's trace."""
+
+    def started(self, event):
+        trace = current_trace.get()
+        if trace is not None:
+            collection = event.command.get(event.command_name)
+            trace.pending[event.request_id] = collection if isinstance(collection, str) else ""
+
+    def _finished(self, event, failed: bool):
+        seconds = event.duration_micros / 1_000_000
+        registry.observe_command(event.command_name, seconds, failed)
+        trace = current_trace.get()
+        if trace is not None:
+            collection = trace.pending.pop(event.request_id, "")
+            trace.commands.append((event.command_name, collection, seconds * 1000))
+
+    def succeeded(self, event):
+        self._finished(event, failed=False)
+
+    def failed(self, event):
+        self._finished(event, failed=True)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency per route template and the Mongo work behind it.
+
+    Requests slower than `slow_ms` are logged with their Mongo commands, for
+    a `sample_rate` fraction of them.
+    """
+
+    def __init__(self, app, slow_ms: float = 500.0, sample_rate: float = 1.0):
+        self.app = app
+        self.slow_ms = slow_ms
+        self.sample_rate = sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace = RequestTrace()
+        token = current_trace.set(trace)
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            seconds = time.perf_counter() - started
+            current_trace.reset(token)
+            # FastAPI stores the matched route in the scope; use its template so
+            # /api/booking/<id> requests share one series
+            route = scope.get("route")
+            template = getattr(route, "path", None) or "unmatched"
+            registry.observe_request(scope["method"], template, status_code, seconds, trace)
+            if seconds * 1000 >= self.slow_ms and random.random() < self.sample_rate:
+                commands = ", ".join(f"{cmd}({coll}) {ms:.1f}ms" for cmd, coll, ms in trace.commands)
+                logger.warning(
+                    "Slow request %s %s took %.1fms, %d Mongo commands (%.1fms): %s",
+                    scope["method"], template, seconds * 1000, len(trace.commands), trace.mongo_ms, commands
+                )
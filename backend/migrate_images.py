@@ -0,0 +1,70 @@
+import argparse
+import asyncio
+import base64
+
+from blob_store import CHUNK_SIZE, create_blob_store
+from database import client, db
+
+
+def decode_inline_image(value: str):
+    # Inline images are either bare base64 or a "data:image/png;base64,..." URI
+    content_type = "image/jpeg"
+    if value.startswith("data:"):
+        header, value = value.split(",", 1)
+        content_type = header[5:].split(";", 1)[0] or content_type
+    return base64.b64decode(value), content_type
+
+
+async def iter_chunks(data: bytes):
+    for i in range(0, len(data), CHUNK_SIZE):
+        yield data[i:i + CHUNK_SIZE]
+
+
+async def migrate_booking(db, blob_store, booking: dict) -> int:
+    image_ids = []
+    for value in booking.get("images", []):
+        data, content_type = decode_inline_image(value)
+        info = await blob_store.save(iter_chunks(data), content_type)
+        image_ids.append(info.blob_id)
+    # Only unset the inline images if nobody rewrote them while we were uploading
+    await db.bookings.update_one(
+        {"_id": booking["_id"], "images": booking["images"]},
+        {"$push": {"image_ids": {"$each": image_ids}}, "$unset": {"images": ""}}
+    )
+    return len(image_ids)
+
+
+async def migrate_images(batch_size: int, concurrency: int):
+    blob_store = create_blob_store(db)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def migrate_one(booking):
+        async with semaphore:
+            return await migrate_booking(db, blob_store, booking)
+
+    migrated_bookings = 0
+    migrated_images = 0
+    try:
+        while True:
+            # Migrated bookings lose their "images" field, so each batch picks up where the last stopped
+            batch = await db.bookings.find(
+                {"images": {"$exists": True}},
+                {"images": 1}
+            ).limit(batch_size).to_list(batch_size)
+            if not batch:
+                break
+            counts = await asyncio.gather(*(migrate_one(booking) for booking in batch))
+            migrated_bookings += len(batch)
+            migrated_images += sum(counts)
+            print(f"Migrated {migrated_bookings} bookings ({migrated_images} images)")
+    finally:
+        client.close()
+    print("Image migration completed!")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move inline base64 booking images into the blob store")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+    asyncio.run(migrate_images(args.batch_size, args.concurrency))
@@ -0,0 +1,385 @@
+import argparse
+import asyncio
+import logging
+import os
+import random
+import time
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import httpx
+import orjson
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from metrics import registry
+from sms import SmsSender, create_sms_sender
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+SENDING = "sending"
+SENT = "sent"
+DEAD = "dead"
+
+SMS = "sms"
+PUSH = "push"
+
+
+async def enqueue(db, channel: str, recipient: str, kind: str, message: str, data: Optional[dict] = None,
+                  dedup_key: Optional[str] = None, session=None) -> Optional[str]:
+    """Write a notification to the outbox; the dispatcher sends it later.
+
+    `recipient` is a phone number for SMS and a customer id for push. Pass
+    `session` to write it in the caller's transaction, so it is sent if and
+    only if the caller's writes commit. A `dedup_key` is unique per
+    recipient and event: the second notification with the same key is
+    dropped, so a retried handler cannot message anyone twice.
+    """
+    now = datetime.utcnow()
+    notification = {
+        "channel": channel,
+        "recipient": recipient,
+        "kind": kind,
+        "message": message,
+        "data": data or {},
+        "status": QUEUED,
+        "attempts": 0,
+        "created_at": now,
+        "next_attempt_at": now,
+    }
+    if dedup_key:
+        notification["dedup_key"] = f"{channel}:{recipient}:{dedup_key}"
+    try:
+        result = await db.notifications.insert_one(notification, session=session)
+    except DuplicateKeyError:
+        return None
+    return str(result.inserted_id)
+
+
+BOOKING_MESSAGES = {
+    "confirmed": "Your booking for {services} is confirmed. We are finding a provider.",
+    "assigned": "A provider has been assigned to your booking for {services}.",
+    "expired": "We could not find a provider for {services}. Your slot has been released.",
+}
+
+
+async def notify_booking(db, booking: dict, event: str, session=None) -> Optional[str]:
+    # Push to the customer's devices; at most one per booking and event
+    booking_id = str(booking["_id"])
+    services = ", ".join(line["title"] for line in booking.get("services", [])) or "your service"
+    return await enqueue(
+        db, PUSH, booking["customer_id"], f"booking_{event}", BOOKING_MESSAGES[event].format(services=services),
+        {"booking_id": booking_id, "status": booking["status"]},
+        dedup_key=f"booking_{event}:{booking_id}", session=session
+    )
+
+
+class Transport(ABC):
+    """Delivers a batch of notifications for one channel.
+
+    Returns one entry per notification, in order: None when it was
+    delivered, otherwise the error to record before retrying.
+    """
+
+    @abstractmethod
+    async def send_batch(self, notifications: List[dict]) -> List[Optional[str]]:
+        ...
+
+    async def close(self):
+        pass
+
+
+class SmsTransport(Transport):
+    """One gateway call per message, at most `concurrency` in flight."""
+
+    def __init__(self, sender: SmsSender, concurrency: int = 8):
+        self.sender = sender
+        self.semaphore = asyncio.Semaphore(concurrency)
+
+    async def _send(self, notification: dict) -> Optional[str]:
+        async with self.semaphore:
+            try:
+                await self.sender.send(notification["recipient"], notification["message"])
+            except Exception as exc:
+                return repr(exc)
+        return None
+
+    async def send_batch(self, notifications: List[dict]) -> List[Optional[str]]:
+        return list(await asyncio.gather(*(self._send(n) for n in notifications)))
+
+    async def close(self):
+        await self.sender.close()
+
+
+class LogPushTransport(Transport):
+    """Local stub: writes push notifications to the log instead of sending them."""
+
+    async def send_batch(self, notifications: List[dict]) -> List[Optional[str]]:
+        for notification in notifications:
+            logger.info("Push to %s: %s", notification["recipient"], notification["message"])
+        return [None] * len(notifications)
+
+
+class WebhookPushTransport(Transport):
+    """Posts the whole batch as one JSON array to a push gateway.
+
+    The gateway resolves a customer id to that customer's devices. A failed
+    request fails every message in the batch, so all of them are retried.
+    """
+
+    def __init__(self, url: str, api_key: str = "", timeout: float = 10.0):
+        self.url = url
+        headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        self.client = httpx.AsyncClient(timeout=timeout, headers=headers)
+
+    async def send_batch(self, notifications: List[dict]) -> List[Optional[str]]:
+        messages = [{
+            "id": str(n["_id"]), "to": n["recipient"], "kind": n["kind"], "message": n["message"], "data": n["data"]
+        } for n in notifications]
+        try:
+            response = await self.client.post(self.url, json=messages)
+            response.raise_for_status()
+        except Exception as exc:
+            return [repr(exc)] * len(notifications)
+        return [None] * len(notifications)
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class FileTransport(Transport):
+    """Appends every notification to a JSON Lines file (local runs and benchmarks)."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    async def send_batch(self, notifications: List[dict]) -> List[Optional[str]]:
+        lines = b"".join(orjson.dumps({
+            "id": str(n["_id"]), "channel": n["channel"], "to": n["recipient"], "kind": n["kind"],
+            "message": n["message"], "data": n["data"], "sent_at": datetime.utcnow(),
+        }) + b"\n" for n in notifications)
+        with open(self.path, "ab") as out:
+            out.write(lines)
+        return [None] * len(notifications)
+
+
+def create_transports() -> Dict[str, Transport]:
+    # NOTIFICATION_FILE sends every channel to one file, e.g. for local runs
+    path = os.environ.get('NOTIFICATION_FILE')
+    if path:
+        transport = FileTransport(path)
+        return {SMS: transport, PUSH: transport}
+
+    backend = os.environ.get('PUSH_BACKEND', 'log')
+    if backend == 'webhook':
+        push = WebhookPushTransport(os.environ['PUSH_WEBHOOK_URL'], os.environ.get('PUSH_API_KEY', ''))
+    elif backend == 'log':
+        push = LogPushTransport()
+    else:
+        raise ValueError(f"Unknown PUSH_BACKEND: {backend}")
+    sms = SmsTransport(create_sms_sender(), concurrency=int(os.environ.get('SMS_CONCURRENCY', '8')))
+    return {SMS: sms, PUSH: push}
+
+
+async def close_transports(transports: Dict[str, Transport]):
+    # One transport may serve several channels (and several regions' dispatchers)
+    for transport in {id(t): t for t in transports.values()}.values():
+        await transport.close()
+
+
+class NotificationDispatcher:
+    """Sends outbox notifications in batches through the channel transports.
+
+    Each of `concurrency` loops claims up to `batch_size` due notifications
+    at a time: one query picks them, one update_many marks them sending
+    under a fresh claim token, and results are written back in one bulk
+    write filtered on that token. Failures retry with exponential backoff
+    and are dead-lettered after `max_attempts`. A process that dies mid-send
+    leaves its claim to expire and be requeued, so delivery is at least once.
+    """
+
+    def __init__(self, db, transports: Dict[str, Transport], batch_size: int = 100, concurrency: int = 2,
+                 max_attempts: int = 5, backoff_seconds: float = 5.0, lease_seconds: float = 60.0,
+                 poll_interval: float = 1.0):
+        self.collection = db.notifications
+        self.transports = transports
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self._wakeup = asyncio.Event()
+        self._tasks = []
+
+    def wake(self):
+        # Called after enqueueing something urgent (an OTP), so it skips the poll delay
+        self._wakeup.set()
+
+    async def claim_batch(self) -> List[dict]:
+        now = datetime.utcnow()
+        due = self.collection.find(
+            {"status": QUEUED, "next_attempt_at": {"$lte": now}}, {"_id": 1}
+        ).sort("next_attempt_at", 1).limit(self.batch_size)
+        ids = [doc["_id"] async for doc in due]
+        if not ids:
+            return []
+        token = uuid.uuid4().hex
+        # Another dispatcher may have claimed some of these in between; the
+        # status filter means each one is only ever claimed once
+        await self.collection.update_many(
+            {"_id": {"$in": ids}, "status": QUEUED},
+            {
+                "$set": {"status": SENDING, "claim_token": token,
+                         "lease_until": now + timedelta(seconds=self.lease_seconds)},
+                "$inc": {"attempts": 1},
+            }
+        )
+        return await self.collection.find({"_id": {"$in": ids}, "claim_token": token}).to_list(None)
+
+    def _retry_at(self, attempts: int) -> datetime:
+        delay = self.backoff_seconds * 2 ** (attempts - 1)
+        return datetime.utcnow() + timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+    async def deliver(self, batch: List[dict]) -> int:
+        by_channel: Dict[str, List[dict]] = {}
+        for notification in batch:
+            by_channel.setdefault(notification["channel"], []).append(notification)
+
+        async def send(channel, notifications):
+            transport = self.transports.get(channel)
+            if transport is None:
+                return [f"No transport for channel {channel!r}"] * len(notifications)
+            try:
+                return await transport.send_batch(notifications)
+            except Exception as exc:
+                logger.exception("Transport %s failed", channel)
+                return [repr(exc)] * len(notifications)
+
+        results = await asyncio.gather(*(send(channel, items) for channel, items in by_channel.items()))
+
+        now = datetime.utcnow()
+        updates = []
+        sent = 0
+        for notifications, errors in zip(by_channel.values(), results):
+            for notification, error in zip(notifications, errors):
+                owned = {"_id": notification["_id"], "claim_token": notification["claim_token"]}
+                release = {"claim_token": "", "lease_until": ""}
+                if error is None:
+                    sent += 1
+                    outcome = "sent"
+                    update = {"$set": {"status": SENT, "sent_at": now}, "$unset": release}
+                elif notification["attempts"] >= self.max_attempts:
+                    outcome = "dead"
+                    update = {"$set": {"status": DEAD, "error": error}, "$unset": release}
+                else:
+                    outcome = "retry"
+                    update = {"$set": {"status": QUEUED, "error": error,
+                                       "next_attempt_at": self._retry_at(notification["attempts"])},
+                              "$unset": release}
+                updates.append(UpdateOne(owned, update))
+                delay = (now - notification["created_at"]).total_seconds()
+                registry.observe_notification(notification["channel"], outcome, delay)
+        await self.collection.bulk_write(updates, ordered=False)
+        return sent
+
+    async def requeue_expired(self) -> int:
+        result = await self.collection.update_many(
+            {"status": SENDING, "lease_until": {"$lte": datetime.utcnow()}},
+            {"$set": {"status": QUEUED, "next_attempt_at": datetime.utcnow()},
+             "$unset": {"claim_token": "", "lease_until": ""}}
+        )
+        return result.modified_count
+
+    async def depth(self) -> Dict[str, int]:
+        counts = {QUEUED: 0, SENDING: 0, DEAD: 0}
+        async for row in self.collection.aggregate([
+            {"$match": {"status": {"$in": list(counts)}}},
+            {"$group": {"_id": "$status", "count": {"$sum": 1}}},
+        ]):
+            counts[row["_id"]] = row["count"]
+        return counts
+
+    async def _loop(self):
+        while True:
+            try:
+                batch = await self.claim_batch()
+                if batch:
+                    await self.deliver(batch)
+            except Exception:
+                logger.exception("Notification dispatch failed")
+                batch = []
+            # A full batch means there is probably more waiting
+            if len(batch) < self.batch_size:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _reaper(self):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 2)
+            try:
+                requeued = await self.requeue_expired()
+                if requeued:
+                    logger.warning("Requeued %d notifications with expired claims", requeued)
+            except Exception:
+                logger.exception("Notification reaper failed")
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._loop()) for _ in range(self.concurrency)]
+        self._tasks.append(asyncio.create_task(self._reaper()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+
+async def benchmark(count: int, batch_size: int, concurrency: int, path: str):
+    """Enqueue `count` notifications and time the dispatcher draining them to a file."""
+    from database import client, db
+
+    try:
+        run = uuid.uuid4().hex[:8]
+        transport = FileTransport(path)
+        dispatcher = NotificationDispatcher(db, {SMS: transport, PUSH: transport}, batch_size=batch_size,
+                                            concurrency=concurrency, poll_interval=0.05)
+        dispatcher.start()
+        started = time.perf_counter()
+        for i in range(count):
+            await enqueue(db, PUSH, f"benchmark-{i % 1000}", "benchmark", "Benchmark message",
+                          {"run": run}, dedup_key=f"{run}:{i}")
+        enqueued = time.perf_counter() - started
+        while await db.notifications.count_documents({"data.run": run, "status": {"$ne": SENT}}):
+            await asyncio.sleep(0.05)
+        elapsed = time.perf_counter() - started
+        await dispatcher.stop()
+
+        delays = sorted([
+            (doc["sent_at"] - doc["created_at"]).total_seconds() * 1000
+            async for doc in db.notifications.find({"data.run": run}, {"created_at": 1, "sent_at": 1})
+        ])
+        print(f"enqueued {count} in {enqueued:.2f}s, all sent after {elapsed:.2f}s "
+              f"({count / elapsed:.0f}/s with batch {batch_size} x {concurrency})")
+        print(f"enqueue-to-send delay p50 {delays[len(delays) // 2]:.0f} ms, "
+              f"p99 {delays[int(len(delays) * 0.99) - 1]:.0f} ms, max {delays[-1]:.0f} ms")
+        await db.notifications.delete_many({"data.run": run})
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure outbox dispatch throughput and end-to-end delay")
+    parser.add_argument("--count", type=int, default=10_000)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=2)
+    parser.add_argument("--out", default="/tmp/notifications-benchmark.jsonl")
+    args = parser.parse_args()
+    asyncio.run(benchmark(args.count, args.batch_size, args.concurrency, args.out))
@@ -0,0 +1,34 @@
+import time
+from collections import OrderedDict
+from typing import Tuple
+
+
+class TokenBucket:
+    """Per-key token buckets held in process memory.
+
+    Each key starts with `capacity` tokens and regains `refill_per_second`
+    up to that capacity. Buckets are refilled lazily on access, so idle keys
+    cost nothing but a slot in the bounded table; the least recently used
+    key is dropped once `max_keys` is exceeded (it simply starts full again).
+    """
+
+    def __init__(self, capacity: float, refill_per_second: float, max_keys: int = 100_000):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    def take(self, key: str, cost: float = 1.0) -> float:
+        """Spend `cost` tokens; returns 0 on success or the seconds until enough have refilled."""
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (self.capacity, now))
+        tokens = min(self.capacity, tokens + (now - updated) * self.refill_per_second)
+        wait = 0.0
+        if tokens >= cost:
+            tokens -= cost
+        else:
+            wait = (cost - tokens) / self.refill_per_second
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return wait
@@ -0,0 +1,203 @@
+import bisect
+import heapq
+import re
+from typing import Dict, List, Optional, Set, Tuple
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Field weights: a hit in the title outranks one in the category name or description
+TITLE_WEIGHT = 3.0
+CATEGORY_WEIGHT = 1.5
+DESCRIPTION_WEIGHT = 1.0
+PREFIX_FACTOR = 0.7
+TYPO_FACTOR = 0.5
+
+# Bound the work a very short prefix ("a") can cause
+MAX_PREFIX_EXPANSIONS = 40
+MIN_TYPO_LENGTH = 4
+# Results for queries this short are memoised until the next sync; they
+# expand to the most postings and there are only a few thousand of them
+SHORT_QUERY_LENGTH = 2
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return TOKEN_RE.findall(text.lower()) if text else []
+
+
+def deletes(token: str) -> Set[str]:
+    # All strings one deletion away; two tokens within edit distance 1 share one of these
+    return {token[:i] + token[i + 1:] for i in range(len(token))}
+
+
+class SearchIndex:
+    """In-memory inverted index over service titles, descriptions and category names.
+
+    `sync` brings the index up to date with a catalog snapshot, touching
+    only services that were added, removed or changed. Lookups support
+    prefix matching on the last query term (typeahead) and single-edit typo
+    tolerance via a deletion neighbourhood, so neither needs a scan of the
+    vocabulary.
+    """
+
+    def __init__(self):
+        self.version: Optional[int] = None
+        self.postings: Dict[str, Dict[str, float]] = {}
+        self.vocab: List[str] = []
+        self.typos: Dict[str, Set[str]] = {}
+        self.docs: Dict[str, dict] = {}
+        self._doc_terms: Dict[str, Dict[str, float]] = {}
+        self._doc_keys: Dict[str, tuple] = {}
+        self._short_results: Dict[tuple, List[dict]] = {}
+
+    def _terms(self, service: dict, category: Optional[dict]) -> Dict[str, float]:
+        terms: Dict[str, float] = {}
+        fields = (
+            (service.get("description"), DESCRIPTION_WEIGHT),
+            (category.get("name") if category else None, CATEGORY_WEIGHT),
+            (service.get("title"), TITLE_WEIGHT),
+        )
+        for text, weight in fields:
+            for token in tokenize(text):
+                terms[token] = max(terms.get(token, 0.0), weight)
+        return terms
+
+    def _add_token(self, token: str):
+        bisect.insort(self.vocab, token)
+        if len(token) >= MIN_TYPO_LENGTH:
+            for variant in deletes(token) | {token}:
+                self.typos.setdefault(variant, set()).add(token)
+
+    def _remove_token(self, token: str):
+        index = bisect.bisect_left(self.vocab, token)
+        if index < len(self.vocab) and self.vocab[index] == token:
+            del self.vocab[index]
+        if len(token) >= MIN_TYPO_LENGTH:
+            for variant in deletes(token) | {token}:
+                tokens = self.typos.get(variant)
+                if tokens is not None:
+                    tokens.discard(token)
+                    if not tokens:
+                        del self.typos[variant]
+
+    def _remove_doc(self, doc_id: str):
+        for token in self._doc_terms.pop(doc_id, {}):
+            posting = self.postings[token]
+            posting.pop(doc_id, None)
+            if not posting:
+                del self.postings[token]
+                self._remove_token(token)
+        self.docs.pop(doc_id, None)
+        self._doc_keys.pop(doc_id, None)
+
+    def _add_doc(self, doc_id: str, service: dict, category: Optional[dict], key: tuple):
+        terms = self._terms(service, category)
+        for token, weight in terms.items():
+            if token not in self.postings:
+                self.postings[token] = {}
+                self._add_token(token)
+            self.postings[token][doc_id] = weight
+        self._doc_terms[doc_id] = terms
+        self._doc_keys[doc_id] = key
+        self.docs[doc_id] = {
+            "_id": doc_id,
+            "title": service.get("title"),
+            "price": service.get("price"),
+            "category_id": service.get("category_id"),
+            "category_name": category.get("name") if category else None,
+            "type": category.get("type") if category else None,
+        }
+
+    def sync(self, snapshot) -> int:
+        """Apply the difference between the indexed catalog and `snapshot`; returns docs touched."""
+        if snapshot.version == self.version:
+            return 0
+        categories = {cat["_id"]: cat for cat in snapshot.categories}
+        touched = 0
+        seen = set()
+        for service in snapshot.services:
+            doc_id = service["_id"]
+            seen.add(doc_id)
+            category = categories.get(service["category_id"])
+            key = (
+                service.get("title"), service.get("description"), service.get("price"),
+                service.get("category_id"),
+                category.get("name") if category else None, category.get("type") if category else None,
+            )
+            if self._doc_keys.get(doc_id) == key:
+                continue
+            self._remove_doc(doc_id)
+            self._add_doc(doc_id, service, category, key)
+            touched += 1
+        for doc_id in [doc_id for doc_id in self._doc_keys if doc_id not in seen]:
+            self._remove_doc(doc_id)
+            touched += 1
+        self.version = snapshot.version
+        if touched:
+            self._short_results.clear()
+        return touched
+
+    def _prefix_tokens(self, prefix: str) -> List[str]:
+        start = bisect.bisect_left(self.vocab, prefix)
+        tokens = []
+        for token in self.vocab[start:start + MAX_PREFIX_EXPANSIONS]:
+            if not token.startswith(prefix):
+                break
+            tokens.append(token)
+        return tokens
+
+    def _typo_tokens(self, term: str) -> List[str]:
+        if len(term) < MIN_TYPO_LENGTH:
+            return []
+        candidates = set()
+        for variant in deletes(term) | {term}:
+            candidates |= self.typos.get(variant, set())
+        candidates.discard(term)
+        return list(candidates)
+
+    def _term_scores(self, term: str, is_last: bool) -> Dict[str, float]:
+        expansions: List[Tuple[str, float]] = []
+        if term in self.postings:
+            expansions.append((term, 1.0))
+        if is_last:
+            expansions.extend((token, PREFIX_FACTOR) for token in self._prefix_tokens(term) if token != term)
+        if not expansions:
+            expansions.extend((token, TYPO_FACTOR) for token in self._typo_tokens(term))
+
+        scores: Dict[str, float] = {}
+        for token, factor in expansions:
+            for doc_id, weight in self.postings.get(token, {}).items():
+                score = weight * factor
+                if score > scores.get(doc_id, 0.0):
+                    scores[doc_id] = score
+        return scores
+
+    def search(self, query: str, type: Optional[str] = None, limit: int = 20) -> List[dict]:
+        terms = tokenize(query)
+        if not terms:
+            return []
+        if len(terms) == 1 and len(terms[0]) <= SHORT_QUERY_LENGTH:
+            key = (terms[0], type, limit)
+            if key not in self._short_results:
+                self._short_results[key] = self._search(terms, type, limit)
+            return self._short_results[key]
+        return self._search(terms, type, limit)
+
+    def _search(self, terms: List[str], type: Optional[str], limit: int) -> List[dict]:
+        # Every term must match (AND); a doc's score is the sum of its best match per term
+        totals: Optional[Dict[str, float]] = None
+        for i, term in enumerate(terms):
+            scores = self._term_scores(term, is_last=i == len(terms) - 1)
+            if totals is None:
+                totals = scores
+            else:
+                totals = {doc_id: total + scores[doc_id] for doc_id, total in totals.items() if doc_id in scores}
+            if not totals:
+                return []
+
+        docs = self.docs
+        candidates = totals.items()
+        if type:
+            candidates = [(doc_id, score) for doc_id, score in candidates if docs[doc_id]["type"] == type]
+        # Only the top `limit` are ordered; short prefixes can match thousands of docs
+        top = heapq.nsmallest(limit, candidates, key=lambda item: (-item[1], docs[item[0]]["title"] or ""))
+        return [dict(docs[doc_id], score=round(score, 3)) for doc_id, score in top]
@@ -1,15 +1,7 @@
 import asyncio
-from motor.motor_asyncio import AsyncIOMotorClient
-import os
-from dotenv import load_dotenv
-from pathlib import Path
 
-ROOT_DIR = Path(__file__).parent
-load_dotenv(ROOT_DIR / '.env')
-
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+from catalog_cache import bump_catalog_version
+from database import client, db
 
 # Seed categories
 categories = [
@@ -33,6 +25,22 @@ categories = [
     {"name": "Ceiling Works", "icon": "cube", "type": "commercial", "description": "Commercial ceiling work"},
 ]
 
+# Category names per app locale; untranslated fields fall back to English
+category_name_translations = {
+    "Construction Works": {"hi": "निर्माण कार्य", "te": "నిర్మాణ పనులు", "ta": "கட்டுமானப் பணிகள்", "kn": "ನಿರ್ಮಾಣ ಕಾಮಗಾರಿಗಳು", "ml": "നിർമ്മാണ ജോലികൾ", "pa": "ਉਸਾਰੀ ਦੇ ਕੰਮ"},
+    "Plumbers": {"hi": "प्लंबर", "te": "ప్లంబర్లు", "ta": "பிளம்பர்கள்", "kn": "ಪ್ಲಂಬರ್‌ಗಳು", "ml": "പ്ലംബർമാർ", "pa": "ਪਲੰਬਰ"},
+    "Electric Works": {"hi": "बिजली के काम", "te": "విద్యుత్ పనులు", "ta": "மின் பணிகள்", "kn": "ವಿದ್ಯುತ್ ಕಾಮಗಾರಿಗಳು", "ml": "ഇലക്ട്രിക്കൽ ജോലികൾ", "pa": "ਬਿਜਲੀ ਦੇ ਕੰਮ"},
+    "Painting Works": {"hi": "पेंटिंग का काम", "te": "పెయింటింగ్ పనులు", "ta": "வர்ணம் பூசும் பணிகள்", "kn": "ಬಣ್ಣದ ಕೆಲಸಗಳು", "ml": "പെയിന്റിംഗ് ജോലികൾ", "pa": "ਪੇਂਟਿੰਗ ਦੇ ਕੰਮ"},
+    "Flooring Works": {"hi": "फ़्लोरिंग का काम", "te": "ఫ్లోరింగ్ పనులు", "ta": "தரைத்தள பணிகள்", "kn": "ನೆಲಹಾಸು ಕೆಲಸಗಳು", "ml": "ഫ്ലോറിംഗ് ജോലികൾ", "pa": "ਫਲੋਰਿੰਗ ਦੇ ਕੰਮ"},
+    "Wood Works": {"hi": "लकड़ी का काम", "te": "చెక్క పనులు", "ta": "மரவேலைகள்", "kn": "ಮರಗೆಲಸ", "ml": "മരപ്പണികൾ", "pa": "ਲੱਕੜ ਦੇ ਕੰਮ"},
+    "Interior & Exterior Designs": {"hi": "इंटीरियर और एक्सटीरियर डिज़ाइन", "te": "ఇంటీరియర్ & ఎక్స్‌టీరియర్ డిజైన్లు", "ta": "உள் & வெளி வடிவமைப்புகள்", "kn": "ಒಳಾಂಗಣ & ಹೊರಾಂಗಣ ವಿನ್ಯಾಸಗಳು", "ml": "ഇന്റീരിയർ & എക്സ്റ്റീരിയർ ഡിസൈനുകൾ", "pa": "ਇੰਟੀਰੀਅਰ ਅਤੇ ਐਕਸਟੀਰੀਅਰ ਡਿਜ਼ਾਈਨ"},
+    "Ceiling Works": {"hi": "सीलिंग का काम", "te": "సీలింగ్ పనులు", "ta": "கூரை பணிகள்", "kn": "ಸೀಲಿಂಗ್ ಕೆಲಸಗಳು", "ml": "സീലിംഗ് ജോലികൾ", "pa": "ਛੱਤ ਦੇ ਕੰਮ"},
+}
+for category in categories:
+    category["translations"] = {
+        locale: {"name": name} for locale, name in category_name_translations[category["name"]].items()
+    }
+
 async def seed_database():
     print("Starting database seeding...")
     
@@ -264,6 +272,9 @@ async def seed_database():
     await db.users.insert_one(demo_user)
     print("Seeded demo user")
     
+    # Make running API workers drop their cached catalog
+    await bump_catalog_version(db)
+    
     print("Database seeding completed!")
     client.close()
 
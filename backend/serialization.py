@@ -0,0 +1,94 @@
+from functools import lru_cache
+from typing import Annotated, Any, Dict, Optional
+
+import orjson
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+from pydantic import BeforeValidator, TypeAdapter
+from starlette.responses import Response
+
+
+def _object_id_to_str(value: Any) -> Any:
+    return str(value) if isinstance(value, ObjectId) else value
+
+
+# Model field type for Mongo ids: accepts an ObjectId straight from a BSON
+# document and serializes it as its hex string
+ObjectIdStr = Annotated[str, BeforeValidator(_object_id_to_str)]
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered with orjson, which handles datetimes itself and ObjectIds via `_default`."""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+@lru_cache(maxsize=None)
+def adapter(model: Any) -> TypeAdapter:
+    # TypeAdapters are expensive to build; one per response type is built lazily and reused
+    return TypeAdapter(model)
+
+
+def model_response(model: Any, value: Any, status_code: int = 200,
+                   headers: Optional[Dict[str, str]] = None) -> Response:
+    """Validate raw Mongo documents against `model` and encode them in one pass.
+
+    Both steps run in pydantic-core, and the Response returned skips
+    FastAPI's own `jsonable_encoder` pass. Declare the same `model` as the
+    route's `response_model` so the OpenAPI schema matches.
+    """
+    type_adapter = adapter(model)
+    body = type_adapter.dump_json(type_adapter.validate_python(value), by_alias=True)
+    return Response(body, status_code=status_code, media_type="application/json", headers=headers)
+
+
+def benchmark(rows: int, iterations: int):
+    """Compare the old handler path (str(_id) + jsonable_encoder + json.dumps) with model_response."""
+    import copy
+    import json
+    import time
+    from datetime import datetime
+
+    from fastapi.encoders import jsonable_encoder
+
+    from server import BookingPage
+
+    now = datetime.utcnow()
+    page = [{
+        "_id": ObjectId(), "customer_id": str(ObjectId()), "customer_name": "User 0001", "customer_phone": "9000000001",
+        "services": [{"service_id": str(ObjectId()), "title": "Fan Installation", "price": 900.0, "quantity": 1}] * 2,
+        "total_price": 2174.0, "status": "pending", "scheduled_at": now, "created_at": now,
+    } for _ in range(rows)]
+
+    def legacy(bookings):
+        for booking in bookings:
+            booking["_id"] = str(booking["_id"])
+        return json.dumps(jsonable_encoder({"bookings": bookings, "next_cursor": None})).encode()
+
+    def typed(bookings):
+        return model_response(BookingPage, {"bookings": bookings, "next_cursor": None}).body
+
+    for name, encode in (("legacy", legacy), ("model_response", typed)):
+        copies = [copy.deepcopy(page) for _ in range(iterations)]
+        started = time.process_time()
+        for bookings in copies:
+            encode(bookings)
+        elapsed = time.process_time() - started
+        print(f"{name:15} {elapsed / iterations * 1000:.3f} ms CPU per {rows}-row page")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Measure response encoding CPU for a booking history page")
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+    benchmark(args.rows, args.iterations)
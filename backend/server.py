@@ -1,45 +1,113 @@
-from fastapi import FastAPI, APIRouter, HTTPException, status
+from fastapi import FastAPI, APIRouter, Depends, Header, HTTPException, Request, Response, UploadFile, status
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from contextlib import asynccontextmanager
+import asyncio
 import os
+import base64
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional, Dict, Any
-from datetime import datetime
+from typing import List, Optional
+from datetime import date, datetime
 from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+
+from archive import archived_summaries, find_archived_booking
+from analytics import GROUP_FIELDS, category_totals, merge_reports, normalize_city, record_booking, report
+from auth import (
+    consume_otp, current_customer, issue_otp, issue_tokens, require_admin, require_customer, revoke_refresh_tokens,
+    rotate_refresh_token
+)
+from blob_store import CHUNK_SIZE, BlobNotFound, create_blob_store
+from booking_events import event_stream, hub
+from catalog_cache import EncodedPayload, apply_region_prices
+from catalog_i18n import CATEGORY_TEXT_FIELDS, SERVICE_TEXT_FIELDS, locale_chain, localize
+from checkout import checkout
+from database import database_lifespan, db, pool_stats, readiness
+from indexes import check_query_plans, ensure_indexes
+from matching import match_booking, match_deadline, point, release_worker
+from metrics import MetricsMiddleware, registry
+from notifications import SMS, close_transports, create_transports, enqueue, notify_booking
+from rate_limit import TokenBucket
+from serialization import FastJSONResponse, ObjectIdStr, model_response
+from slots import (
+    MAX_AVAILABILITY_DAYS, availability, category_demand, plan_reservations, release_slots, reserve_slots
+)
+from tenancy import Region, create_region_router
+from user_cache import UserCache
+from wallet import credit, debit, ensure_wallet, get_balance, history, run_snapshot_loop, to_major, to_minor
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# Booking photos live in a blob store (BLOB_BACKEND=local|gridfs); bookings keep only ids
+blob_store = create_blob_store(db)
+MAX_IMAGE_SIZE = int(os.environ.get('MAX_IMAGE_SIZE', str(10 * 1024 * 1024)))
+
+# OTPs and booking updates go through the notifications outbox and are sent by
+# each region's dispatcher (SMS_BACKEND=log|webhook, PUSH_BACKEND=log|webhook,
+# or NOTIFICATION_FILE to write everything to a local file)
+notification_transports = create_transports()
+
+# Bookings, slots, workers and regional prices are partitioned by city
+# (CITY_REGIONS, see tenancy.py); customers, wallets, carts and the catalog
+# stay in `db`. Each region has its own catalog cache (with its prices),
+# search index, job queue and notification dispatcher. Unconfigured, there
+# is a single region on `db`
+regions = create_region_router(db, notification_transports)
+
+# Limits on how often OTPs can be requested
+OTP_DEBUG = os.environ.get('OTP_DEBUG', 'false').lower() == 'true'
+otp_phone_limiter = TokenBucket(
+    capacity=float(os.environ.get('OTP_PHONE_BURST', '3')),
+    refill_per_second=float(os.environ.get('OTP_PHONE_PER_HOUR', '10')) / 3600
+)
+otp_ip_limiter = TokenBucket(
+    capacity=float(os.environ.get('OTP_IP_BURST', '20')),
+    refill_per_second=float(os.environ.get('OTP_IP_PER_MINUTE', '10')) / 60
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    async with database_lifespan(app):
+        await ensure_indexes(db)
+        # Optionally refuse to start if an endpoint query would scan a whole collection
+        if os.environ.get('INDEX_CHECK_ON_STARTUP', 'false').lower() == 'true':
+            collscans = await check_query_plans(db)
+            if collscans:
+                raise RuntimeError(f"COLLSCAN in query plan for: {', '.join(collscans)}")
+        for region in regions.all():
+            if region.db is not db:
+                await ensure_indexes(region.db)
+        snapshot_task = asyncio.create_task(
+            run_snapshot_loop(db, float(os.environ.get('WALLET_SNAPSHOT_INTERVAL', '3600')))
+        )
+        # Set JOB_WORKERS_ENABLED=false on API-only processes when workers run elsewhere
+        run_workers = os.environ.get('JOB_WORKERS_ENABLED', 'true').lower() == 'true'
+        for region in regions.all():
+            region.start(run_workers)
+        try:
+            yield
+        finally:
+            for region in regions.all():
+                await region.stop()
+            snapshot_task.cancel()
+            await close_transports(notification_transports)
 
 # Create the main app without a prefix
-app = FastAPI()
+# Routes that return plain dicts are still encoded with orjson; routes that
+# return documents validate them against a response model (see serialization.py)
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
-# Custom ObjectId handler
-class PyObjectId(str):
-    @classmethod
-    def __get_validators__(cls):
-        yield cls.validate
-
-    @classmethod
-    def validate(cls, v):
-        if not ObjectId.is_valid(v):
-            raise ValueError("Invalid ObjectId")
-        return str(v)
-
 # Models
 class User(BaseModel):
     model_config = ConfigDict(arbitrary_types_allowed=True)
-    id: Optional[str] = Field(None, alias="_id")
+    id: Optional[ObjectIdStr] = Field(None, alias="_id")
     name: str
     phone: str
     email: Optional[str] = None
@@ -59,18 +127,21 @@ class OTPVerifyRequest(BaseModel):
     phone: str
     otp: str
 
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
 class Category(BaseModel):
     model_config = ConfigDict(arbitrary_types_allowed=True)
-    id: Optional[str] = Field(None, alias="_id")
+    id: Optional[ObjectIdStr] = Field(None, alias="_id")
     name: str
-    icon: str
+    icon: Optional[str] = None
     type: str  # "home" or "commercial"
     description: Optional[str] = None
     image_url: Optional[str] = None
 
 class Service(BaseModel):
     model_config = ConfigDict(arbitrary_types_allowed=True)
-    id: Optional[str] = Field(None, alias="_id")
+    id: Optional[ObjectIdStr] = Field(None, alias="_id")
     category_id: str
     title: str
     description: Optional[str] = None
@@ -86,7 +157,7 @@ class CartItem(BaseModel):
 
 class Cart(BaseModel):
     model_config = ConfigDict(arbitrary_types_allowed=True)
-    id: Optional[str] = Field(None, alias="_id")
+    id: Optional[ObjectIdStr] = Field(None, alias="_id")
     customer_id: str
     items: List[CartItem] = []
     updated_at: datetime = Field(default_factory=datetime.utcnow)
@@ -107,21 +178,88 @@ class BookingAddress(BaseModel):
     state: str
     pincode: str
     landmark: Optional[str] = None
+    latitude: Optional[float] = None  # needed for provider matching
+    longitude: Optional[float] = None
 
 class Booking(BaseModel):
     model_config = ConfigDict(arbitrary_types_allowed=True)
-    id: Optional[str] = Field(None, alias="_id")
+    id: Optional[ObjectIdStr] = Field(None, alias="_id")
     customer_id: str
     customer_name: str
     customer_phone: str
     services: List[CartItem]
     total_price: float
-    status: str = "pending"  # pending, assigned, in_progress, completed, cancelled
+    status: str = "pending"  # pending, assigned, in_progress, completed, cancelled, expired
+    worker_id: Optional[str] = None
     scheduled_at: datetime
     address: BookingAddress
-    images: List[str] = []  # base64 images
+    image_ids: List[str] = []  # ids returned by POST /api/images
+    subtotal: Optional[float] = None  # price breakdown, set by /checkout
+    convenience_fee: Optional[float] = None
+    tax: Optional[float] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
+class BookingSummary(BaseModel):
+    # Booking history row; see BOOKING_SUMMARY_PROJECTION
+    id: Optional[ObjectIdStr] = Field(None, alias="_id")
+    customer_id: str
+    services: List[CartItem]
+    total_price: float
+    status: str
+    worker_id: Optional[str] = None
+    scheduled_at: datetime
+    created_at: datetime
+
+class BookingPage(BaseModel):
+    bookings: List[BookingSummary]
+    next_cursor: Optional[str] = None
+
+class CartResponse(BaseModel):
+    items: List[CartItem]
+    total: float
+
+class AuthResponse(BaseModel):
+    success: bool
+    token: str
+    refresh_token: str
+    token_type: str
+    expires_in: int
+    user: User
+
+class WalletTransaction(BaseModel):
+    seq: int
+    type: str
+    amount: float  # rupees
+    balance_after: float
+    reason: str
+    reference: Optional[str] = None
+    created_at: datetime
+
+class WalletTransactionPage(BaseModel):
+    transactions: List[WalletTransaction]
+    next_cursor: Optional[int] = None
+
+class CheckoutRequest(BaseModel):
+    customer_id: str
+    customer_name: str
+    customer_phone: str
+    scheduled_at: datetime
+    address: BookingAddress
+    image_ids: List[str] = []
+
+class WalletAmountRequest(BaseModel):
+    customer_id: str
+    amount: float  # rupees; stored as integer paise
+    reason: str
+    reference: Optional[str] = None  # retries with the same reference are applied once
+
+class WorkerCreate(BaseModel):
+    name: str
+    phone: str
+    skills: List[str]  # category ids the worker is qualified for
+    latitude: float
+    longitude: float
+
 class BookingCreate(BaseModel):
     customer_id: str
     customer_name: str
@@ -130,202 +268,580 @@ class BookingCreate(BaseModel):
     total_price: float
     scheduled_at: datetime
     address: BookingAddress
-    images: List[str] = []
+    image_ids: List[str] = []
+
+# Health Routes
+@api_router.get("/health")
+async def health():
+    return {"status": "ok"}
+
+@api_router.get("/health/ready")
+async def health_ready(response: Response):
+    report = await readiness()
+    if not report["ready"]:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return report
 
 # Auth Routes
+def rate_limited(limiter: TokenBucket, key: str):
+    wait = limiter.take(key)
+    if wait:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many OTP requests, please try again later",
+            headers={"Retry-After": str(int(wait) + 1)}
+        )
+
 @api_router.post("/auth/login")
-async def login(request: LoginRequest):
-    # Mock OTP - in production, send actual OTP via SMS
-    return {"success": True, "message": "OTP sent to your phone", "otp": "123456"}
+async def login(request: LoginRequest, http_request: Request):
+    client_ip = http_request.client.host if http_request.client else "unknown"
+    rate_limited(otp_ip_limiter, client_ip)
+    rate_limited(otp_phone_limiter, request.phone)
+    code = await issue_otp(db, request.phone)
+    await enqueue(db, SMS, request.phone, "otp", f"{code} is your WorkHub verification code")
+    regions.default.notification_dispatcher.wake()
+    response = {"success": True, "message": "OTP sent to your phone"}
+    if OTP_DEBUG:
+        # Local development only: lets the app show the code without an SMS gateway
+        response["otp"] = code
+    return response
+
+DEMO_WALLET_BALANCE = 1000.0
+
+async def attach_wallet_balance(user: dict):
+    # The wallet ledger owns the balance; users created before it existed get
+    # their old wallet_balance carried over as an opening credit
+    balance = await get_balance(db, user["_id"])
+    if balance is None:
+        await ensure_wallet(db, user["_id"], to_minor(user.get("wallet_balance", 0.0)))
+        balance = await get_balance(db, user["_id"])
+    user["wallet_balance"] = to_major(balance)
+
+async def load_user(customer_id: str) -> Optional[dict]:
+    user = await db.users.find_one({"_id": ObjectId(customer_id)})
+    if user:
+        user["_id"] = str(user["_id"])
+        await attach_wallet_balance(user)
+    return user
 
-@api_router.post("/auth/verify-otp")
-async def verify_otp(request: OTPVerifyRequest):
-    # Mock verification - accept any 6-digit OTP for demo
-    if len(request.otp) == 6:
-        # Find or create user
-        user = await db.users.find_one({"phone": request.phone})
-        if not user:
-            # Create new user
-            new_user = {
-                "name": f"User {request.phone[-4:]}",
-                "phone": request.phone,
-                "preferred_language": "English",
-                "wallet_balance": 1000.0,  # Demo wallet balance
-                "created_at": datetime.utcnow()
-            }
-            result = await db.users.insert_one(new_user)
-            new_user["_id"] = str(result.inserted_id)
-            user = new_user
-        else:
-            user["_id"] = str(user["_id"])
-        
-        return {
-            "success": True,
-            "token": f"mock_token_{user['_id']}",
-            "user": user
-        }
-    return {"success": False, "message": "Invalid OTP"}
+# Profiles (with their wallet balance) are read on almost every screen. Writes
+# to a profile or wallet in this process invalidate it; USER_CACHE_TTL bounds
+# how long other processes may serve the previous version
+user_cache = UserCache(
+    load_user,
+    ttl=float(os.environ.get('USER_CACHE_TTL', '15')),
+    max_entries=int(os.environ.get('USER_CACHE_MAX_ENTRIES', '10000')),
+    enabled=os.environ.get('USER_CACHE_ENABLED', 'true').lower() == 'true'
+)
 
-@api_router.get("/auth/me")
-async def get_current_user(customer_id: str):
-    user = await db.users.find_one({"_id": ObjectId(customer_id)})
+@api_router.post("/auth/verify-otp", response_model=AuthResponse)
+async def verify_otp(request: OTPVerifyRequest):
+    if not await consume_otp(db, request.phone, request.otp):
+        return {"success": False, "message": "Invalid OTP"}
+    # Find or create user; only the id is read here, the profile comes from the cache
+    existing = await db.users.find_one({"phone": request.phone}, {"_id": 1})
+    if existing:
+        customer_id = str(existing["_id"])
+    else:
+        # Create new user
+        result = await db.users.insert_one({
+            "name": f"User {request.phone[-4:]}",
+            "phone": request.phone,
+            "preferred_language": "English",
+            "created_at": datetime.utcnow()
+        })
+        customer_id = str(result.inserted_id)
+        await ensure_wallet(db, customer_id, to_minor(DEMO_WALLET_BALANCE))
+    user = await user_cache.get(customer_id)
+
+    return model_response(AuthResponse, {
+        "success": True,
+        **await issue_tokens(db, user["_id"]),
+        "user": user
+    })
+
+@api_router.post("/auth/refresh")
+async def refresh_tokens(request: RefreshRequest):
+    return await rotate_refresh_token(db, request.refresh_token)
+
+@api_router.post("/auth/logout")
+async def logout(customer: str = Depends(current_customer)):
+    await revoke_refresh_tokens(db, customer)
+    return {"success": True}
+
+@api_router.get("/auth/me", response_model=User)
+async def get_current_user(customer_id: str, customer: str = Depends(current_customer)):
+    require_customer(customer, customer_id)
+    user = await user_cache.get(customer_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    user["_id"] = str(user["_id"])
-    return user
+    return model_response(User, user)
+
+def catalog_response(request: Request, payload: EncodedPayload, chain: tuple) -> Response:
+    headers = {
+        "ETag": payload.etag,
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding, Accept-Language",
+        "Content-Language": chain[0],
+    }
+    if payload.etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    if payload.gzip_body is not None and "gzip" in request.headers.get("accept-encoding", ""):
+        headers["Content-Encoding"] = "gzip"
+        return Response(payload.gzip_body, media_type="application/json", headers=headers)
+    return Response(payload.body, media_type="application/json", headers=headers)
+
+def request_locales(request: Request, lang: Optional[str]) -> tuple:
+    # `lang` wins over Accept-Language; both fall back to English
+    return locale_chain(lang, request.headers.get("accept-language"))
+
+async def request_region(x_city: Optional[str] = Header(None), x_pincode: Optional[str] = Header(None)) -> Region:
+    # The app sends the city and pincode of the customer's address; without them, the default region
+    return regions.resolve(city=x_city, pincode=x_pincode)
 
 # Category Routes
-@api_router.get("/categories")
-async def get_categories(type: Optional[str] = None):
+@api_router.get("/categories", response_model=List[Category])
+async def get_categories(request: Request, type: Optional[str] = None, lang: Optional[str] = None,
+                         region: Region = Depends(request_region)):
+    chain = request_locales(request, lang)
+    if region.catalog_cache.enabled:
+        return catalog_response(request, await region.catalog_cache.encoded_categories(type, chain), chain)
     query = {}
     if type:
         query["type"] = type
     categories = await db.categories.find(query).to_list(100)
-    for cat in categories:
-        cat["_id"] = str(cat["_id"])
-    return categories
+    return model_response(List[Category], [localize(cat, chain, CATEGORY_TEXT_FIELDS) for cat in categories])
+
+@api_router.get("/catalog/cache-stats")
+async def get_catalog_cache_stats(region: Region = Depends(request_region)):
+    return {"region": region.key, **region.catalog_cache.stats()}
 
 # Service Routes
-@api_router.get("/categories/{category_id}/services")
-async def get_category_services(category_id: str):
+@api_router.get("/categories/{category_id}/services", response_model=List[Service])
+async def get_category_services(request: Request, category_id: str, lang: Optional[str] = None,
+                                region: Region = Depends(request_region)):
+    chain = request_locales(request, lang)
+    catalog_cache = region.catalog_cache
+    if catalog_cache.enabled:
+        return catalog_response(request, await catalog_cache.encoded_category_services(category_id, chain), chain)
     services = await db.services.find({"category_id": category_id}).to_list(100)
-    for service in services:
-        service["_id"] = str(service["_id"])
-    return services
-
-@api_router.get("/services/{service_id}")
-async def get_service(service_id: str):
+    if catalog_cache.region_db is not None:
+        services = await apply_region_prices(catalog_cache.region_db, services)
+    return model_response(List[Service], [localize(service, chain, SERVICE_TEXT_FIELDS) for service in services])
+
+@api_router.get("/services/{service_id}", response_model=Service)
+async def get_service(request: Request, service_id: str, lang: Optional[str] = None,
+                      region: Region = Depends(request_region)):
+    chain = request_locales(request, lang)
+    catalog_cache = region.catalog_cache
+    if catalog_cache.enabled:
+        payload = await catalog_cache.encoded_service(service_id, chain)
+        if payload is None:
+            raise HTTPException(status_code=404, detail="Service not found")
+        return catalog_response(request, payload, chain)
     service = await db.services.find_one({"_id": ObjectId(service_id)})
+    if service and catalog_cache.region_db is not None:
+        service = next(iter(await apply_region_prices(catalog_cache.region_db, [service])), None)
     if not service:
         raise HTTPException(status_code=404, detail="Service not found")
-    service["_id"] = str(service["_id"])
-    return service
+    return model_response(Service, localize(service, chain, SERVICE_TEXT_FIELDS))
+
+@api_router.get("/search")
+async def search_services(q: str, type: Optional[str] = None, limit: int = 20,
+                          region: Region = Depends(request_region)):
+    snapshot = await region.catalog_cache.snapshot()
+    region.search_index.sync(snapshot)
+    return {"query": q, "results": region.search_index.search(q, type=type, limit=max(1, min(limit, 50)))}
 
 # Cart Routes
 @api_router.post("/cart/add")
-async def add_to_cart(request: AddToCartRequest):
-    # Get or create cart
-    cart = await db.carts.find_one({"customer_id": request.customer_id})
-    
-    if cart:
-        # Check if item already exists
-        item_exists = False
-        for item in cart.get("items", []):
-            if item["service_id"] == request.service_id:
-                item["quantity"] += 1
-                item_exists = True
-                break
-        
-        if not item_exists:
-            cart.setdefault("items", []).append({
-                "service_id": request.service_id,
-                "title": request.title,
-                "price": request.price,
-                "quantity": 1
-            })
-        
-        cart["updated_at"] = datetime.utcnow()
-        await db.carts.update_one(
-            {"customer_id": request.customer_id},
-            {"$set": cart}
+async def add_to_cart(request: AddToCartRequest, customer: str = Depends(current_customer)):
+    require_customer(customer, request.customer_id)
+    # Bump the quantity in place if the item is already in the cart,
+    # otherwise push it (creating the cart on first add). Each step is a
+    # single atomic update, so concurrent taps never lose increments.
+    while True:
+        now = datetime.utcnow()
+        result = await db.carts.update_one(
+            {"customer_id": request.customer_id, "items.service_id": request.service_id},
+            {"$inc": {"items.$.quantity": 1}, "$set": {"updated_at": now}}
         )
-    else:
-        cart = {
-            "customer_id": request.customer_id,
-            "items": [{
-                "service_id": request.service_id,
-                "title": request.title,
-                "price": request.price,
-                "quantity": 1
-            }],
-            "updated_at": datetime.utcnow()
-        }
-        await db.carts.insert_one(cart)
+        if result.matched_count:
+            break
+        try:
+            result = await db.carts.update_one(
+                {"customer_id": request.customer_id, "items.service_id": {"$ne": request.service_id}},
+                {
+                    "$push": {"items": {
+                        "service_id": request.service_id,
+                        "title": request.title,
+                        "price": request.price,
+                        "quantity": 1
+                    }},
+                    "$set": {"updated_at": now}
+                },
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # Another request created the cart or pushed this item first
+            continue
+        break
     
     return {"success": True, "message": "Item added to cart"}
 
-@api_router.get("/cart/{customer_id}")
-async def get_cart(customer_id: str):
+@api_router.get("/cart/{customer_id}", response_model=CartResponse)
+async def get_cart(customer_id: str, customer: str = Depends(current_customer)):
+    require_customer(customer, customer_id)
     cart = await db.carts.find_one({"customer_id": customer_id})
     if not cart:
-        return {"items": [], "total": 0}
+        return model_response(CartResponse, {"items": [], "total": 0})
     
-    cart["_id"] = str(cart["_id"])
     total = sum(item["price"] * item["quantity"] for item in cart.get("items", []))
-    return {"items": cart.get("items", []), "total": total}
+    return model_response(CartResponse, {"items": cart.get("items", []), "total": total})
 
 @api_router.post("/cart/remove")
-async def remove_from_cart(request: RemoveFromCartRequest):
-    cart = await db.carts.find_one({"customer_id": request.customer_id})
-    if cart:
-        cart["items"] = [item for item in cart.get("items", []) if item["service_id"] != request.service_id]
-        cart["updated_at"] = datetime.utcnow()
-        await db.carts.update_one(
-            {"customer_id": request.customer_id},
-            {"$set": cart}
-        )
+async def remove_from_cart(request: RemoveFromCartRequest, customer: str = Depends(current_customer)):
+    require_customer(customer, request.customer_id)
+    await db.carts.update_one(
+        {"customer_id": request.customer_id},
+        {
+            "$pull": {"items": {"service_id": request.service_id}},
+            "$set": {"updated_at": datetime.utcnow()}
+        }
+    )
     return {"success": True, "message": "Item removed from cart"}
 
 @api_router.post("/cart/update-quantity")
-async def update_cart_quantity(customer_id: str, service_id: str, quantity: int):
-    cart = await db.carts.find_one({"customer_id": customer_id})
-    if cart:
-        for item in cart.get("items", []):
-            if item["service_id"] == service_id:
-                if quantity <= 0:
-                    cart["items"].remove(item)
-                else:
-                    item["quantity"] = quantity
-                break
-        cart["updated_at"] = datetime.utcnow()
+async def update_cart_quantity(customer_id: str, service_id: str, quantity: int,
+                               customer: str = Depends(current_customer)):
+    require_customer(customer, customer_id)
+    if quantity <= 0:
         await db.carts.update_one(
             {"customer_id": customer_id},
-            {"$set": cart}
+            {
+                "$pull": {"items": {"service_id": service_id}},
+                "$set": {"updated_at": datetime.utcnow()}
+            }
+        )
+    else:
+        await db.carts.update_one(
+            {"customer_id": customer_id, "items.service_id": service_id},
+            {"$set": {"items.$.quantity": quantity, "updated_at": datetime.utcnow()}}
         )
     return {"success": True, "message": "Cart updated"}
 
 @api_router.delete("/cart/{customer_id}")
-async def clear_cart(customer_id: str):
+async def clear_cart(customer_id: str, customer: str = Depends(current_customer)):
+    require_customer(customer, customer_id)
     await db.carts.delete_one({"customer_id": customer_id})
     return {"success": True, "message": "Cart cleared"}
 
 # Booking Routes
+@api_router.post("/checkout")
+async def checkout_cart(request: CheckoutRequest, idempotency_key: str = Header(..., min_length=8, max_length=128),
+                        customer: str = Depends(current_customer)):
+    require_customer(customer, request.customer_id)
+    # Items and prices come from the server-side cart and the catalog, not the client.
+    # The booking goes to the region of its address
+    region = regions.resolve(city=request.address.city, pincode=request.address.pincode)
+    return await checkout(
+        region.db, region.catalog_cache, region.job_queue, request.model_dump(), idempotency_key, cart_db=db
+    )
+
+@api_router.get("/availability")
+async def get_availability(pincode: str, service_ids: str, start: Optional[date] = None, days: int = 7):
+    # Open slots for the cart at `pincode`, one entry per day. `service_ids` is
+    # comma-separated; an id repeated n times counts as quantity n
+    region = regions.resolve(pincode=pincode)
+    snapshot = await region.catalog_cache.snapshot()
+    lines = [{"service_id": service_id, "quantity": 1} for service_id in service_ids.split(",") if service_id]
+    demand = category_demand(snapshot.services_by_id, lines)
+    if not demand:
+        raise HTTPException(status_code=404, detail="Service not found")
+    start = start or datetime.utcnow().date()
+    days = max(1, min(days, MAX_AVAILABILITY_DAYS))
+    return {"pincode": pincode, "days": await availability(region.db, demand, pincode, start, days)}
+
+# Legacy endpoint that trusts client-sent services and prices; the app uses /checkout
 @api_router.post("/booking")
-async def create_booking(booking: BookingCreate):
+async def create_booking(booking: BookingCreate, customer: str = Depends(current_customer)):
+    require_customer(customer, booking.customer_id)
     booking_dict = booking.model_dump()
     booking_dict["status"] = "pending"
     booking_dict["created_at"] = datetime.utcnow()
+    booking_dict["match_deadline"] = match_deadline(booking_dict["created_at"])
+    region = regions.resolve(city=booking.address.city, pincode=booking.address.pincode)
+    snapshot = await region.catalog_cache.snapshot()
+    reservations = await plan_reservations(
+        region.db, snapshot.services_by_id, booking_dict["services"], booking.address.pincode, booking.scheduled_at
+    )
+    booking_dict["slot_reservations"] = reservations
+    booking_dict["category_totals"] = category_totals(snapshot.services_by_id, booking_dict["services"])
     
-    result = await db.bookings.insert_one(booking_dict)
-    booking_dict["_id"] = str(result.inserted_id)
+    await reserve_slots(region.db, reservations)
+    try:
+        result = await region.db.bookings.insert_one(booking_dict)
+    except Exception:
+        await release_slots(region.db, reservations)
+        raise
+    
+    await record_booking(region.db, booking_dict)
+    await notify_booking(region.db, {**booking_dict, "_id": result.inserted_id}, "confirmed")
     
     # Clear cart after booking
     await db.carts.delete_one({"customer_id": booking.customer_id})
     
+    # Provider matching happens off the request path
+    booking_id = str(result.inserted_id)
+    await region.job_queue.enqueue("dispatch_booking", {"booking_id": booking_id}, dedup_key=f"dispatch:{booking_id}")
+    
     return {
         "success": True,
-        "booking_id": str(result.inserted_id),
+        "booking_id": booking_id,
+        "status": "pending",
         "message": "Booking created successfully"
     }
 
-@api_router.get("/booking/{booking_id}")
-async def get_booking(booking_id: str):
-    booking = await db.bookings.find_one({"_id": ObjectId(booking_id)})
+@api_router.post("/booking/{booking_id}/match")
+async def match_provider(booking_id: str, region: Region = Depends(request_region)):
+    booking = await region.db.bookings.find_one({"_id": ObjectId(booking_id)})
     if not booking:
         raise HTTPException(status_code=404, detail="Booking not found")
-    booking["_id"] = str(booking["_id"])
-    return booking
-
-@api_router.get("/bookings/customer/{customer_id}")
-async def get_customer_bookings(customer_id: str):
-    bookings = await db.bookings.find({"customer_id": customer_id}).sort("created_at", -1).to_list(100)
-    for booking in bookings:
-        booking["_id"] = str(booking["_id"])
-    return bookings
+    snapshot = await region.catalog_cache.snapshot()
+    booking = await match_booking(region.db, booking, snapshot.services_by_id)
+    return {"booking_id": booking_id, "status": booking["status"], "worker_id": booking.get("worker_id")}
+
+@api_router.get("/booking/{booking_id}", response_model=Booking)
+async def get_booking(booking_id: str, customer: str = Depends(current_customer),
+                      region: Region = Depends(request_region)):
+    booking = await region.db.bookings.find_one({"_id": ObjectId(booking_id)})
+    if not booking:
+        # Finished bookings move to the archive after ARCHIVE_AFTER_DAYS
+        booking = await find_archived_booking(region.db, ObjectId(booking_id))
+    if not booking:
+        raise HTTPException(status_code=404, detail="Booking not found")
+    require_customer(customer, booking["customer_id"])
+    return model_response(Booking, booking)
+
+# Summary projection for booking history; the full document is served by get_booking.
+# "images" only exists on bookings not yet moved to the blob store by migrate_images.py
+BOOKING_SUMMARY_PROJECTION = {"images": 0, "address": 0}
+MAX_BOOKINGS_PAGE_SIZE = 100
+
+def encode_booking_cursor(booking: dict) -> str:
+    raw = f"{booking['created_at'].isoformat()}|{booking['_id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_booking_cursor(cursor: str):
+    try:
+        created_at, booking_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), ObjectId(booking_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@api_router.get("/bookings/customer/{customer_id}", response_model=BookingPage)
+async def get_customer_bookings(customer_id: str, cursor: Optional[str] = None, limit: int = 20,
+                                customer: str = Depends(current_customer),
+                                region: Region = Depends(request_region)):
+    require_customer(customer, customer_id)
+    limit = max(1, min(limit, MAX_BOOKINGS_PAGE_SIZE))
+    query = {"customer_id": customer_id}
+    if cursor:
+        # Keyset pagination on (created_at, _id), newest first
+        created_at, booking_id = decode_booking_cursor(cursor)
+        query["$or"] = [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": booking_id}},
+        ]
+    
+    bookings = await region.db.bookings.find(query, BOOKING_SUMMARY_PROJECTION).sort(
+        [("created_at", -1), ("_id", -1)]
+    ).to_list(limit + 1)
+    # Archived bookings are older than most live ones but can interleave with
+    # old bookings that never finished, so both pages are merged by the same key
+    bookings += await archived_summaries(region.db, query, limit + 1)
+    bookings = sorted(bookings, key=lambda b: (b["created_at"], b["_id"]), reverse=True)[:limit + 1]
+    
+    next_cursor = None
+    if len(bookings) > limit:
+        bookings = bookings[:limit]
+        next_cursor = encode_booking_cursor(bookings[-1])
+    return model_response(BookingPage, {"bookings": bookings, "next_cursor": next_cursor})
+
+# Worker Routes
+@api_router.post("/workers")
+async def register_worker(worker: WorkerCreate, region: Region = Depends(request_region)):
+    worker_dict = {
+        "name": worker.name,
+        "phone": worker.phone,
+        "skills": worker.skills,
+        "location": point(worker.latitude, worker.longitude),
+        "status": "available",
+        "created_at": datetime.utcnow()
+    }
+    result = await region.db.workers.insert_one(worker_dict)
+    return {"success": True, "worker_id": str(result.inserted_id)}
+
+@api_router.post("/workers/{worker_id}/release")
+async def release_worker_from_booking(worker_id: str, booking_id: str, region: Region = Depends(request_region)):
+    # Called when the job is finished or cancelled so the worker can be matched again
+    await release_worker(region.db, worker_id, booking_id)
+    return {"success": True, "message": "Worker is available"}
+
+# Image Routes
+@api_router.post("/images")
+async def upload_image(file: UploadFile):
+    content_type = file.content_type or ""
+    if not content_type.startswith("image/"):
+        raise HTTPException(status_code=415, detail="Only image uploads are supported")
+    
+    async def chunks():
+        size = 0
+        while chunk := await file.read(CHUNK_SIZE):
+            size += len(chunk)
+            if size > MAX_IMAGE_SIZE:
+                raise HTTPException(status_code=413, detail="Image too large")
+            yield chunk
+    
+    info = await blob_store.save(chunks(), content_type)
+    return {"success": True, "image_id": info.blob_id, "size": info.length}
+
+def parse_range(range_header: str, length: int):
+    # Single "bytes=start-end" ranges only, which is what image viewers send
+    try:
+        unit, spec = range_header.split("=", 1)
+        start_s, end_s = spec.split("-", 1)
+        if unit.strip() != "bytes" or "," in spec:
+            raise ValueError
+        if start_s:
+            start = int(start_s)
+            end = min(int(end_s), length - 1) if end_s else length - 1
+        else:
+            start = max(length - int(end_s), 0)
+            end = length - 1
+    except ValueError:
+        return None
+    if start > end or start >= length:
+        return None
+    return start, end
+
+@api_router.get("/images/{image_id}")
+async def download_image(request: Request, image_id: str):
+    try:
+        info = await blob_store.info(image_id)
+    except BlobNotFound:
+        raise HTTPException(status_code=404, detail="Image not found")
+    
+    headers = {"Accept-Ranges": "bytes", "Cache-Control": "private, max-age=86400"}
+    range_header = request.headers.get("range")
+    if range_header:
+        byte_range = parse_range(range_header, info.length)
+        if byte_range is None:
+            raise HTTPException(
+                status_code=416,
+                detail="Invalid range",
+                headers={"Content-Range": f"bytes */{info.length}"}
+            )
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{info.length}"
+        headers["Content-Length"] = str(end - start + 1)
+        return StreamingResponse(
+            blob_store.stream(image_id, start, end),
+            status_code=206,
+            media_type=info.content_type,
+            headers=headers
+        )
+    
+    headers["Content-Length"] = str(info.length)
+    return StreamingResponse(blob_store.stream(image_id), media_type=info.content_type, headers=headers)
+
+# Booking status push (Server-Sent Events), replaces polling get_booking
+SSE_HEARTBEAT_SECONDS = float(os.environ.get('SSE_HEARTBEAT_SECONDS', '15'))
+SSE_IDLE_TIMEOUT_SECONDS = float(os.environ.get('SSE_IDLE_TIMEOUT_SECONDS', '1800'))
+
+@api_router.get("/bookings/customer/{customer_id}/events")
+async def booking_events(customer_id: str, customer: str = Depends(current_customer)):
+    require_customer(customer, customer_id)
+    return StreamingResponse(
+        event_stream(customer_id, SSE_HEARTBEAT_SECONDS, SSE_IDLE_TIMEOUT_SECONDS),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Wallet Routes
+@api_router.get("/wallet/{customer_id}")
+async def get_wallet(customer_id: str, customer: str = Depends(current_customer)):
+    require_customer(customer, customer_id)
+    balance = await get_balance(db, customer_id)
+    if balance is None:
+        raise HTTPException(status_code=404, detail="Wallet not found")
+    return {"customer_id": customer_id, "balance": to_major(balance), "currency": "INR"}
+
+@api_router.get("/wallet/{customer_id}/transactions", response_model=WalletTransactionPage)
+async def get_wallet_transactions(customer_id: str, cursor: Optional[int] = None, limit: int = 20,
+                                  customer: str = Depends(current_customer)):
+    require_customer(customer, customer_id)
+    page = await history(db, customer_id, cursor, max(1, min(limit, 100)))
+    for entry in page["transactions"]:
+        entry["amount"] = to_major(entry["amount"])
+        entry["balance_after"] = to_major(entry["balance_after"])
+    return model_response(WalletTransactionPage, page)
+
+@api_router.post("/wallet/topup")
+async def wallet_topup(request: WalletAmountRequest, customer: str = Depends(current_customer)):
+    require_customer(customer, request.customer_id)
+    try:
+        entry = await credit(db, request.customer_id, to_minor(request.amount), request.reason, request.reference)
+    finally:
+        user_cache.invalidate(request.customer_id)
+    return {"success": True, "balance": to_major(entry["balance_after"])}
+
+@api_router.post("/wallet/debit")
+async def wallet_debit(request: WalletAmountRequest, customer: str = Depends(current_customer)):
+    require_customer(customer, request.customer_id)
+    try:
+        entry = await debit(db, request.customer_id, to_minor(request.amount), request.reason, request.reference)
+    finally:
+        user_cache.invalidate(request.customer_id)
+    return {"success": True, "balance": to_major(entry["balance_after"])}
+
+# Reporting Routes (operators only; served from the daily rollups, never raw bookings)
+@api_router.get("/analytics/report", dependencies=[Depends(require_admin)])
+async def analytics_report(start: date, end: date, group_by: str = "day", city: Optional[str] = None,
+                           category_id: Optional[str] = None):
+    if group_by not in GROUP_FIELDS:
+        raise HTTPException(status_code=400, detail=f"group_by must be one of {', '.join(GROUP_FIELDS)}")
+    if end < start:
+        raise HTTPException(status_code=400, detail="end must not be before start")
+    # A city's rollups live in its region; otherwise every region's are added up
+    targets = [regions.resolve(city=city)] if city else regions.all()
+    rows = merge_reports(await asyncio.gather(*(
+        report(region.db, start, end, group_by=group_by, city=city, category_id=category_id) for region in targets
+    )), group_by)
+    return {"start": start, "end": end, "group_by": group_by, "rows": rows}
+
+@api_router.get("/analytics/daily", dependencies=[Depends(require_admin)])
+async def analytics_daily(start: date, end: date, city: Optional[str] = None, category_id: Optional[str] = None):
+    # Raw rollup rows: one per day, city and category, with per-status breakdowns
+    query = {"day": {"$gte": start.isoformat(), "$lte": end.isoformat()}}
+    if city:
+        query["city"] = normalize_city(city)
+    if category_id:
+        query["category_id"] = category_id
+    targets = [regions.resolve(city=city)] if city else regions.all()
+    rows = []
+    for region in targets:
+        rows += await region.db.booking_rollups.find(query, {"_id": 0}).sort(
+            [("day", 1), ("city", 1), ("category_id", 1)]
+        ).to_list(5000)
+    rows.sort(key=lambda row: (row["day"], row.get("city") or "", row.get("category_id") or ""))
+    return {"rows": rows[:5000]}
 
 # User Profile Routes
 @api_router.put("/user/profile")
-async def update_profile(customer_id: str, name: Optional[str] = None, preferred_language: Optional[str] = None):
+async def update_profile(customer_id: str, name: Optional[str] = None, preferred_language: Optional[str] = None,
+                         customer: str = Depends(current_customer)):
+    require_customer(customer, customer_id)
     update_data = {}
     if name:
         update_data["name"] = name
@@ -337,12 +853,43 @@ async def update_profile(customer_id: str, name: Optional[str] = None, preferred
             {"_id": ObjectId(customer_id)},
             {"$set": update_data}
         )
+        user_cache.invalidate(customer_id)
     
     return {"success": True, "message": "Profile updated"}
 
+# Prometheus scrape endpoint; kept outside /api so it is not exposed through the ingress
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    gauges = {f"mongo_pool_{name}": value for name, value in pool_stats.as_dict().items()}
+    # Per-region queues and caches are reported as totals across regions
+    for region in regions.all():
+        for status, count in (await region.job_queue.depth()).items():
+            gauges[f"job_queue_{status}"] = gauges.get(f"job_queue_{status}", 0) + count
+        for status, count in (await region.notification_dispatcher.depth()).items():
+            gauges[f"notifications_{status}"] = gauges.get(f"notifications_{status}", 0) + count
+        gauges["search_index_documents"] = gauges.get("search_index_documents", 0) + len(region.search_index.docs)
+        for name, value in region.catalog_cache.stats().items():
+            if name in ("entries", "projections", "hits", "misses", "reloads"):
+                gauges[f"catalog_cache_{name}"] = gauges.get(f"catalog_cache_{name}", 0) + value
+    gauges["regions"] = len(regions.all())
+    gauges["booking_event_subscribers"] = hub.subscriber_count()
+    gauges["booking_events_published"] = hub.published
+    gauges.update({
+        f"user_cache_{name}": value
+        for name, value in user_cache.stats().items()
+        if name in ("entries", "hits", "misses", "coalesced", "invalidations", "hit_ratio")
+    })
+    return registry.render(gauges)
+
 # Include the router in the main app
 app.include_router(api_router)
 
+app.add_middleware(
+    MetricsMiddleware,
+    slow_ms=float(os.environ.get('SLOW_REQUEST_MS', '500')),
+    sample_rate=float(os.environ.get('SLOW_REQUEST_SAMPLE_RATE', '1.0'))
+)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -357,7 +904,3 @@ logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
-
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
@@ -0,0 +1,178 @@
+import math
+import os
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from fastapi import HTTPException
+
+# Bookable day, in the service area's local time. The app's time picker shows
+# one-hour slots from 09:00 to 19:00
+SLOT_MINUTES = int(os.environ.get('SLOT_MINUTES', '60'))
+DAY_START = time(int(os.environ.get('SLOT_DAY_START_HOUR', '9')))
+DAY_END = time(int(os.environ.get('SLOT_DAY_END_HOUR', '20')))
+SLOT_TIMEZONE = ZoneInfo(os.environ.get('SLOT_TIMEZONE', 'Asia/Kolkata'))
+# Concurrent jobs per category and pincode in one slot, unless slot_capacity says otherwise
+DEFAULT_SLOT_CAPACITY = int(os.environ.get('DEFAULT_SLOT_CAPACITY', '5'))
+MAX_AVAILABILITY_DAYS = 14
+
+
+def slots_per_day() -> int:
+    return ((DAY_END.hour * 60 + DAY_END.minute) - (DAY_START.hour * 60 + DAY_START.minute)) // SLOT_MINUTES
+
+
+def slot_start(day: date, index: int) -> datetime:
+    """Naive UTC start of slot `index` on `day` (naive UTC is how datetimes are stored)."""
+    local = datetime.combine(day, DAY_START, tzinfo=SLOT_TIMEZONE) + timedelta(minutes=index * SLOT_MINUTES)
+    return local.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def slot_position(scheduled_at: datetime) -> Tuple[date, int]:
+    if scheduled_at.tzinfo is None:
+        scheduled_at = scheduled_at.replace(tzinfo=timezone.utc)
+    local = scheduled_at.astimezone(SLOT_TIMEZONE)
+    minutes = local.hour * 60 + local.minute - (DAY_START.hour * 60 + DAY_START.minute)
+    index = minutes // SLOT_MINUTES
+    if minutes < 0 or index >= slots_per_day():
+        raise HTTPException(status_code=400, detail="Scheduled time is outside service hours")
+    return local.date(), index
+
+
+def slots_needed(minutes: int) -> int:
+    return max(1, math.ceil(minutes / SLOT_MINUTES))
+
+
+def inventory_id(category_id: str, pincode: str, day: date) -> str:
+    # Sorts by date within a category and pincode, so a date range is an _id range
+    return f"{category_id}:{pincode}:{day.isoformat()}"
+
+
+def category_demand(services_by_id: Dict[str, dict], lines: Iterable[dict]) -> Dict[str, int]:
+    """Minutes of work per category for a booking's service lines."""
+    demand: Dict[str, int] = {}
+    for line in lines:
+        service = services_by_id.get(line["service_id"])
+        if service is None:
+            continue
+        minutes = service.get("duration_minutes", 60) * line.get("quantity", 1)
+        demand[service["category_id"]] = demand.get(service["category_id"], 0) + minutes
+    return demand
+
+
+async def slot_capacity(db, category_id: str, pincode: str) -> int:
+    # A pincode-specific override wins over a category-wide one (null pincode sorts first)
+    override = await db.slot_capacity.find_one(
+        {"category_id": category_id, "pincode": {"$in": [pincode, None]}},
+        sort=[("pincode", -1)]
+    )
+    return override["capacity"] if override else DEFAULT_SLOT_CAPACITY
+
+
+async def ensure_inventory(db, category_id: str, pincode: str, day: date):
+    capacity = await slot_capacity(db, category_id, pincode)
+    await db.slot_inventory.update_one(
+        {"_id": inventory_id(category_id, pincode, day)},
+        {"$setOnInsert": {
+            "category_id": category_id,
+            "pincode": pincode,
+            "date": day.isoformat(),
+            "capacity": capacity,
+            "remaining": [capacity] * slots_per_day(),
+        }},
+        upsert=True
+    )
+
+
+async def plan_reservations(db, services_by_id: Dict[str, dict], lines: List[dict], pincode: str,
+                            scheduled_at: datetime) -> List[dict]:
+    """Work out which slots a booking needs and make sure their counters exist.
+
+    Kept apart from `reserve_slots` so the upserts run outside the caller's
+    transaction; only the conditional decrements run inside it.
+    """
+    day, start = slot_position(scheduled_at)
+    reservations = []
+    for category_id, minutes in sorted(category_demand(services_by_id, lines).items()):
+        count = slots_needed(minutes)
+        if start + count > slots_per_day():
+            raise HTTPException(status_code=400, detail="Booking would run past service hours, pick an earlier slot")
+        await ensure_inventory(db, category_id, pincode, day)
+        reservations.append({"inventory_id": inventory_id(category_id, pincode, day), "start": start, "count": count})
+    return reservations
+
+
+def _slot_fields(reservation: dict) -> List[str]:
+    return [f"remaining.{i}" for i in range(reservation["start"], reservation["start"] + reservation["count"])]
+
+
+async def reserve_slots(db, reservations: List[dict], session=None):
+    """Take one unit from every slot in `reservations`, or none of them.
+
+    Each category is a single conditional $inc on its day's counter
+    document, so concurrent bookings for the same slot never oversell and
+    never need a read-modify-write retry loop. Inside a transaction a
+    failure aborts everything; without one, units already taken are
+    handed back before raising.
+    """
+    taken = []
+    for reservation in reservations:
+        fields = _slot_fields(reservation)
+        result = await db.slot_inventory.update_one(
+            {"_id": reservation["inventory_id"], **{field: {"$gte": 1} for field in fields}},
+            {"$inc": {field: -1 for field in fields}},
+            session=session
+        )
+        if result.modified_count == 0:
+            if session is None:
+                await release_slots(db, taken)
+            raise HTTPException(status_code=409, detail="This time slot is fully booked, please pick another")
+        taken.append(reservation)
+
+
+async def release_slots(db, reservations: List[dict], session=None):
+    for reservation in reservations:
+        await db.slot_inventory.update_one(
+            {"_id": reservation["inventory_id"]},
+            {"$inc": {field: 1 for field in _slot_fields(reservation)}},
+            session=session
+        )
+
+
+async def availability(db, demand: Dict[str, int], pincode: str, start: date, days: int,
+                       now: Optional[datetime] = None) -> List[dict]:
+    """Open slots per day for a booking with the given per-category demand.
+
+    Reads one counter document per category and day in a single query; days
+    nobody has booked yet have no document and are fully open.
+    """
+    now = now or datetime.utcnow()
+    dates = [start + timedelta(days=offset) for offset in range(days)]
+    ids = [inventory_id(category_id, pincode, day) for category_id in demand for day in dates]
+    inventory = {doc["_id"]: doc["remaining"] async for doc in db.slot_inventory.find({"_id": {"$in": ids}})}
+    capacities = {category_id: await slot_capacity(db, category_id, pincode) for category_id in demand}
+
+    result = []
+    per_day = slots_per_day()
+    for day in dates:
+        slots = []
+        for index in range(per_day):
+            starts_at = slot_start(day, index)
+            remaining = None
+            for category_id, minutes in demand.items():
+                count = slots_needed(minutes)
+                if index + count > per_day:
+                    remaining = 0
+                    break
+                counters = inventory.get(inventory_id(category_id, pincode, day)) or [capacities[category_id]] * per_day
+                least = min(counters[index:index + count])
+                remaining = least if remaining is None else min(remaining, least)
+            remaining = 0 if starts_at <= now else (remaining if remaining is not None else DEFAULT_SLOT_CAPACITY)
+            local = datetime.combine(day, DAY_START) + timedelta(minutes=index * SLOT_MINUTES)
+            slots.append({
+                "time": local.strftime("%H:%M"),
+                "start": starts_at,
+                "remaining": remaining,
+                "available": remaining > 0,
+            })
+        result.append({"date": day.isoformat(), "slots": slots})
+    return result
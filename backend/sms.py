@@ -0,0 +1,48 @@
+import logging
+import os
+from abc import ABC, abstractmethod
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class SmsSender(ABC):
+    @abstractmethod
+    async def send(self, phone: str, message: str):
+        ...
+
+    async def close(self):
+        pass
+
+
+class LogSmsSender(SmsSender):
+    """Local stub: writes the message to the log instead of sending it."""
+
+    async def send(self, phone: str, message: str):
+        logger.info("SMS to %s: %s", phone, message)
+
+
+class WebhookSmsSender(SmsSender):
+    """Posts {"to", "message"} as JSON to an SMS gateway endpoint."""
+
+    def __init__(self, url: str, api_key: str = "", timeout: float = 5.0):
+        self.url = url
+        headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        self.client = httpx.AsyncClient(timeout=timeout, headers=headers)
+
+    async def send(self, phone: str, message: str):
+        response = await self.client.post(self.url, json={"to": phone, "message": message})
+        response.raise_for_status()
+
+    async def close(self):
+        await self.client.aclose()
+
+
+def create_sms_sender() -> SmsSender:
+    backend = os.environ.get('SMS_BACKEND', 'log')
+    if backend == 'webhook':
+        return WebhookSmsSender(os.environ['SMS_WEBHOOK_URL'], os.environ.get('SMS_API_KEY', ''))
+    if backend == 'log':
+        return LogSmsSender()
+    raise ValueError(f"Unknown SMS_BACKEND: {backend}")
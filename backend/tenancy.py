@@ -0,0 +1,207 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from typing import Dict, Iterable, List, Optional
+
+from bson import ObjectId
+
+from analytics import normalize_city
+from archive import run_archive_loop
+from booking_events import hub
+from catalog_cache import CatalogCache
+from database import get_client
+from job_queue import JobQueue, JobWorkerPool
+from matching import match_booking, run_expiry_loop
+from notifications import NotificationDispatcher, Transport
+from search_index import SearchIndex
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REGION = "default"
+MATCH_RETRY_SECONDS = float(os.environ.get('MATCH_RETRY_SECONDS', '10'))
+# Indian pincodes are six digits; the leading ones name the postal circle and district
+MAX_PINCODE_PREFIX = 6
+
+
+class Region:
+    """One partition of the service area: a database and the work that runs against it.
+
+    A region's database holds its bookings (live and archived), slot
+    inventory and capacity, workers, rollups, dispatch jobs, booking
+    notifications and its `service_prices`. Customers, wallets, carts and
+    the catalog itself stay in the main database. Nothing here reads
+    another region's data, so per-region query cost does not depend on how
+    many regions exist.
+    """
+
+    def __init__(self, key: str, db, catalog_db, transports: Dict[str, Transport]):
+        self.key = key
+        self.db = db
+        regional = (db.client is not catalog_db.client) or (db.name != catalog_db.name)
+        # Every region sees the same catalog, with its own prices applied
+        self.catalog_cache = CatalogCache(
+            catalog_db,
+            ttl=float(os.environ.get('CATALOG_CACHE_TTL', '30')),
+            max_entries=int(os.environ.get('CATALOG_CACHE_MAX_ENTRIES', '1024')),
+            enabled=os.environ.get('CATALOG_CACHE_ENABLED', 'true').lower() == 'true',
+            region_db=db if regional else None
+        )
+        # Search runs over the cached catalog snapshot and catches up whenever its version moves
+        self.search_index = SearchIndex()
+        # Background jobs (booking dispatch) run on a Mongo-backed queue
+        self.job_queue = JobQueue(
+            db,
+            lease_seconds=float(os.environ.get('JOB_LEASE_SECONDS', '30')),
+            max_attempts=int(os.environ.get('JOB_MAX_ATTEMPTS', '5'))
+        )
+        self.job_workers = JobWorkerPool(
+            self.job_queue,
+            {"dispatch_booking": self.dispatch_booking},
+            concurrency=int(os.environ.get('JOB_WORKER_CONCURRENCY', '8'))
+        )
+        self.notification_dispatcher = NotificationDispatcher(
+            db,
+            transports,
+            batch_size=int(os.environ.get('NOTIFICATION_BATCH_SIZE', '100')),
+            concurrency=int(os.environ.get('NOTIFICATION_CONCURRENCY', '2')),
+            max_attempts=int(os.environ.get('NOTIFICATION_MAX_ATTEMPTS', '5'))
+        )
+        self._tasks = []
+        self._workers_started = False
+
+    async def dispatch_booking(self, job: dict) -> Optional[float]:
+        booking = await self.db.bookings.find_one({"_id": ObjectId(job["payload"]["booking_id"])})
+        if not booking:
+            return None
+        snapshot = await self.catalog_cache.snapshot()
+        booking = await match_booking(self.db, booking, snapshot.services_by_id)
+        # Keep looking for a provider until the booking is matched or expires
+        if booking["status"] == "pending":
+            return MATCH_RETRY_SECONDS
+        return None
+
+    def start(self, run_workers: bool):
+        self._tasks = [
+            asyncio.create_task(run_expiry_loop(self.db)),
+            asyncio.create_task(hub.run_change_stream(self.db)),
+        ]
+        if run_workers:
+            self.job_workers.start()
+            self.notification_dispatcher.start()
+            self._tasks.append(asyncio.create_task(
+                run_archive_loop(self.db, float(os.environ.get('ARCHIVE_INTERVAL', '3600')))
+            ))
+        self._workers_started = run_workers
+
+    async def stop(self):
+        if self._workers_started:
+            await self.job_workers.stop()
+            await self.notification_dispatcher.stop()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+class RegionRouter:
+    """Maps a city or pincode to its region.
+
+    Lookups are dictionary probes (a normalized city, or at most six
+    pincode prefixes, longest first), so routing cost is independent of
+    the number of cities. Anything unmapped goes to the default region.
+    """
+
+    def __init__(self, default: Region):
+        self.default = default
+        self.regions: Dict[str, Region] = {default.key: default}
+        self._by_city: Dict[str, Region] = {}
+        self._by_prefix: Dict[str, Region] = {}
+
+    def add(self, region: Region, cities: Iterable[str] = (), pincode_prefixes: Iterable[str] = ()):
+        self.regions[region.key] = region
+        for city in cities:
+            self._by_city[normalize_city(city)] = region
+        for prefix in pincode_prefixes:
+            self._by_prefix[prefix.strip()] = region
+
+    def resolve(self, city: Optional[str] = None, pincode: Optional[str] = None) -> Region:
+        # The pincode is the more precise of the two (city names are free text)
+        if pincode:
+            pincode = pincode.strip()
+            for length in range(min(len(pincode), MAX_PINCODE_PREFIX), 0, -1):
+                region = self._by_prefix.get(pincode[:length])
+                if region is not None:
+                    return region
+        if city:
+            region = self._by_city.get(normalize_city(city))
+            if region is not None:
+                return region
+        return self.default
+
+    def all(self) -> List[Region]:
+        return list(self.regions.values())
+
+
+def load_region_config() -> dict:
+    """CITY_REGIONS: a JSON object, or the path of a JSON file holding one.
+
+    {"south": {"mongo_url": "mongodb://...", "db_name": "workhub_south",
+               "cities": ["Chennai", "Bengaluru"], "pincode_prefixes": ["60", "56"]}}
+
+    `mongo_url` defaults to MONGO_URL. A region named "default" only adds
+    cities and pincodes to the main database's region.
+    """
+    raw = os.environ.get('CITY_REGIONS', '').strip()
+    if not raw:
+        return {}
+    if not raw.startswith("{"):
+        with open(raw) as config_file:
+            raw = config_file.read()
+    return json.loads(raw)
+
+
+def create_region_router(db, transports: Dict[str, Transport], config: Optional[dict] = None) -> RegionRouter:
+    # Without CITY_REGIONS everything is one region on the main database, as before
+    config = load_region_config() if config is None else config
+    router = RegionRouter(Region(DEFAULT_REGION, db, db, transports))
+    by_database = {(os.environ['MONGO_URL'], db.name): router.default}
+    for key, spec in config.items():
+        url = spec.get("mongo_url", os.environ['MONGO_URL'])
+        db_name = spec.get("db_name", db.name if key == DEFAULT_REGION else f"{db.name}_{key}")
+        region = by_database.get((url, db_name))
+        if region is None:
+            region = Region(key, get_client(url)[db_name], db, transports)
+            by_database[(url, db_name)] = region
+        router.add(region, spec.get("cities", []), spec.get("pincode_prefixes", []))
+    return router
+
+
+def benchmark(sizes: List[int], lookups: int):
+    # Regions are only ever probed by key, so resolve() should cost the same at any size
+    class Stub:
+        def __init__(self, key):
+            self.key = key
+
+    for size in sizes:
+        routing = RegionRouter(Stub(DEFAULT_REGION))
+        cities = [f"city {i}" for i in range(size)]
+        for i, city in enumerate(cities):
+            routing.add(Stub(f"region-{i % 50}"), [city], [f"{100000 + i * 7:06d}"[:4]])
+        probes = [(random.choice(cities), f"{random.randrange(100000, 999999)}") for _ in range(lookups)]
+        started = time.perf_counter()
+        for city, pincode in probes:
+            routing.resolve(city=city, pincode=pincode)
+        elapsed = time.perf_counter() - started
+        print(f"{size:>7} cities: {elapsed / lookups * 1e6:.2f}us per lookup")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check request routing cost does not grow with the number of cities")
+    parser.add_argument("--sizes", default="10,100,1000,10000,100000")
+    parser.add_argument("--lookups", type=int, default=200_000)
+    args = parser.parse_args()
+    benchmark([int(size) for size in args.sizes.split(",")], args.lookups)
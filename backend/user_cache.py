@@ -0,0 +1,144 @@
+import argparse
+import asyncio
+import random
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+
+class UserCache:
+    """Read-through cache of user profiles keyed by customer id.
+
+    Entries live for `ttl` seconds in an LRU of at most `max_entries`.
+    Concurrent misses for one customer share a single load. `invalidate`
+    drops the entry and any load already in flight, and bumps the key's
+    generation so a load that started before the invalidation is never
+    stored: once `invalidate` returns, every read sees the write that
+    preceded it. Invalidation is per process; the TTL bounds how long
+    other workers can serve the old profile.
+    """
+
+    def __init__(self, load: Callable[[str], Awaitable[Optional[dict]]], ttl: float = 15.0,
+                 max_entries: int = 10000, enabled: bool = True):
+        self.load = load
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.invalidations = 0
+        self._entries: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._generations: Dict[str, int] = {}
+
+    async def get(self, customer_id: str) -> Optional[dict]:
+        if not self.enabled:
+            return await self.load(customer_id)
+
+        entry = self._entries.get(customer_id)
+        if entry is not None and time.monotonic() - entry[0] < self.ttl:
+            self._entries.move_to_end(customer_id)
+            self.hits += 1
+            return dict(entry[1])
+
+        inflight = self._inflight.get(customer_id)
+        if inflight is None:
+            self.misses += 1
+            # A task rather than a plain await, so a caller that disconnects
+            # does not cancel the read other callers are waiting on
+            inflight = asyncio.ensure_future(self._load(customer_id, self._generations.get(customer_id, 0)))
+            self._inflight[customer_id] = inflight
+        else:
+            self.coalesced += 1
+        user = await asyncio.shield(inflight)
+        return dict(user) if user is not None else None
+
+    async def _load(self, customer_id: str, generation: int) -> Optional[dict]:
+        try:
+            user = await self.load(customer_id)
+        finally:
+            if self._inflight.get(customer_id) is asyncio.current_task():
+                del self._inflight[customer_id]
+        # Unknown customers are not cached, so a signup is visible immediately
+        if user is not None and self._generations.get(customer_id, 0) == generation:
+            self._entries[customer_id] = (time.monotonic(), user)
+            self._entries.move_to_end(customer_id)
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return user
+
+    def invalidate(self, customer_id: str):
+        self.invalidations += 1
+        self._entries.pop(customer_id, None)
+        self._inflight.pop(customer_id, None)
+        # Only keys with a load in flight can be raced, but the counter is
+        # cheap and simpler to reason about when it always moves
+        self._generations[customer_id] = self._generations.get(customer_id, 0) + 1
+        if len(self._generations) > self.max_entries * 2:
+            self._generations = {key: self._generations[key] for key in self._inflight}
+
+    def clear(self):
+        self._entries.clear()
+        self._inflight.clear()
+        self._generations.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "enabled": self.enabled,
+            "ttl_seconds": self.ttl,
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "invalidations": self.invalidations,
+            "hit_ratio": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+        }
+
+
+async def _check_staleness(customers: int, rounds: int, latency: float):
+    # A fake users collection with slow reads; every update must be visible
+    # to every read that starts after it returns
+    store = {str(i): {"_id": str(i), "name": "v0"} for i in range(customers)}
+    committed = {customer_id: 0 for customer_id in store}
+    loads = 0
+
+    async def load(customer_id):
+        nonlocal loads
+        loads += 1
+        snapshot = dict(store[customer_id])
+        await asyncio.sleep(random.uniform(0, latency))
+        return snapshot
+
+    cache = UserCache(load, ttl=60.0)
+
+    async def reader(customer_id):
+        await asyncio.sleep(random.uniform(0, latency))
+        expected = committed[customer_id]
+        user = await cache.get(customer_id)
+        assert int(user["name"][1:]) >= expected, f"stale read for {customer_id}: {user['name']} after v{expected}"
+
+    async def updater(customer_id, version):
+        await asyncio.sleep(random.uniform(0, latency))
+        store[customer_id] = {"_id": customer_id, "name": f"v{version}"}
+        cache.invalidate(customer_id)
+        committed[customer_id] = version
+
+    started = time.perf_counter()
+    for version in range(1, rounds + 1):
+        tasks = [reader(str(random.randrange(customers))) for _ in range(customers * 4)]
+        tasks += [updater(str(random.randrange(customers)), version) for _ in range(max(1, customers // 10))]
+        await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    print(f"{rounds} rounds, {loads} loads, no stale reads in {elapsed:.1f}s")
+    print(cache.stats())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the user cache never serves a profile older than the last update")
+    parser.add_argument("--customers", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.005, help="simulated Mongo read time, seconds")
+    args = parser.parse_args()
+    asyncio.run(_check_staleness(args.customers, args.rounds, args.latency))
@@ -0,0 +1,178 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Optional
+
+from fastapi import HTTPException
+from pymongo import DESCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from database import run_transaction
+
+logger = logging.getLogger(__name__)
+
+# Amounts are integer paise everywhere in this module; only the API edge converts
+MINOR_UNITS = 100
+
+
+def to_minor(amount: float) -> int:
+    return int(round(amount * MINOR_UNITS))
+
+
+def to_major(amount_minor: int) -> float:
+    return amount_minor / MINOR_UNITS
+
+
+class InsufficientFunds(Exception):
+    pass
+
+
+async def ensure_wallet(db, customer_id: str, opening_balance_minor: int = 0):
+    """Create the wallet if missing, recording any opening balance in the ledger."""
+    try:
+        await db.wallets.insert_one({
+            "_id": customer_id,
+            "balance": 0,
+            "seq": 0,
+            "created_at": datetime.utcnow(),
+            "updated_at": datetime.utcnow(),
+        })
+    except DuplicateKeyError:
+        return
+    if opening_balance_minor:
+        await credit(db, customer_id, opening_balance_minor, "opening_balance", reference=f"opening:{customer_id}")
+
+
+async def _apply(db, customer_id: str, amount_minor: int, kind: str, reason: str,
+                 reference: Optional[str]) -> dict:
+    """Move the balance by `amount_minor` and append the matching ledger entry atomically.
+
+    Debits carry a `balance >= amount` condition in the same update, so
+    concurrent debits can never take the balance below zero.
+    """
+    async def write(session):
+        condition = {"_id": customer_id}
+        if amount_minor < 0:
+            condition["balance"] = {"$gte": -amount_minor}
+        wallet = await db.wallets.find_one_and_update(
+            condition,
+            {"$inc": {"balance": amount_minor, "seq": 1}, "$set": {"updated_at": datetime.utcnow()}},
+            return_document=ReturnDocument.AFTER,
+            session=session
+        )
+        if wallet is None:
+            if await db.wallets.count_documents({"_id": customer_id}, limit=1, session=session):
+                raise InsufficientFunds(customer_id)
+            raise HTTPException(status_code=404, detail="Wallet not found")
+        entry = {
+            "customer_id": customer_id,
+            "seq": wallet["seq"],
+            "type": kind,
+            "amount": amount_minor,
+            "balance_after": wallet["balance"],
+            "reason": reason,
+            "created_at": datetime.utcnow(),
+        }
+        if reference:
+            entry["reference"] = reference
+        await db.transactions.insert_one(entry, session=session)
+        return entry
+
+    return await run_transaction(write)
+
+
+async def _find_by_reference(db, customer_id: str, reference: Optional[str]) -> Optional[dict]:
+    if not reference:
+        return None
+    return await db.transactions.find_one({"customer_id": customer_id, "reference": reference})
+
+
+async def credit(db, customer_id: str, amount_minor: int, reason: str, reference: Optional[str] = None) -> dict:
+    if amount_minor <= 0:
+        raise HTTPException(status_code=400, detail="Amount must be positive")
+    # A reference makes the operation idempotent (e.g. a retried payment callback)
+    existing = await _find_by_reference(db, customer_id, reference)
+    if existing:
+        return existing
+    try:
+        return await _apply(db, customer_id, amount_minor, "credit", reason, reference)
+    except DuplicateKeyError:
+        return await _find_by_reference(db, customer_id, reference)
+
+
+async def debit(db, customer_id: str, amount_minor: int, reason: str, reference: Optional[str] = None) -> dict:
+    if amount_minor <= 0:
+        raise HTTPException(status_code=400, detail="Amount must be positive")
+    existing = await _find_by_reference(db, customer_id, reference)
+    if existing:
+        return existing
+    try:
+        return await _apply(db, customer_id, -amount_minor, "debit", reason, reference)
+    except InsufficientFunds:
+        raise HTTPException(status_code=402, detail="Insufficient wallet balance")
+    except DuplicateKeyError:
+        return await _find_by_reference(db, customer_id, reference)
+
+
+async def get_balance(db, customer_id: str) -> Optional[int]:
+    # The wallet document is the running balance; the ledger is never summed on reads
+    wallet = await db.wallets.find_one({"_id": customer_id}, {"balance": 1})
+    return wallet["balance"] if wallet else None
+
+
+async def history(db, customer_id: str, before_seq: Optional[int], limit: int) -> dict:
+    query = {"customer_id": customer_id}
+    if before_seq is not None:
+        query["seq"] = {"$lt": before_seq}
+    entries = await db.transactions.find(query, {"_id": 0}).sort("seq", DESCENDING).to_list(limit + 1)
+    next_cursor = None
+    if len(entries) > limit:
+        entries = entries[:limit]
+        next_cursor = entries[-1]["seq"]
+    return {"transactions": entries, "next_cursor": next_cursor}
+
+
+async def snapshot_wallets(db, batch_size: int = 500) -> int:
+    """Record a balance checkpoint for every wallet that moved since its last one.
+
+    A checkpoint plus the ledger entries after its seq must equal the live
+    balance, which lets `verify_wallet` audit a wallet without replaying the
+    whole ledger.
+    """
+    written = 0
+    cursor = db.wallets.find({}, {"balance": 1, "seq": 1, "snapshot_seq": 1}).batch_size(batch_size)
+    async for wallet in cursor:
+        if wallet.get("snapshot_seq") == wallet["seq"]:
+            continue
+        await db.wallet_snapshots.insert_one({
+            "customer_id": wallet["_id"],
+            "seq": wallet["seq"],
+            "balance": wallet["balance"],
+            "created_at": datetime.utcnow(),
+        })
+        await db.wallets.update_one({"_id": wallet["_id"]}, {"$max": {"snapshot_seq": wallet["seq"]}})
+        written += 1
+    return written
+
+
+async def verify_wallet(db, customer_id: str) -> bool:
+    wallet = await db.wallets.find_one({"_id": customer_id})
+    if wallet is None:
+        return True
+    snapshot = await db.wallet_snapshots.find_one({"customer_id": customer_id}, sort=[("seq", DESCENDING)])
+    base_seq, base_balance = (snapshot["seq"], snapshot["balance"]) if snapshot else (0, 0)
+    total = base_balance
+    async for entry in db.transactions.find({"customer_id": customer_id, "seq": {"$gt": base_seq}}, {"amount": 1}):
+        total += entry["amount"]
+    return total == wallet["balance"]
+
+
+async def run_snapshot_loop(db, interval: float = 3600.0):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            written = await snapshot_wallets(db)
+            if written:
+                logger.info("Wrote %d wallet balance snapshots", written)
+        except Exception:
+            logger.exception("Wallet snapshot failed")
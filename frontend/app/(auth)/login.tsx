@@ -35,8 +35,10 @@ export default function Login() {
       const response = await authAPI.login(phone);
       if (response.data.success) {
         setShowOTP(true);
-        // For demo, show the OTP
-        Alert.alert('OTP Sent', `Your OTP is: ${response.data.otp}`);
+        // Only returned by development servers (OTP_DEBUG=true)
+        if (response.data.otp) {
+          Alert.alert('OTP Sent', `Your OTP is: ${response.data.otp}`);
+        }
       }
     } catch (error) {
       Alert.alert('Error', 'Failed to send OTP. Please try again.');
@@ -56,7 +58,7 @@ export default function Login() {
       const response = await authAPI.verifyOTP(phone, otp);
       if (response.data.success) {
         setUser(response.data.user);
-        setToken(response.data.token);
+        setToken(response.data.token, response.data.refresh_token);
         router.replace('/(tabs)/home');
       } else {
         Alert.alert('Error', 'Invalid OTP. Please try again.');
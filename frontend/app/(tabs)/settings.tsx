@@ -12,6 +12,7 @@ import { useRouter } from 'expo-router';
 import { Ionicons } from '@expo/vector-icons';
 import { colors } from '../../theme/colors';
 import { useAuthStore } from '../../store/authStore';
+import { authAPI } from '../../utils/api';
 
 export default function Settings() {
   const router = useRouter();
@@ -27,6 +28,8 @@ export default function Settings() {
           text: 'Logout',
           style: 'destructive',
           onPress: async () => {
+            // Revoke refresh tokens server-side; local logout proceeds regardless
+            await authAPI.logout().catch(() => {});
             await logout();
             router.replace('/(auth)/login');
           },
@@ -15,9 +15,11 @@ import { useRouter } from 'expo-router';
 import { Ionicons } from '@expo/vector-icons';
 import { LinearGradient } from 'expo-linear-gradient';
 import { colors, gradient } from '../../theme/colors';
+import { useAuthStore } from '../../store/authStore';
 
 export default function BookingAddress() {
   const router = useRouter();
+  const setLocation = useAuthStore(state => state.setLocation);
   const [address, setAddress] = useState({
     street: '',
     city: '',
@@ -31,6 +33,8 @@ export default function BookingAddress() {
       Alert.alert('Error', 'Please fill all required fields');
       return;
     }
+    // Later requests (prices, availability, the booking itself) go to this address's region
+    setLocation({ city: address.city, pincode: address.pincode });
     // Store address and navigate to date/time
     router.push({
       pathname: '/booking/datetime',
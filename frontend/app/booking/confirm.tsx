@@ -1,4 +1,4 @@
-import React from 'react';
+import React, { useRef } from 'react';
 import {
   View,
   Text,
@@ -31,6 +31,9 @@ export default function BookingConfirm() {
   const tax = subtotal * 0.18;
   const finalTotal = subtotal + convenienceFee + tax;
 
+  // One key per confirm screen, so retries of the same checkout can't double-book
+  const idempotencyKey = useRef(`${Date.now()}-${Math.random().toString(36).slice(2)}`).current;
+
   const handleBookNow = async () => {
     if (!user || !address || !dateStr) {
       Alert.alert('Error', 'Missing booking information');
@@ -39,16 +42,14 @@ export default function BookingConfirm() {
 
     try {
       const scheduledDate = new Date(dateStr);
-      const response = await bookingAPI.create({
+      const response = await bookingAPI.checkout({
         customer_id: user._id,
         customer_name: user.name,
         customer_phone: user.phone,
-        services: items,
-        total_price: finalTotal,
         scheduled_at: scheduledDate,
         address: address,
-        images: [],
-      });
+        image_ids: [],
+      }, idempotencyKey);
 
       if (response.data.success) {
         clearCart();
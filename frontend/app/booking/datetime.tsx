@@ -1,4 +1,4 @@
-import React, { useState } from 'react';
+import React, { useEffect, useState } from 'react';
 import {
   View,
   Text,
@@ -12,12 +12,53 @@ import { useRouter, useLocalSearchParams } from 'expo-router';
 import { Ionicons } from '@expo/vector-icons';
 import { LinearGradient } from 'expo-linear-gradient';
 import { colors, gradient } from '../../theme/colors';
+import { useCartStore } from '../../store/cartStore';
+import { slotAPI } from '../../utils/api';
+
+interface Slot {
+  time: string;
+  start: string;
+  available: boolean;
+}
+
+// "14:00" -> "02:00 PM", matching the labels shown before availability loads
+const formatSlotTime = (time: string) => {
+  const [hours, minutes] = time.split(':').map(Number);
+  const suffix = hours >= 12 ? 'PM' : 'AM';
+  const hour12 = hours % 12 || 12;
+  return `${String(hour12).padStart(2, '0')}:${String(minutes).padStart(2, '0')} ${suffix}`;
+};
 
 export default function BookingDateTime() {
   const router = useRouter();
   const params = useLocalSearchParams();
   const [selectedDate, setSelectedDate] = useState<Date | null>(null);
   const [selectedTime, setSelectedTime] = useState<string | null>(null);
+  const [availability, setAvailability] = useState<Record<string, Slot[]>>({});
+  const items = useCartStore(state => state.items);
+  const address = params.address ? JSON.parse(params.address as string) : null;
+
+  useEffect(() => {
+    if (!address?.pincode || items.length === 0) {
+      return;
+    }
+    const serviceIds = items.flatMap(item => Array(item.quantity).fill(item.service_id));
+    slotAPI.getAvailability(address.pincode, serviceIds)
+      .then(response => {
+        const byDate: Record<string, Slot[]> = {};
+        for (const day of response.data.days) {
+          byDate[day.date] = day.slots;
+        }
+        setAvailability(byDate);
+      })
+      .catch(error => console.error('Failed to load availability:', error));
+  }, [params.address, items]);
+
+  // Local calendar date, the same key the server uses for a day
+  const dateKey = (date: Date) =>
+    `${date.getFullYear()}-${String(date.getMonth() + 1).padStart(2, '0')}-${String(date.getDate()).padStart(2, '0')}`;
+  const daySlots = selectedDate ? availability[dateKey(selectedDate)] : undefined;
+  const slotFor = (time: string) => daySlots?.find(slot => formatSlotTime(slot.time) === time);
 
   const timeSlots = [
     '09:00 AM', '10:00 AM', '11:00 AM', '12:00 PM',
@@ -52,11 +93,19 @@ export default function BookingDateTime() {
       Alert.alert('Error', 'Please select date and time');
       return;
     }
+    // scheduled_at is the slot's start, not midnight of the chosen day
+    const slot = slotFor(selectedTime);
+    let scheduledAt = slot ? new Date(slot.start + 'Z') : new Date(selectedDate);
+    if (!slot) {
+      const [clock, suffix] = selectedTime.split(' ');
+      const [hours, minutes] = clock.split(':').map(Number);
+      scheduledAt.setHours((hours % 12) + (suffix === 'PM' ? 12 : 0), minutes, 0, 0);
+    }
     router.push({
       pathname: '/booking/confirm',
       params: {
         ...params,
-        date: selectedDate.toISOString(),
+        date: scheduledAt.toISOString(),
         time: selectedTime,
       },
     });
@@ -112,13 +161,15 @@ export default function BookingDateTime() {
         <View style={styles.section}>
           <Text style={styles.sectionTitle}>Select Time Slot</Text>
           <View style={styles.timeGrid}>
-            {timeSlots.map((time) => (
+            {(daySlots ? daySlots.map(slot => formatSlotTime(slot.time)) : timeSlots).map((time) => (
               <TouchableOpacity
                 key={time}
                 style={[
                   styles.timeCard,
                   selectedTime === time && styles.selectedTimeCard,
+                  slotFor(time)?.available === false && styles.unavailableTimeCard,
                 ]}
+                disabled={slotFor(time)?.available === false}
                 onPress={() => setSelectedTime(time)}
                 activeOpacity={0.7}
               >
@@ -243,6 +294,9 @@ const styles = StyleSheet.create({
     backgroundColor: colors.primary,
     borderColor: colors.primary,
   },
+  unavailableTimeCard: {
+    opacity: 0.4,
+  },
   timeText: {
     fontSize: 14,
     fontWeight: '600',
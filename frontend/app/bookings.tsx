@@ -37,7 +37,7 @@ export default function Bookings() {
     if (!user) return;
     try {
       const response = await bookingAPI.getCustomerBookings(user._id);
-      setBookings(response.data);
+      setBookings(response.data.bookings);
     } catch (error) {
       console.error('Failed to load bookings:', error);
     } finally {
@@ -10,12 +10,21 @@ interface User {
   wallet_balance: number;
 }
 
+// The customer's city and pincode decide which region serves catalog prices and bookings
+interface Location {
+  city: string;
+  pincode: string;
+}
+
 interface AuthState {
   user: User | null;
   token: string | null;
+  refreshToken: string | null;
   isAuthenticated: boolean;
+  location: Location | null;
   setUser: (user: User) => void;
-  setToken: (token: string) => void;
+  setToken: (token: string, refreshToken?: string) => void;
+  setLocation: (location: Location) => void;
   logout: () => void;
   loadAuth: () => Promise<void>;
 }
@@ -23,26 +32,39 @@ interface AuthState {
 export const useAuthStore = create<AuthState>((set) => ({
   user: null,
   token: null,
+  refreshToken: null,
   isAuthenticated: false,
+  location: null,
   setUser: (user) => {
     set({ user, isAuthenticated: true });
     AsyncStorage.setItem('user', JSON.stringify(user));
   },
-  setToken: (token) => {
-    set({ token });
+  setToken: (token, refreshToken) => {
+    set(refreshToken ? { token, refreshToken } : { token });
     AsyncStorage.setItem('token', token);
+    if (refreshToken) {
+      AsyncStorage.setItem('refreshToken', refreshToken);
+    }
+  },
+  setLocation: (location) => {
+    set({ location });
+    AsyncStorage.setItem('location', JSON.stringify(location));
   },
   logout: async () => {
-    await AsyncStorage.multiRemove(['user', 'token']);
-    set({ user: null, token: null, isAuthenticated: false });
+    await AsyncStorage.multiRemove(['user', 'token', 'refreshToken']);
+    set({ user: null, token: null, refreshToken: null, isAuthenticated: false });
   },
   loadAuth: async () => {
     try {
-      const [userStr, token] = await AsyncStorage.multiGet(['user', 'token']);
+      const [userStr, token, refreshToken, location] = await AsyncStorage.multiGet(['user', 'token', 'refreshToken', 'location']);
+      if (location[1]) {
+        set({ location: JSON.parse(location[1]) });
+      }
       if (userStr[1] && token[1]) {
         set({ 
           user: JSON.parse(userStr[1]), 
           token: token[1], 
+          refreshToken: refreshToken[1],
           isAuthenticated: true 
         });
       }
@@ -1,5 +1,7 @@
 import axios from 'axios';
 import Constants from 'expo-constants';
+import i18n from '../i18n';
+import { useAuthStore } from '../store/authStore';
 
 const BACKEND_URL = Constants.expoConfig?.extra?.EXPO_PUBLIC_BACKEND_URL || process.env.EXPO_PUBLIC_BACKEND_URL || 'http://localhost:8001';
 
@@ -11,11 +13,61 @@ export const api = axios.create({
   },
 });
 
+// Catalog names and descriptions are served in the app's current language
+api.interceptors.request.use((config) => {
+  if (i18n.language) {
+    config.headers['Accept-Language'] = i18n.language;
+  }
+  const { token, location } = useAuthStore.getState();
+  if (token) {
+    config.headers.Authorization = `Bearer ${token}`;
+  }
+  if (location) {
+    config.headers['X-City'] = location.city;
+    config.headers['X-Pincode'] = location.pincode;
+  }
+  return config;
+});
+
+// Access tokens are short-lived: on a 401, swap the refresh token for a new pair and retry once
+let refreshing: Promise<string | null> | null = null;
+
+const refreshAccessToken = async (): Promise<string | null> => {
+  const { refreshToken, setToken, logout } = useAuthStore.getState();
+  if (!refreshToken) {
+    return null;
+  }
+  try {
+    const response = await axios.post(`${BACKEND_URL}/api/auth/refresh`, { refresh_token: refreshToken });
+    setToken(response.data.token, response.data.refresh_token);
+    return response.data.token;
+  } catch (error) {
+    await logout();
+    return null;
+  }
+};
+
+api.interceptors.response.use(undefined, async (error) => {
+  const config = error.config;
+  if (error.response?.status !== 401 || !config || config._retried) {
+    throw error;
+  }
+  refreshing = refreshing || refreshAccessToken().finally(() => { refreshing = null; });
+  const token = await refreshing;
+  if (!token) {
+    throw error;
+  }
+  config._retried = true;
+  config.headers.Authorization = `Bearer ${token}`;
+  return api(config);
+});
+
 // Auth APIs
 export const authAPI = {
   login: (phone: string) => api.post('/auth/login', { phone }),
   verifyOTP: (phone: string, otp: string) => api.post('/auth/verify-otp', { phone, otp }),
   getMe: (customer_id: string) => api.get(`/auth/me?customer_id=${customer_id}`),
+  logout: () => api.post('/auth/logout'),
 };
 
 // Category APIs
@@ -29,6 +81,13 @@ export const serviceAPI = {
   getById: (service_id: string) => api.get(`/services/${service_id}`),
 };
 
+// Slot APIs
+export const slotAPI = {
+  // Repeat a service id once per unit of quantity
+  getAvailability: (pincode: string, service_ids: string[], days: number = 7) =>
+    api.get('/availability', { params: { pincode, service_ids: service_ids.join(','), days } }),
+};
+
 // Cart APIs
 export const cartAPI = {
   add: (customer_id: string, service_id: string, title: string, price: number) => 
@@ -44,8 +103,11 @@ export const cartAPI = {
 // Booking APIs
 export const bookingAPI = {
   create: (data: any) => api.post('/booking', data),
+  checkout: (data: any, idempotencyKey: string) =>
+    api.post('/checkout', data, { headers: { 'Idempotency-Key': idempotencyKey } }),
   getById: (booking_id: string) => api.get(`/booking/${booking_id}`),
-  getCustomerBookings: (customer_id: string) => api.get(`/bookings/customer/${customer_id}`),
+  getCustomerBookings: (customer_id: string, cursor?: string, limit?: number) =>
+    api.get(`/bookings/customer/${customer_id}`, { params: { cursor, limit } }),
 };
 
 // User APIs
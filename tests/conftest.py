@@ -0,0 +1,74 @@
+import os
+import sys
+import tempfile
+import uuid
+from pathlib import Path
+
+import pytest
+import pytest_asyncio
+
+# The API runs as `uvicorn server:app` from backend/, where modules import each other as siblings
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+# Read at import time by database.py, auth.py and server.py. Motor connects
+# lazily, so the default MONGO_URL is never dialled; tests use the `db` fixture
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "workhub_test")
+os.environ.setdefault("JWT_SECRET", "test-secret-0123456789abcdef0123456789")
+os.environ.setdefault("ADMIN_API_KEY", "test-admin-key")
+os.environ.setdefault("BLOB_DIR", tempfile.mkdtemp(prefix="workhub-blobs-"))
+
+
+@pytest_asyncio.fixture
+async def db(monkeypatch):
+    """An empty database with the required indexes.
+
+    With MONGO_TEST_URL set this is a throwaway database on that server,
+    dropped afterwards; otherwise an in-memory mongomock one. mongomock has
+    no sessions, so run_transaction takes its standalone path there.
+    """
+    from tests.support import RoundTripDatabase, create_required_indexes
+
+    url = os.environ.get("MONGO_TEST_URL")
+    if url:
+        from motor.motor_asyncio import AsyncIOMotorClient
+
+        from indexes import ensure_indexes
+
+        client = AsyncIOMotorClient(url)
+        database = client[f"workhub_test_{uuid.uuid4().hex[:12]}"]
+        await ensure_indexes(database)
+        try:
+            yield database
+        finally:
+            await client.drop_database(database.name)
+            client.close()
+        return
+
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    import database as database_module
+
+    monkeypatch.setattr(database_module, "transactions_supported", False)
+    database = RoundTripDatabase(mongomock_motor.AsyncMongoMockClient()[f"workhub_test_{uuid.uuid4().hex[:12]}"])
+    await create_required_indexes(database)
+    yield database
+
+
+@pytest_asyncio.fixture
+async def api(db, monkeypatch):
+    """An HTTP client for the API, wired to the `db` fixture (the lifespan and its background loops do not run)."""
+    import httpx
+
+    import server
+    from rate_limit import TokenBucket
+    from tenancy import create_region_router
+    from user_cache import UserCache
+
+    monkeypatch.setattr(server, "db", db)
+    monkeypatch.setattr(server, "regions", create_region_router(db, server.notification_transports, config={}))
+    monkeypatch.setattr(server, "user_cache", UserCache(server.load_user))
+    monkeypatch.setattr(server, "otp_phone_limiter", TokenBucket(capacity=1000, refill_per_second=1000))
+    monkeypatch.setattr(server, "otp_ip_limiter", TokenBucket(capacity=1000, refill_per_second=1000))
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test/api") as client:
+        yield client
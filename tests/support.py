@@ -0,0 +1,92 @@
+import asyncio
+import inspect
+import os
+
+import pytest
+
+from auth import create_access_token
+from indexes import REQUIRED_INDEXES
+
+# Tests that need server features mongomock lacks (explain, geo queries,
+# change streams) run only against a real mongod
+requires_mongod = pytest.mark.skipif(
+    not os.environ.get("MONGO_TEST_URL"), reason="needs a mongod; set MONGO_TEST_URL"
+)
+
+# Mongo methods that return a cursor rather than a coroutine
+CURSOR_METHODS = ("find", "aggregate")
+
+
+class RoundTripCollection:
+    def __init__(self, collection, database: "RoundTripDatabase"):
+        self._collection = collection
+        self._database = database
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if name in CURSOR_METHODS:
+            def cursor(*args, **kwargs):
+                self._database.calls += 1
+                return attr(*args, **kwargs)
+            return cursor
+        if not inspect.iscoroutinefunction(attr):
+            return attr
+
+        async def call(*args, **kwargs):
+            self._database.calls += 1
+            await asyncio.sleep(self._database.latency)
+            return await attr(*args, **kwargs)
+        return call
+
+
+class RoundTripDatabase:
+    """A mongomock database whose calls yield to the event loop, as a network round trip would.
+
+    mongomock answers every call synchronously, so without this two
+    coroutines could never interleave between their queries and races
+    would be invisible. `latency` simulates the round-trip time and `calls`
+    counts the queries issued.
+    """
+
+    def __init__(self, database, latency: float = 0.0):
+        self._database = database
+        self.latency = latency
+        self.calls = 0
+
+    @property
+    def client(self):
+        return self._database.client
+
+    @property
+    def name(self):
+        return self._database.name
+
+    def __getitem__(self, name: str) -> RoundTripCollection:
+        return RoundTripCollection(self._database[name], self)
+
+    def __getattr__(self, name: str) -> RoundTripCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+
+async def create_required_indexes(db):
+    # mongomock's create_indexes drops index options (unique, partial
+    # filters, TTLs); create_index keeps them
+    for collection, models in REQUIRED_INDEXES.items():
+        for model in models:
+            spec = dict(model.document)
+            await db[collection].create_index(list(spec.pop("key").items()), **spec)
+
+
+def auth_headers(customer_id: str) -> dict:
+    return {"Authorization": f"Bearer {create_access_token(customer_id)}"}
+
+
+def admin_headers() -> dict:
+    return {"X-Admin-Key": os.environ["ADMIN_API_KEY"]}
+
+
+def percentile(samples, pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))]
@@ -0,0 +1,104 @@
+import base64
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import orjson
+import pytest
+from bson import ObjectId
+
+from archive import pack
+from tests.support import auth_headers, percentile
+
+pytestmark = pytest.mark.asyncio
+
+HEAVY_CUSTOMER_BOOKINGS = 10000
+
+
+def synthetic_booking(customer_id: str, created_at: datetime) -> dict:
+    return {
+        "_id": ObjectId(),
+        "customer_id": customer_id,
+        "customer_name": "Heavy Customer",
+        "customer_phone": "9000000000",
+        "services": [{"service_id": str(ObjectId()), "title": "Office cleaning", "price": 2500.0, "quantity": 1}],
+        "total_price": 2500.0,
+        "status": "completed",
+        "scheduled_at": created_at + timedelta(days=1),
+        "address": {"line1": "Plot 12", "city": "Hyderabad", "pincode": "500001"},
+        "images": [base64.b64encode(b"\xff" * 3000).decode()],
+        "created_at": created_at,
+    }
+
+
+async def seed_heavy_customer(db, customer_id: str):
+    start = datetime(2025, 1, 1)
+    # Bookings share created_at in pairs so pages must break ties on _id
+    bookings = [synthetic_booking(customer_id, start + timedelta(minutes=i // 2)) for i in range(HEAVY_CUSTOMER_BOOKINGS)]
+    live, archived = bookings[::10] + [b for i, b in enumerate(bookings) if i % 10 and i % 3], \
+        [b for i, b in enumerate(bookings) if i % 10 and not i % 3]
+    await db.bookings.insert_many(live)
+    await db.booking_archive.insert_many([pack(b) for b in archived])
+    return bookings
+
+
+async def test_pages_cover_every_booking_once_without_heavy_fields(api, db):
+    customer_id = str(ObjectId())
+    bookings = await seed_heavy_customer(db, customer_id)
+    headers = auth_headers(customer_id)
+
+    seen, keys, samples, page_bytes = [], [], [], []
+    cursor = None
+    tracemalloc.start()
+    while True:
+        started = time.perf_counter()
+        response = await api.get(f"/bookings/customer/{customer_id}", params={"limit": 100, "cursor": cursor},
+                                 headers=headers)
+        samples.append((time.perf_counter() - started) * 1000)
+        assert response.status_code == 200
+        page_bytes.append(len(response.content))
+        page = response.json()
+        for booking in page["bookings"]:
+            assert "images" not in booking and "address" not in booking
+            seen.append(booking["_id"])
+            keys.append((booking["created_at"], booking["_id"]))
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    _, paged_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert sorted(seen) == sorted(str(b["_id"]) for b in bookings)
+    assert keys == sorted(keys, reverse=True)
+
+    # What the old endpoint did: every full document in one response
+    tracemalloc.start()
+    full = await db.bookings.find({"customer_id": customer_id}).to_list(None)
+    full += [b for b in bookings if b["_id"] not in {d["_id"] for d in full}]
+    full_bytes = len(orjson.dumps(full, default=str))
+    _, full_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"\n{HEAVY_CUSTOMER_BOOKINGS} bookings, pages of 100: p50 {percentile(samples, 50):.1f} ms"
+          f"  p99 {percentile(samples, 99):.1f} ms  largest page {max(page_bytes) / 1024:.0f} KiB"
+          f"  peak {paged_peak / 2**20:.1f} MiB for the whole walk")
+    print(f"full documents in one response: {full_bytes / 2**20:.1f} MiB  peak {full_peak / 2**20:.1f} MiB")
+    assert max(page_bytes) * 50 < full_bytes
+
+
+async def test_full_booking_still_has_images_and_address(api, db):
+    customer_id = str(ObjectId())
+    booking = synthetic_booking(customer_id, datetime(2025, 1, 1))
+    booking["status"] = "pending"
+    await db.bookings.insert_one(booking)
+
+    response = await api.get(f"/booking/{booking['_id']}", headers=auth_headers(customer_id))
+    assert response.status_code == 200
+    assert response.json()["address"]["city"] == "Hyderabad"
+
+
+async def test_bad_cursor_is_rejected(api):
+    customer_id = str(ObjectId())
+    response = await api.get(f"/bookings/customer/{customer_id}", params={"cursor": "not-a-cursor"},
+                             headers=auth_headers(customer_id))
+    assert response.status_code == 400
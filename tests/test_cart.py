@@ -0,0 +1,89 @@
+import asyncio
+import time
+
+import pytest
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+
+from tests.support import auth_headers, percentile
+
+pytestmark = pytest.mark.asyncio
+
+
+async def add(api, customer_id: str, service_id: str):
+    response = await api.post(
+        "/cart/add",
+        json={"customer_id": customer_id, "service_id": service_id, "title": "Deep cleaning", "price": 499.0},
+        headers=auth_headers(customer_id),
+    )
+    assert response.status_code == 200
+
+
+async def legacy_add(db, customer_id: str, service_id: str):
+    # The read-modify-write the cart routes used before the atomic updates
+    cart = await db.carts.find_one({"customer_id": customer_id})
+    items = cart["items"] if cart else []
+    for item in items:
+        if item["service_id"] == service_id:
+            item["quantity"] += 1
+            break
+    else:
+        items.append({"service_id": service_id, "title": "Deep cleaning", "price": 499.0, "quantity": 1})
+    await db.carts.update_one({"customer_id": customer_id}, {"$set": {"items": items}}, upsert=True)
+
+
+async def test_parallel_adds_keep_every_increment(api, db):
+    customer_id = str(ObjectId())
+    services = [str(ObjectId()) for _ in range(5)]
+    await asyncio.gather(*(add(api, customer_id, services[i % 5]) for i in range(300)))
+
+    carts = await db.carts.find({"customer_id": customer_id}).to_list(None)
+    assert len(carts) == 1
+    assert {item["service_id"]: item["quantity"] for item in carts[0]["items"]} == {s: 60 for s in services}
+
+
+async def test_legacy_read_modify_write_loses_increments(db):
+    customer_id = str(ObjectId())
+    service_id = str(ObjectId())
+    await asyncio.gather(*(legacy_add(db, customer_id, service_id) for _ in range(50)))
+
+    cart = await db.carts.find_one({"customer_id": customer_id})
+    assert cart["items"][0]["quantity"] < 50
+
+
+async def test_losing_first_add_hits_the_unique_cart_index(db):
+    # add_to_cart retries on this error; without the index the losing upsert
+    # would insert a second cart for the customer instead
+    await db.carts.insert_one({"customer_id": "c1", "items": [{"service_id": "s1", "quantity": 1}]})
+    with pytest.raises(DuplicateKeyError):
+        await db.carts.update_one(
+            {"customer_id": "c1", "items.service_id": {"$ne": "s1"}},
+            {"$push": {"items": {"service_id": "s1", "quantity": 1}}},
+            upsert=True,
+        )
+
+
+async def test_add_latency_against_read_modify_write(api, db):
+    if not hasattr(db, "latency"):
+        pytest.skip("simulated round trips only apply to mongomock")
+    db.latency = 0.005
+    customer_id = str(ObjectId())
+    service_id = str(ObjectId())
+    await add(api, customer_id, service_id)
+
+    async def measure(step):
+        samples, calls = [], db.calls
+        for _ in range(50):
+            started = time.perf_counter()
+            await step()
+            samples.append((time.perf_counter() - started) * 1000)
+        return samples, (db.calls - calls) / 50
+
+    before, before_trips = await measure(lambda: legacy_add(db, customer_id, service_id))
+    after, after_trips = await measure(lambda: add(api, customer_id, service_id))
+
+    print("\ncart add at 5 ms per round trip (HTTP included only for the atomic path)")
+    print(f"read-modify-write: {before_trips:.0f} round trips  p50 {percentile(before, 50):.1f} ms  p99 {percentile(before, 99):.1f} ms")
+    print(f"atomic $inc:       {after_trips:.0f} round trips  p50 {percentile(after, 50):.1f} ms  p99 {percentile(after, 99):.1f} ms")
+    assert (before_trips, after_trips) == (2, 1)
+    assert percentile(after, 50) < percentile(before, 50)
@@ -0,0 +1,78 @@
+import time
+
+import pytest
+from bson import ObjectId
+
+from tests.support import percentile
+
+pytestmark = pytest.mark.asyncio
+
+
+async def seed_catalog(db, categories: int = 20, services_per_category: int = 20):
+    category_ids = [ObjectId() for _ in range(categories)]
+    await db.categories.insert_many([
+        {"_id": cid, "name": f"Category {i}", "type": "home" if i % 2 else "commercial", "description": "x" * 200}
+        for i, cid in enumerate(category_ids)
+    ])
+    services = [
+        {"_id": ObjectId(), "category_id": str(cid), "title": f"Service {i}", "price": 100.0 + i,
+         "description": "y" * 300, "duration_minutes": 60}
+        for cid in category_ids for i in range(services_per_category)
+    ]
+    await db.services.insert_many(services)
+    return [str(cid) for cid in category_ids], [str(service["_id"]) for service in services]
+
+
+async def test_cache_serves_catalog_without_mongo(api, db):
+    import server
+
+    category_ids, service_ids = await seed_catalog(db)
+    catalog_cache = server.regions.default.catalog_cache
+    if hasattr(db, "latency"):
+        db.latency = 0.002  # simulated round trip to Mongo
+    paths = ["/categories", "/categories?type=home"]
+    paths += [f"/categories/{cid}/services" for cid in category_ids]
+    paths += [f"/services/{sid}" for sid in service_ids[:40]]
+
+    results = {}
+    for enabled in (False, True):
+        catalog_cache.enabled = enabled
+        for path in paths:
+            assert (await api.get(path)).status_code == 200
+        samples, calls = [], getattr(db, "calls", 0)
+        for _ in range(3):
+            for path in paths:
+                started = time.perf_counter()
+                response = await api.get(path)
+                samples.append((time.perf_counter() - started) * 1000)
+                assert response.status_code == 200
+        results[enabled] = (samples, (getattr(db, "calls", 0) - calls) / len(samples))
+
+    for enabled, (samples, trips) in results.items():
+        label = "cache on " if enabled else "cache off"
+        print(f"\n{label}: {trips:.2f} Mongo calls/request  p50 {percentile(samples, 50):.2f} ms"
+              f"  p99 {percentile(samples, 99):.2f} ms", end="")
+    print()
+    if hasattr(db, "calls"):
+        assert results[True][1] == 0
+        assert results[False][1] >= 1
+    assert percentile(results[True][0], 50) < percentile(results[False][0], 50)
+
+
+def without_nulls(value):
+    # The cache serves stored documents as-is; the model path adds unset optional fields as null
+    if isinstance(value, list):
+        return [without_nulls(item) for item in value]
+    return {key: item for key, item in value.items() if item is not None}
+
+
+async def test_cached_responses_match_the_database(api, db):
+    import server
+
+    category_ids, service_ids = await seed_catalog(db, categories=3, services_per_category=4)
+    catalog_cache = server.regions.default.catalog_cache
+    for path in ["/categories", f"/categories/{category_ids[0]}/services", f"/services/{service_ids[5]}"]:
+        catalog_cache.enabled = False
+        expected = without_nulls((await api.get(path)).json())
+        catalog_cache.enabled = True
+        assert without_nulls((await api.get(path)).json()) == expected
@@ -0,0 +1,75 @@
+import os
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+
+from indexes import REQUIRED_INDEXES, check_query_plans, ensure_indexes
+from tests.support import percentile, requires_mongod
+
+pytestmark = pytest.mark.asyncio
+
+# Size of the synthetic bookings collection for the query plan check
+SYNTHETIC_BOOKINGS = int(os.environ.get("INDEX_TEST_BOOKINGS", "1000000"))
+
+
+async def test_required_indexes_exist(db):
+    for collection, models in REQUIRED_INDEXES.items():
+        existing = await db[collection].index_information()
+        for model in models:
+            name = model.document["name"]
+            assert name in existing, f"{collection}.{name}"
+            assert existing[name].get("unique", False) == model.document.get("unique", False), f"{collection}.{name}"
+
+
+async def test_unique_phone_and_cart(db):
+    await db.users.insert_one({"phone": "9000000001"})
+    with pytest.raises(DuplicateKeyError):
+        await db.users.insert_one({"phone": "9000000001"})
+    await db.carts.insert_one({"customer_id": "c1", "items": []})
+    with pytest.raises(DuplicateKeyError):
+        await db.carts.insert_one({"customer_id": "c1", "items": []})
+
+
+@requires_mongod
+async def test_ensure_indexes_is_idempotent(db):
+    before = {name: await db[name].index_information() for name in REQUIRED_INDEXES}
+    await ensure_indexes(db)
+    assert {name: await db[name].index_information() for name in REQUIRED_INDEXES} == before
+
+
+@requires_mongod
+async def test_check_mode_reports_collection_scans(db):
+    bare = db.client[f"{db.name}_bare"]
+    try:
+        await bare.bookings.insert_one({"customer_id": "c1", "created_at": datetime.utcnow()})
+        assert "get_customer_bookings" in await check_query_plans(bare)
+    finally:
+        await db.client.drop_database(bare.name)
+
+
+@requires_mongod
+async def test_endpoint_queries_use_indexes_on_synthetic_bookings(db):
+    customers = [str(ObjectId()) for _ in range(10000)]
+    start = datetime.utcnow() - timedelta(days=365)
+    batch = []
+    for i in range(SYNTHETIC_BOOKINGS):
+        batch.append({"customer_id": customers[i % len(customers)], "created_at": start + timedelta(seconds=i * 30),
+                      "status": "completed", "services": [], "total_amount": 500.0})
+        if len(batch) == 10000:
+            await db.bookings.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        await db.bookings.insert_many(batch, ordered=False)
+
+    assert await check_query_plans(db) == []
+
+    samples = []
+    for customer_id in customers[:200]:
+        started = time.perf_counter()
+        await db.bookings.find({"customer_id": customer_id}).sort([("created_at", -1), ("_id", -1)]).to_list(20)
+        samples.append((time.perf_counter() - started) * 1000)
+    print(f"\nhistory page over {SYNTHETIC_BOOKINGS} bookings: p50 {percentile(samples, 50):.2f} ms"
+          f"  p99 {percentile(samples, 99):.2f} ms")